@@ -11,8 +11,10 @@ check_python_formatting() {
     pylint_failed=false
     black_failed=false
 
-    # Check python code (excluding test directories)
+    # Check python code (excluding test directories); servers import the
+    # shared `common` package from the transformers directory
     echo "Running pylint..."
+    export PYTHONPATH="${AIS_ETL}/transformers${PYTHONPATH:+:${PYTHONPATH}}"
     for f in $(find "${AIS_ETL}/transformers/" -type f -name "*.py" ! -regex ".*__pycache__.*" ! -path "*/tests/*" | sort); do
         pylint --score=n "$f" 2>/dev/null || pylint_failed=true
         if [ "$pylint_failed" = true ]; then 
@@ -12,16 +12,84 @@ Env vars (all optional):
   BR      -> bitrate (e.g., "128k", "64k")   # lossy codecs only
   CODEC   -> audio codec (e.g., "pcm_s16le", "flac", "libmp3lame", "aac")
   FORMAT  -> container/format (e.g., "wav", "flac", "mp3", "m4a", "opus", "ogg")
+  STREAMING -> "true" to pipe request chunks into FFmpeg while its output is
+               streamed back (`transform_stream`) instead of buffering both
+  FFMPEG_SLOTS    -> FFmpeg processes running at once in the pod, shared by
+                     all server workers (default: 2 * CPU count; "0": no limit)
+  FFMPEG_THREADS  -> threads per FFmpeg process (default: CPU count divided by
+                     FFMPEG_SLOTS, at least 1; FFmpeg's own choice without a
+                     slot limit or with "0")
+  FFMPEG_LOCK_DIR -> directory of the slot lock files (default: /tmp/ffmpeg-slots)
+  AUDIO_BACKEND   -> "ffmpeg" (an FFmpeg process per object) or "soundfile"
+                     (in-process libsndfile decode, channel mix, SciPy
+                     resampling and WAV/FLAC encode for buffered requests,
+                     falling back to FFmpeg for anything else) (default: ffmpeg)
+  SKIP_CONFORMANT -> "true" to return WAV/FLAC objects whose header already
+                     matches FORMAT/CODEC/AR/AC unchanged, without FFmpeg
+                     (default: false)
+  SEGMENT_THRESHOLD -> input size in bytes from which buffered WAV/FLAC objects
+                       are cut into segments transcoded concurrently, when the
+                       output is PCM WAV without AUDIO_FILTERS (default: "0",
+                       disabled)
+  SEGMENT_SECONDS   -> minimum segment length in seconds (default: 60)
+  SEGMENT_WORKERS   -> maximum segments per object (default: CPU count)
+  WORKERS           -> threads transcoding the audio members of a tar shard
+                       (default: CPU count)
+  COMMAND_CACHE_SIZE -> per-request output settings (etl_args) whose FFmpeg
+                        arguments are kept prebuilt (default: 32)
+
+etl_args (optional JSON) override the output settings per request: "ac",
+"ar", "br", "codec", "format" and "audio_filters" (e.g.,
+{"ar": 16000, "ac": 1}). Invalid JSON is ignored; invalid values fail the
+request. Per-request formats are limited to those with a known MIME type,
+and per-request filters to a list of audio filters that do not open files.
+
+Tar (WebDataset) shards are transcoded member by member: audio members are
+renamed for the output format (e.g., `.flac` -> `.wav`), others are passed
+through.
 
 Default codec: pcm_s16le
 Default format: wav
 """
 
+# pylint: disable=too-many-lines
+
+import copy
+import fcntl
+import io
+import json
+import math
 import os
+import queue
+import random
+import re
+import struct
 import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache, partial
+from itertools import chain
+from typing import Any, BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
 
+from fastapi import Response
 from aistore.sdk.etl.webserver.fastapi_server import FastAPIServer
 
+from common.server_utils import (
+    TAR_EXTENSIONS,
+    TAR_MIME,
+    StreamingTarBuffer,
+    completed,
+    render_cache_metrics,
+    request_mime_type,
+    set_request_mime_type,
+    streaming_enabled,
+)
+
 _MIME_BY_FORMAT = {
     "wav": "audio/wav",
     "flac": "audio/flac",
@@ -34,35 +102,725 @@ _MIME_BY_FORMAT = {
 
 _AUDIO_EXTS = {".wav", ".flac", ".mp3", ".m4a", ".aac", ".opus", ".ogg"}
 
+# etl_args keys that override output settings, in the order of
+# `FFmpegServer._build_settings`'s parameters, and their environment variables
+_OUTPUT_PARAMS = ("ac", "ar", "br", "codec", "format", "audio_filters")
+_OUTPUT_ENV = ("AC", "AR", "BR", "CODEC", "FORMAT", "AUDIO_FILTERS")
+
+# Audio filters allowed in etl_args: the filter graph comes from the request,
+# so filters that read or write files, load plugins or open sockets (e.g.,
+# `amovie`, `ametadata`, `ladspa`, `azmq`) are left out
+_REQUEST_FILTERS = frozenset("""
+    acompressor adelay aecho afade afftdn aformat agate alimiter anull
+    apad aresample areverse asetrate atempo atrim bandpass bandreject bass
+    channelmap compand dynaudnorm equalizer highpass highshelf loudnorm
+    lowpass lowshelf pan silenceremove speechnorm treble volume
+    """.split())
+
+_CODEC_PATTERN = re.compile(r"[a-z0-9_]+")
+_BITRATE_PATTERN = re.compile(r"[0-9]+(\.[0-9]+)?[kKmM]?")
+
+# Size of the chunks fed to FFmpeg's stdin and read from its stdout when streaming
+_CHUNK_SIZE = 64 * 1024
+
+# Bytes read from the start of an object to probe its header
+_PROBE_SIZE = 64 * 1024
+
+# (WAVE format tag, bits per sample) -> FFmpeg codec
+_WAV_CODECS = {
+    (1, 8): "pcm_u8",
+    (1, 16): "pcm_s16le",
+    (1, 24): "pcm_s24le",
+    (1, 32): "pcm_s32le",
+    (3, 32): "pcm_f32le",
+    (3, 64): "pcm_f64le",
+}
+_WAV_FORMATS = {codec: key for key, codec in _WAV_CODECS.items()}
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Seconds decoded before and after each cut of a segmented object and dropped
+# from the output, so that the resampler has settled at the cut
+_SEGMENT_PAD = 1
+
+AUDIO_BACKENDS = ("ffmpeg", "soundfile")
+
+# CODEC -> libsndfile subtype of the WAV output of the soundfile backend
+_WAV_SUBTYPES = {
+    "pcm_u8": "PCM_U8",
+    "pcm_s16le": "PCM_16",
+    "pcm_s24le": "PCM_24",
+    "pcm_s32le": "PCM_32",
+    "pcm_f32le": "FLOAT",
+    "pcm_f64le": "DOUBLE",
+}
+
+# Input subtype -> dtype decoded by the soundfile backend (float32 otherwise):
+# int16 decodes fastest, float64 keeps 32-bit and double precision samples
+_READ_DTYPES = {
+    "PCM_S8": "int16",
+    "PCM_U8": "int16",
+    "PCM_16": "int16",
+    "PCM_32": "float64",
+    "DOUBLE": "float64",
+}
+
+# Frame count libsndfile reports when the header has no length (SF_COUNT_MAX),
+# e.g. for FLAC written to a pipe
+_UNKNOWN_FRAMES = 2**63 - 1
+
+# Input subtypes encoded as 24-bit FLAC by the soundfile backend (16-bit otherwise)
+_WIDE_SUBTYPES = {"PCM_24", "PCM_32", "FLOAT", "DOUBLE"}
+
+# Integer subtypes quantized like FFmpeg (round to nearest, clip): bits, dtype
+_INT_SUBTYPES = {
+    "PCM_16": (16, "int16"),
+    "PCM_24": (24, "int32"),
+    "PCM_32": (32, "int32"),
+}
+
+# Backoff (seconds) between attempts to take a slot while all are busy
+_MIN_SLOT_POLL = 0.001
+_MAX_SLOT_POLL = 0.05
+
+
+class AudioHeader(NamedTuple):
+    """Stream parameters read from an audio header."""
+
+    format: str
+    codec: str
+    samplerate: int
+    channels: int
+    # Length in samples per channel (None if the header does not tell)
+    frames: Optional[int]
+
+
+def _probe_wav(header: bytes) -> Optional[AudioHeader]:
+    """Parse the `fmt ` and `data` chunks of a RIFF/WAVE header (None if not PCM WAV)."""
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    fmt, pos = None, 12
+    while pos + 8 <= len(header):
+        (size,) = struct.unpack_from("<I", header, pos + 4)
+        chunk_id = header[pos : pos + 4]
+        if chunk_id == b"fmt " and pos + 24 <= len(header):
+            tag, channels, samplerate, _, block_align, bits = struct.unpack_from(
+                "<HHIIHH", header, pos + 8
+            )
+            if (
+                tag == _WAVE_FORMAT_EXTENSIBLE
+                and size >= 40
+                and pos + 34 <= len(header)
+            ):
+                # The format tag is the start of the sub-format GUID
+                tag = struct.unpack_from("<H", header, pos + 32)[0]
+            codec = _WAV_CODECS.get((tag, bits))
+            if codec is None:
+                return None
+            fmt = (codec, samplerate, channels, block_align)
+        elif chunk_id == b"data":
+            break
+        # Chunks are padded to an even size
+        pos += 8 + size + (size & 1)
+    if fmt is None:
+        return None
+    codec, samplerate, channels, block_align = fmt
+    frames = None
+    # Streamed WAVs (e.g., written by FFmpeg to a pipe) leave the size unset
+    if chunk_id == b"data" and 0 < size < 0xFFFFFFFF and block_align:
+        frames = size // block_align
+    return AudioHeader("wav", codec, samplerate, channels, frames)
+
+
+def _probe_flac(header: bytes) -> Optional[AudioHeader]:
+    """Parse the STREAMINFO block of a FLAC header (None if not FLAC)."""
+    pos = 0
+    if header[:3] == b"ID3":
+        # Skip an ID3v2 tag: syncsafe size, plus a footer if flagged
+        size = 0
+        for byte in header[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        pos = 10 + size + (10 if len(header) > 5 and header[5] & 0x10 else 0)
+    # "fLaC", then STREAMINFO, which must be the first metadata block
+    if header[pos : pos + 4] != b"fLaC" or len(header) < pos + 42:
+        return None
+    if header[pos + 4] & 0x7F != 0:
+        return None
+    # 20 bits sample rate, 3 bits channels - 1, 5 bits bits per sample - 1,
+    # 36 bits total samples (0: unknown)
+    fields = int.from_bytes(header[pos + 18 : pos + 26], "big")
+    frames = fields & 0xFFFFFFFFF
+    return AudioHeader(
+        "flac", "flac", fields >> 44, ((fields >> 41) & 0x7) + 1, frames or None
+    )
+
+
+def probe_audio(header: bytes) -> Optional[AudioHeader]:
+    """
+    Return the format, codec, sample rate, channels and length of a WAV or FLAC
+    object from its first bytes, or None if the header is not recognized.
+    """
+    return _probe_wav(header) or _probe_flac(header)
+
+
+def _wav_header(codec: str, samplerate: int, channels: int, data_size: int) -> bytes:
+    """Return a 44-byte WAV header for `data_size` bytes of PCM samples."""
+    tag, bits = _WAV_FORMATS[codec]
+    block_align = channels * bits // 8
+    riff_size = 36 + data_size
+    if riff_size > 0xFFFFFFFF:
+        # Past 4 GiB, the sizes are left unset, as FFmpeg does on a pipe
+        riff_size = data_size = 0xFFFFFFFF
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        riff_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        tag,
+        channels,
+        samplerate,
+        samplerate * block_align,
+        block_align,
+        bits,
+        b"data",
+        data_size,
+    )
+
+
+def _output_name(name: str, out_format: str) -> str:
+    """Rename a tar member so that its extension matches the output format."""
+    out_ext = f".{out_format.lower()}"
+    if out_ext not in _AUDIO_EXTS:
+        return name
+    return os.path.splitext(name)[0] + out_ext
 
-class FFmpegServer(FastAPIServer):
+
+def _validate_param(name: str, value: Any, default_format: str) -> str:
+    """
+    Return an output setting from etl_args as its command-line value.
+
+    Raises:
+        ValueError: If the value is invalid for the setting
+    """
+    text = str(value).strip()
+    if name in ("ac", "ar"):
+        limit = 64 if name == "ac" else 768000
+        if isinstance(value, bool) or not text.isdigit() or not 0 < int(text) <= limit:
+            raise ValueError(f"Invalid {name!r}: expected an integer in 1..{limit}")
+        return str(int(text))
+    if name == "br" and _BITRATE_PATTERN.fullmatch(text):
+        return text
+    if name == "codec" and _CODEC_PATTERN.fullmatch(text):
+        return text
+    if name == "format":
+        if text.lower() in _MIME_BY_FORMAT or text == default_format:
+            return text
+        raise ValueError(
+            f"Invalid 'format' {text!r}: expected one of {sorted(_MIME_BY_FORMAT)}"
+        )
+    if name == "audio_filters" and text and "[" not in text:
+        names = {
+            part.split("=", 1)[0].split("@", 1)[0].strip()
+            for part in re.split(r"[,;]", text)
+        }
+        if names <= _REQUEST_FILTERS:
+            return text
+        raise ValueError(
+            f"Invalid 'audio_filters': {sorted(names - _REQUEST_FILTERS)} not allowed "
+            f"in etl_args (allowed: {sorted(_REQUEST_FILTERS)})"
+        )
+    raise ValueError(f"Invalid {name!r}: {value!r}")
+
+
+class _ProcessSlots:  # pylint: disable=too-few-public-methods
+    """
+    Pod-wide limit on the number of concurrent FFmpeg processes.
+
+    Every slot is a lock file in `lock_dir`, held with `flock` while an FFmpeg
+    process runs. The limit is therefore shared by all uvicorn workers of the
+    pod, and the slot of a worker that dies is released with its file
+    descriptors. A request that finds every slot taken polls with backoff
+    until one is free. The counters are per worker process.
+    """
+
+    def __init__(self, lock_dir: str, slots: int):
+        self.slots = slots
+        self._paths = [os.path.join(lock_dir, f"slot-{i}.lock") for i in range(slots)]
+        if slots:
+            os.makedirs(lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+        self.started_total = 0
+        self.queue_seconds_sum = 0.0
+
+    def _try_lock(self) -> Optional[int]:
+        """Lock a free slot and return its file descriptor, or None if all are busy."""
+        # Start at a random slot so that workers do not all contend for the first
+        first = random.randrange(self.slots)
+        for i in range(self.slots):
+            path = self._paths[(first + i) % self.slots]
+            # Not inherited by FFmpeg (O_CLOEXEC by default)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        """Hold a slot (waiting for one if needed) for the duration of the block."""
+        start = time.monotonic()
+        fd = None
+        if self.slots:
+            with self._lock:
+                self.waiting += 1
+            try:
+                delay = _MIN_SLOT_POLL
+                while (fd := self._try_lock()) is None:
+                    time.sleep(delay)
+                    delay = min(delay * 2, _MAX_SLOT_POLL)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        with self._lock:
+            self.running += 1
+            self.started_total += 1
+            self.queue_seconds_sum += time.monotonic() - start
+        try:
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)
+            with self._lock:
+                self.running -= 1
+
+
+class _SoundfileBackend:  # pylint: disable=too-few-public-methods
+    """
+    Transcodes audio in-process: libsndfile (`soundfile`) decodes the object,
+    mono/stereo inputs are mixed to the configured channel count, SciPy's
+    polyphase filter resamples it and libsndfile encodes WAV (PCM) or FLAC.
+    Saves the FFmpeg process start, which dominates for small objects.
+    """
+
+    def __init__(
+        self, channels: Optional[int], samplerate: Optional[int], codec: str, fmt: str
+    ):
+        # Optional dependencies, only needed with `AUDIO_BACKEND=soundfile`
+        # pylint: disable=import-outside-toplevel,unused-import
+        import numpy
+        import scipy.signal
+        import soundfile
+
+        self.channels = channels
+        self.samplerate = samplerate
+        self.codec = codec
+        self.format = fmt
+
+    @staticmethod
+    def create(
+        channels: Optional[str],
+        samplerate: Optional[str],
+        codec: str,
+        fmt: str,
+        audio_filters: Optional[str],
+    ) -> Optional["_SoundfileBackend"]:
+        """Return a backend for the FFmpeg settings, or None if it does not support them."""
+        fmt = fmt.lower()
+        if audio_filters or not (
+            (fmt == "wav" and codec in _WAV_SUBTYPES)
+            or (fmt == "flac" and codec == "flac")
+        ):
+            return None
+        try:
+            return _SoundfileBackend(
+                int(channels) if channels else None,
+                int(samplerate) if samplerate else None,
+                codec,
+                fmt,
+            )
+        except ValueError:
+            return None
+
+    def transcode(self, data) -> Optional[bytes]:
+        """
+        Transcode an object (bytes, or a file path with `ETL_DIRECT_FQN`).
+
+        Returns:
+            The encoded audio, or None if FFmpeg has to handle the object (input
+            not decodable by libsndfile or without its length in the header, or
+            a channel layout other than mono or stereo to be remixed).
+        """
+        # pylint: disable=import-outside-toplevel
+        import soundfile as sf
+        from scipy.signal import resample_poly
+
+        try:
+            with sf.SoundFile(data if isinstance(data, str) else io.BytesIO(data)) as f:
+                if f.frames == _UNKNOWN_FRAMES:
+                    return None
+                in_subtype, rate = f.subtype, f.samplerate
+                audio = f.read(
+                    dtype=_READ_DTYPES.get(in_subtype, "float32"), always_2d=True
+                )
+        except sf.SoundFileError:
+            return None
+        if audio.dtype == "int16":
+            audio = audio.astype("float32") * (1 / 32768)
+
+        audio = self._mix(audio)
+        if audio is None:
+            return None
+        if self.samplerate and self.samplerate != rate:
+            gcd = math.gcd(rate, self.samplerate)
+            audio = resample_poly(audio, self.samplerate // gcd, rate // gcd, axis=0)
+            rate = self.samplerate
+        audio, subtype = self._quantize(audio, in_subtype)
+
+        out = io.BytesIO()
+        sf.write(out, audio, rate, format=self.format.upper(), subtype=subtype)
+        return out.getvalue()
+
+    def _mix(self, audio):
+        """Mix to the configured channels as FFmpeg does (mono/stereo only, else None)."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        channels = audio.shape[1]
+        if not self.channels or self.channels == channels:
+            return audio
+        if (channels, self.channels) == (2, 1):
+            # Much faster than `mean(axis=1)` on interleaved samples
+            return audio @ np.full((2, 1), 0.5, dtype=audio.dtype)
+        if (channels, self.channels) == (1, 2):
+            return np.repeat(audio, 2, axis=1)
+        return None
+
+    def _quantize(self, audio, in_subtype: str):
+        """
+        Return the samples to write and the output subtype. Integer samples are
+        rounded to nearest and clipped, as FFmpeg converts float to integer.
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        if self.format == "flac":
+            subtype = "PCM_24" if in_subtype in _WIDE_SUBTYPES else "PCM_16"
+        else:
+            subtype = _WAV_SUBTYPES[self.codec]
+        if subtype not in _INT_SUBTYPES:
+            return audio, subtype
+        bits, dtype = _INT_SUBTYPES[subtype]
+        scale = 2.0 ** (bits - 1)
+        audio = np.clip(np.rint(audio * scale), -scale, scale - 1).astype(dtype)
+        if bits == 24:
+            # libsndfile takes 24-bit samples from the high bits of int32
+            audio <<= 8
+        return audio, subtype
+
+
+class _OutputSettings(NamedTuple):
+    """Output settings of a request (environment defaults overridden by etl_args)."""
+
+    out_format: str
+    # FFmpeg arguments after the input
+    cmd_suffix: Tuple[str, ...]
+    # The same with raw PCM output, for segments (None: not segmented)
+    segment_suffix: Optional[Tuple[str, ...]]
+    # In-process backend (None: FFmpeg only)
+    soundfile: Optional[_SoundfileBackend]
+    # Format, codec, sample rate and channels of the output (sample rate and
+    # channels None if kept from the input); None if filters are applied
+    target: Optional[Tuple[str, str, Optional[int], Optional[int]]]
+
+
+class FFmpegServer(FastAPIServer):  # pylint: disable=too-many-instance-attributes
     """FastAPI-based server for FFmpeg audio transformation."""
 
     def __init__(self, host: str = "0.0.0.0", port: int = 8000):
         super().__init__(host=host, port=port)
-        # Read env and build ffmpeg command parts (prefix + suffix).
-        # At transform time, the input source is slotted between them.
-        channels = os.getenv("AC")
-        samplerate = os.getenv("AR")
-        bitrate = os.getenv("BR")
-        codec = os.getenv("CODEC", "pcm_s16le")
-        audio_filters = os.getenv("AUDIO_FILTERS")
-        self.out_format = os.getenv("FORMAT", "wav")
-
-        self._cmd_prefix = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i"]
-        self._cmd_suffix = []
+        # Output settings from env (AC, AR, BR, CODEC, FORMAT, AUDIO_FILTERS)
+        self._defaults = dict(
+            zip(_OUTPUT_PARAMS, (os.getenv(name) for name in _OUTPUT_ENV))
+        )
+        self._defaults["codec"] = self._defaults["codec"] or "pcm_s16le"
+        self._defaults["format"] = self._defaults["format"] or "wav"
+        self.out_format = self._defaults["format"]
+
+        # Pod-wide limit on concurrent FFmpeg processes; the cores are split
+        # between the slots so that a full pod does not oversubscribe them.
+        # Twice as many slots as cores: a process also waits for its input
+        # and for the client to take its output.
+        cpus = os.cpu_count() or 1
+        slots = max(0, int(os.getenv("FFMPEG_SLOTS", str(2 * cpus))))
+        self.slots = _ProcessSlots(
+            os.getenv("FFMPEG_LOCK_DIR", "/tmp/ffmpeg-slots"), slots
+        )
+        default_threads = max(1, cpus // slots) if slots else 0
+        self.threads = max(0, int(os.getenv("FFMPEG_THREADS", str(default_threads))))
+
+        # Decoder threads before the input, encoder and filter threads after
+        # it (see `_build_settings`). At transform time, the input source is
+        # slotted between the prefix and the settings' suffix.
+        self._cmd_prefix = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+        if self.threads:
+            self._cmd_prefix += ["-threads", str(self.threads)]
+        self._cmd_prefix += ["-i"]
+
+        # In-process transcoding of buffered requests, if the settings allow it
+        self.audio_backend = os.getenv("AUDIO_BACKEND", "ffmpeg").lower()
+        if self.audio_backend not in AUDIO_BACKENDS:
+            raise EnvironmentError(
+                f"Unsupported AUDIO_BACKEND {self.audio_backend!r}: "
+                f"expected one of {AUDIO_BACKENDS}"
+            )
+        self.soundfile_objects = 0
+        self.soundfile_fallbacks = 0
+
+        # Objects whose header already matches the output settings are
+        # returned unchanged
+        self.skip_conformant = os.getenv("SKIP_CONFORMANT", "false").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        self.skipped_objects = 0
+
+        # Long WAV/FLAC objects are cut into segments transcoded concurrently
+        self.segment_threshold = max(0, int(os.getenv("SEGMENT_THRESHOLD", "0")))
+        self.segment_seconds = max(1, int(os.getenv("SEGMENT_SECONDS", "60")))
+        self.segment_workers = max(1, int(os.getenv("SEGMENT_WORKERS", str(cpus))))
+        self.segmented_objects = 0
+
+        # Pool transcoding the audio members of tar shards (each member runs
+        # an FFmpeg process, which takes a slot)
+        self.workers = max(1, int(os.getenv("WORKERS", str(cpus))))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        # Object counters are updated from request and pool threads
+        self._counters_lock = threading.Lock()
+
+        # Settings given per request (etl_args) are built once per combination
+        # and kept in a bounded LRU cache
+        self._get_settings = lru_cache(
+            maxsize=int(os.getenv("COMMAND_CACHE_SIZE", "32"))
+        )(self._build_settings)
+        self.settings = self._build_settings(
+            *(self._defaults[name] for name in _OUTPUT_PARAMS)
+        )
+        if self.audio_backend == "soundfile" and self.settings.soundfile is None:
+            self.logger.warning(
+                "The soundfile backend does not support these settings "
+                "(codec %s, format %s, filters %s), using FFmpeg",
+                self._defaults["codec"],
+                self.out_format,
+                self._defaults["audio_filters"],
+            )
+        if self.segment_threshold and self.settings.segment_suffix is None:
+            self.logger.warning(
+                "Segmented transcoding needs PCM WAV output without filters "
+                "(codec %s, format %s, filters %s), disabled",
+                self._defaults["codec"],
+                self.out_format,
+                self._defaults["audio_filters"],
+            )
+
+        self.use_streaming = streaming_enabled()
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def _build_settings(
+        self,
+        channels: Optional[str],
+        samplerate: Optional[str],
+        bitrate: Optional[str],
+        codec: str,
+        out_format: str,
+        audio_filters: Optional[str],
+    ) -> _OutputSettings:
+        """Build the FFmpeg arguments and backends of a set of output settings."""
+        suffix = []
+        if self.threads:
+            suffix += ["-threads", str(self.threads)]
+            suffix += ["-filter_threads", str(self.threads)]
         if channels:
-            self._cmd_suffix += ["-ac", channels]
+            suffix += ["-ac", channels]
         if samplerate:
-            self._cmd_suffix += ["-ar", samplerate]
-        self._cmd_suffix += ["-c:a", codec]
+            suffix += ["-ar", samplerate]
+        suffix += ["-c:a", codec]
         if audio_filters:
-            self._cmd_suffix += ["-af", audio_filters]
+            suffix += ["-af", audio_filters]
         if bitrate:
-            self._cmd_suffix += ["-b:a", bitrate]
-        self._cmd_suffix += ["-f", self.out_format, "pipe:1"]
+            suffix += ["-b:a", bitrate]
+
+        # Segments are joined as raw PCM (e.g., `-f s16le`) under one WAV
+        # header, so the output must be PCM WAV; filters may depend on the
+        # whole stream
+        segment_suffix = None
+        if (
+            self.segment_threshold
+            and out_format.lower() == "wav"
+            and codec in _WAV_FORMATS
+            and not audio_filters
+        ):
+            segment_suffix = tuple(suffix + ["-f", codec[len("pcm_") :], "pipe:1"])
+        soundfile = None
+        if self.audio_backend == "soundfile":
+            soundfile = _SoundfileBackend.create(
+                channels, samplerate, codec, out_format, audio_filters
+            )
+        target = None
+        if not audio_filters:
+            target = (
+                out_format.lower(),
+                codec,
+                int(samplerate) if samplerate else None,
+                int(channels) if channels else None,
+            )
+        return _OutputSettings(
+            out_format,
+            tuple(suffix + ["-f", out_format, "pipe:1"]),
+            segment_suffix,
+            soundfile,
+            target,
+        )
+
+    def _parse_etl_args(self, etl_args: Optional[str]) -> _OutputSettings:
+        """
+        Return the output settings of a request.
+
+        etl_args keys ("ac", "ar", "br", "codec", "format", "audio_filters")
+        override the corresponding environment variables; the settings are
+        looked up in the LRU cache. Invalid JSON is ignored.
+
+        Raises:
+            ValueError: If an overridden setting is invalid
+        """
+        if not etl_args:
+            return self.settings
+        try:
+            args_dict = json.loads(etl_args)
+        except json.JSONDecodeError:
+            return self.settings  # Ignore invalid JSON and use defaults
+        if not isinstance(args_dict, dict):
+            return self.settings
+        overrides = {
+            name: _validate_param(name, args_dict[name], self.out_format)
+            for name in _OUTPUT_PARAMS
+            if args_dict.get(name) is not None
+        }
+        if not overrides:
+            return self.settings
+        params = {**self._defaults, **overrides}
+        return self._get_settings(*(params[name] for name in _OUTPUT_PARAMS))
+
+    def _setup_app(self):
+        """Register the `/metrics` route ahead of the catch-all object routes."""
+
+        @self.app.get("/metrics")
+        async def metrics():
+            return Response(
+                content=self.render_metrics(), media_type="text/plain; version=0.0.4"
+            )
+
+        super()._setup_app()
 
-    def transform(self, data, path: str, _etl_args: str) -> bytes:
+    def render_metrics(self) -> str:
+        """Return FFmpeg process, slot and settings cache metrics in Prometheus text format."""
+        slots = self.slots
+        metrics = ""
+        for name, metric_type, help_text, value in (
+            ("slots", "gauge", "Pod-wide FFmpeg process limit (0: none).", slots.slots),
+            ("threads", "gauge", "Threads per FFmpeg process (0: auto).", self.threads),
+            ("processes", "gauge", "FFmpeg processes running.", slots.running),
+            ("waiting", "gauge", "Requests waiting for a slot.", slots.waiting),
+            (
+                "processes_total",
+                "counter",
+                "FFmpeg processes started.",
+                slots.started_total,
+            ),
+            (
+                "skipped_total",
+                "counter",
+                "Conformant objects returned unchanged.",
+                self.skipped_objects,
+            ),
+            (
+                "segmented_total",
+                "counter",
+                "Objects transcoded in concurrent segments.",
+                self.segmented_objects,
+            ),
+            (
+                "soundfile_objects_total",
+                "counter",
+                "Objects transcoded in-process.",
+                self.soundfile_objects,
+            ),
+            (
+                "soundfile_fallbacks_total",
+                "counter",
+                "Objects the soundfile backend left to FFmpeg.",
+                self.soundfile_fallbacks,
+            ),
+        ):
+            metrics += (
+                f"# HELP ffmpeg_{name} {help_text}\n"
+                f"# TYPE ffmpeg_{name} {metric_type}\nffmpeg_{name} {value}\n"
+            )
+        metrics += (
+            "# HELP ffmpeg_queue_seconds Time spent waiting for a slot.\n"
+            "# TYPE ffmpeg_queue_seconds summary\n"
+            f"ffmpeg_queue_seconds_sum {slots.queue_seconds_sum}\n"
+            f"ffmpeg_queue_seconds_count {slots.started_total}\n"
+        )
+        return metrics + render_cache_metrics(
+            "ffmpeg_command_cache", self._get_settings.cache_info()
+        )
+
+    @staticmethod
+    def _is_tar_file(path: str) -> bool:
+        """Return True if the object path has a tar archive extension."""
+        return (path or "").lower().endswith(TAR_EXTENSIONS)
+
+    def _set_mime_type(self, path: str, settings: _OutputSettings):
+        """Record the response's MIME type for `get_mime_type`."""
+        set_request_mime_type(
+            TAR_MIME
+            if self._is_tar_file(path)
+            else _MIME_BY_FORMAT.get(
+                settings.out_format.lower(), "application/octet-stream"
+            )
+        )
+
+    @staticmethod
+    def _is_audio(path: str) -> bool:
+        """Return whether the path looks like audio (paths without extension do)."""
+        ext = os.path.splitext(path or "")[1].lower()
+        return not ext or ext in _AUDIO_EXTS
+
+    def _is_conformant(self, header: bytes, settings: _OutputSettings) -> bool:
+        """Return whether an object with this header already has the output settings."""
+        if not self.skip_conformant or settings.target is None:
+            return False
+        probed = probe_audio(header)
+        if probed is None:
+            return False
+        fmt, codec, samplerate, channels = settings.target
+        return (
+            (probed.format, probed.codec) == (fmt, codec)
+            and samplerate in (None, probed.samplerate)
+            and channels in (None, probed.channels)
+        )
+
+    def _raise_ffmpeg_error(self, err: bytes):
+        """Log and raise the error FFmpeg reported on stderr."""
+        msg = err.decode("utf-8", errors="ignore").strip()
+        self.logger.error("FFmpeg error: %s", msg)
+        raise RuntimeError(f"FFmpeg process failed: {msg}")
+
+    def transform(self, data, path: str, etl_args: str) -> bytes:
         """
         Transform input audio using FFmpeg. If the path extension doesn't look
         like audio, pass the data through unchanged.
@@ -70,35 +828,375 @@ class FFmpegServer(FastAPIServer):
         When ETL_DIRECT_FQN=true, `data` is a str (file path) and ffmpeg reads
         the file directly — avoiding loading the entire file into memory.
         Otherwise `data` is bytes piped through stdin.
+
+        With `SKIP_CONFORMANT=true`, WAV/FLAC objects whose header already
+        matches the output settings are returned as is. With
+        `AUDIO_BACKEND=soundfile`, objects are transcoded in-process, and only
+        those the backend cannot handle go through FFmpeg. Objects from
+        `SEGMENT_THRESHOLD` bytes are split across several FFmpeg processes.
+
+        Tar shards are transcoded member by member (see
+        `_transform_tar_stream`). etl_args may override the output settings
+        (see the module docstring).
         """
-        ext = os.path.splitext(path or "")[1].lower()
-        if ext and ext not in _AUDIO_EXTS:
+        settings = self._parse_etl_args(etl_args)
+        self._set_mime_type(path, settings)
+        if self._is_tar_file(path):
+            with (
+                open(data, "rb") if isinstance(data, str) else io.BytesIO(data)
+            ) as reader:
+                return b"".join(self._transform_tar_stream(reader, settings))
+        if not self._is_audio(path):
             if isinstance(data, str):
                 with open(data, "rb") as f:
                     return f.read()
             return data
+        return self._transcode(data, settings)
+
+    def _transcode(self, data, settings: _OutputSettings) -> bytes:
+        """Transcode an audio object (bytes, or a file path with `ETL_DIRECT_FQN`)."""
+        out = self._passthrough_conformant(data, settings)
+        if out is not None:
+            with self._counters_lock:
+                self.skipped_objects += 1
+            return out
+
+        if settings.segment_suffix is not None:
+            out = self._transcode_segments(data, settings)
+            if out is not None:
+                with self._counters_lock:
+                    self.segmented_objects += 1
+                return out
+
+        if settings.soundfile is not None:
+            out = settings.soundfile.transcode(data)
+            if out is not None:
+                with self._counters_lock:
+                    self.soundfile_objects += 1
+                return out
+            with self._counters_lock:
+                self.soundfile_fallbacks += 1
 
         # Build command: file path (FQN) or pipe:0 (bytes)
         if isinstance(data, str):
-            cmd = self._cmd_prefix + [data] + self._cmd_suffix
+            cmd = self._cmd_prefix + [data, *settings.cmd_suffix]
             stdin, input_data = subprocess.DEVNULL, None
         else:
-            cmd = self._cmd_prefix + ["pipe:0"] + self._cmd_suffix
+            cmd = self._cmd_prefix + ["pipe:0", *settings.cmd_suffix]
             stdin, input_data = subprocess.PIPE, data
 
-        with subprocess.Popen(
+        with self.slots.acquire(), subprocess.Popen(
             cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE
         ) as proc:
             out, err = proc.communicate(input=input_data)
         if proc.returncode != 0:
-            msg = err.decode("utf-8", errors="ignore").strip()
-            self.logger.error("FFmpeg error: %s", msg)
-            raise RuntimeError(f"FFmpeg process failed: {msg}")
+            self._raise_ffmpeg_error(err)
         return out
 
+    def _passthrough_conformant(
+        self, data, settings: _OutputSettings
+    ) -> Optional[bytes]:
+        """Return the object if it already has the output settings, else None."""
+        if not self.skip_conformant:
+            return None
+        if not isinstance(data, str):
+            return data if self._is_conformant(data[:_PROBE_SIZE], settings) else None
+        with open(data, "rb") as f:
+            if not self._is_conformant(f.read(_PROBE_SIZE), settings):
+                return None
+            f.seek(0)
+            return f.read()
+
+    def _transcode_segments(self, data, settings: _OutputSettings) -> Optional[bytes]:
+        """
+        Transcode a long WAV/FLAC object in concurrent segments. Returns None
+        for objects below `SEGMENT_THRESHOLD`, too short for two segments, or
+        whose header does not give their length.
+
+        Cuts fall on whole seconds, so they are sample-exact at any integer
+        input and output rate. Each FFmpeg process seeks `_SEGMENT_PAD`
+        seconds before its cut and reads as far past the next one; the padding
+        is dropped from its raw PCM output, and the segments are joined under
+        one WAV header.
+        """
+        if isinstance(data, str):
+            if os.path.getsize(data) < self.segment_threshold:
+                return None
+            with open(data, "rb") as f:
+                probed = probe_audio(f.read(_PROBE_SIZE))
+        else:
+            if len(data) < self.segment_threshold:
+                return None
+            probed = probe_audio(data[:_PROBE_SIZE])
+        if probed is None or probed.frames is None:
+            return None
+        duration = probed.frames / probed.samplerate
+        count = min(self.segment_workers, int(duration // self.segment_seconds))
+        if count < 2:
+            return None
+
+        _, codec, samplerate, channels = settings.target
+        samplerate = samplerate or probed.samplerate
+        channels = channels or probed.channels
+        bytes_per_second = samplerate * channels * _WAV_FORMATS[codec][1] // 8
+        cuts = [round(i * duration / count) for i in range(count)]
+        segments = self._run_segments(
+            data, settings.segment_suffix, cuts, bytes_per_second
+        )
+        header = _wav_header(
+            codec, samplerate, channels, sum(len(seg) for seg in segments)
+        )
+        return b"".join([header, *segments])
+
+    def _run_segments(
+        self,
+        data,
+        suffix: Tuple[str, ...],
+        cuts: List[int],
+        bytes_per_second: int,
+    ) -> List[memoryview]:
+        """
+        Transcode the segments between `cuts` concurrently. FFmpeg seeks in its
+        input, so bytes are spilled to a temporary file first.
+        """
+        with ExitStack() as stack:
+            src = data
+            if not isinstance(data, str):
+                tmp = stack.enter_context(
+                    tempfile.NamedTemporaryFile(prefix="ffmpeg-segment-")
+                )
+                tmp.write(data)
+                tmp.flush()
+                src = tmp.name
+            with ThreadPoolExecutor(len(cuts)) as pool:
+                segments = list(
+                    pool.map(
+                        partial(self._transcode_segment, src, suffix, bytes_per_second),
+                        cuts,
+                        cuts[1:] + [None],
+                    )
+                )
+        return segments
+
+    def _transcode_segment(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        src: str,
+        suffix: Tuple[str, ...],
+        bytes_per_second: int,
+        start: int,
+        end: Optional[int],
+    ) -> memoryview:
+        """Return the raw PCM output from `start` to `end` (seconds; None: EOF)."""
+        seek = max(0, start - _SEGMENT_PAD)
+        cmd = self._cmd_prefix[:-1] + ["-ss", str(seek)]
+        if end is not None:
+            cmd += ["-t", str(end + _SEGMENT_PAD - seek)]
+        cmd += ["-i", src, *suffix]
+        with self.slots.acquire(), subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        ) as proc:
+            out, err = proc.communicate()
+        if proc.returncode != 0:
+            self._raise_ffmpeg_error(err)
+        skip = (start - seek) * bytes_per_second
+        keep = None if end is None else skip + (end - start) * bytes_per_second
+        return memoryview(out)[skip:keep]
+
+    def transform_stream(
+        self, reader: BinaryIO, path: str, etl_args: Optional[str] = None
+    ) -> Iterator[bytes]:
+        """
+        Transform input audio as a stream (used when `STREAMING=true`).
+
+        The request is copied into FFmpeg's stdin chunk by chunk while a reader
+        thread collects FFmpeg's stdout; whatever output is ready is yielded
+        after every input chunk, so neither the input nor the output is held
+        in memory and the first bytes go out while the input is still
+        arriving. The request is read here rather than in a separate thread
+        because the SDK's request reader is bound to the thread serving the
+        response. stderr is collected by another thread and reported as in
+        `transform` if FFmpeg fails (by then, the response has started, so the
+        error aborts it).
+
+        etl_args are parsed before the output generator is returned, so that
+        invalid settings fail the request before it starts and `get_mime_type`
+        sees the request's format.
+        """
+        settings = self._parse_etl_args(etl_args)
+        self._set_mime_type(path, settings)
+        return self._stream(reader, path, settings)
+
+    def _stream(
+        self, reader: BinaryIO, path: str, settings: _OutputSettings
+    ) -> Iterator[bytes]:
+        """Yield the transformed stream (see `transform_stream`)."""
+        if self._is_tar_file(path):
+            yield from self._transform_tar_stream(reader, settings)
+            return
+        chunks = iter(lambda: reader.read(_CHUNK_SIZE), b"")
+        if not self._is_audio(path):
+            yield from chunks
+            return
+
+        header = reader.read(_PROBE_SIZE)
+        if self._is_conformant(header, settings):
+            with self._counters_lock:
+                self.skipped_objects += 1
+            yield header
+            yield from chunks
+            return
+        yield from self._pipe_ffmpeg(chain([header], chunks), settings)
+
+    def _transcode_member(
+        self, member: tarfile.TarInfo, data: bytes, settings: _OutputSettings
+    ) -> Tuple[tarfile.TarInfo, bytes]:
+        """Transcode an audio member of a tar shard, renamed for the output format."""
+        try:
+            output = self._transcode(data, settings)
+        except Exception as e:
+            raise RuntimeError(f"Error transforming {member.name}: {str(e)}") from e
+        out_member = copy.copy(member)
+        out_member.name = _output_name(member.name, settings.out_format)
+        out_member.size = len(output)
+        return out_member, output
+
+    def _transform_tar_stream(
+        self, reader: BinaryIO, settings: _OutputSettings
+    ) -> Iterator[bytes]:
+        """
+        Transcode the audio members of a tar (WebDataset) shard in parallel.
+
+        The input is read in streaming mode (`r|*`) and audio members are
+        transcoded by `WORKERS` threads, with at most `2 * WORKERS` members in
+        flight. Results are written to the output shard (`w|`) in input order;
+        other members (e.g., `.txt`, `.json`) are passed through unchanged.
+
+        Args:
+            reader: File-like object containing the tar shard.
+            settings: Output settings of the request.
+
+        Yields:
+            Chunks of the transformed tar shard.
+        """
+        in_flight: deque = deque()
+        buf = StreamingTarBuffer()
+        with tarfile.open(fileobj=reader, mode="r|*") as input_tar, tarfile.open(
+            fileobj=buf, mode="w|"
+        ) as output_tar:
+            for member in input_tar:
+                if not member.isfile():
+                    continue
+                data = input_tar.extractfile(member).read()
+                if os.path.splitext(member.name)[1].lower() in _AUDIO_EXTS:
+                    in_flight.append(
+                        self._pool.submit(
+                            self._transcode_member, member, data, settings
+                        )
+                    )
+                else:
+                    in_flight.append(completed((member, data)))
+
+                # Write completed members in order, bounding the work in flight
+                while in_flight and (
+                    in_flight[0].done() or len(in_flight) >= 2 * self.workers
+                ):
+                    out_member, out_data = in_flight.popleft().result()
+                    output_tar.addfile(out_member, io.BytesIO(out_data))
+                chunk = buf.drain()
+                if chunk:
+                    yield chunk
+
+            while in_flight:
+                out_member, out_data = in_flight.popleft().result()
+                output_tar.addfile(out_member, io.BytesIO(out_data))
+
+        # Yield the remaining members and the end-of-archive markers
+        chunk = buf.drain()
+        if chunk:
+            yield chunk
+
+    def _pipe_ffmpeg(
+        self, chunks: Iterator[bytes], settings: _OutputSettings
+    ) -> Iterator[bytes]:
+        """Pipe the input chunks through FFmpeg and yield its output as it comes."""
+        cmd = self._cmd_prefix + ["pipe:0", *settings.cmd_suffix]
+        with self.slots.acquire(), subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        ) as proc:
+            # Unbounded, but FFmpeg only produces output for the input fed to
+            # it, and the queue is drained after every input chunk. Bounding
+            # it could deadlock: a blocked stdout reader stalls FFmpeg, which
+            # stops reading stdin while this thread is writing to it.
+            output: queue.SimpleQueue = queue.SimpleQueue()
+            stderr_chunks: List[bytes] = []
+            threads = [
+                threading.Thread(
+                    target=self._read_stdout, args=(proc, output), daemon=True
+                ),
+                threading.Thread(
+                    target=lambda: stderr_chunks.append(proc.stderr.read()),
+                    daemon=True,
+                ),
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                for chunk in chunks:
+                    try:
+                        proc.stdin.write(chunk)
+                    except BrokenPipeError:
+                        # FFmpeg exited: its exit status and stderr tell why
+                        break
+                    yield from self._ready_output(output)
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+                while (chunk := output.get()) is not None:
+                    yield chunk
+                proc.wait()
+                for thread in threads:
+                    thread.join()
+            finally:
+                if proc.poll() is None:
+                    # The client went away or the request could not be read:
+                    # stop FFmpeg (the reader threads then see EOF)
+                    proc.kill()
+
+        if proc.returncode != 0:
+            self._raise_ffmpeg_error(b"".join(stderr_chunks))
+
+    @staticmethod
+    def _read_stdout(proc: subprocess.Popen, output: queue.SimpleQueue):
+        """Put FFmpeg's stdout on `output` chunk by chunk; `None` marks EOF."""
+        try:
+            while chunk := proc.stdout.read1(_CHUNK_SIZE):
+                output.put(chunk)
+        finally:
+            output.put(None)
+
+    @staticmethod
+    def _ready_output(output: queue.SimpleQueue) -> Iterator[bytes]:
+        """Yield the output chunks queued so far without waiting for more."""
+        while True:
+            try:
+                chunk = output.get_nowait()
+            except queue.Empty:
+                return
+            if chunk is None:
+                # Keep the EOF marker for the final drain
+                output.put(None)
+                return
+            yield chunk
+
     def get_mime_type(self) -> str:
-        """Return MIME type based on configured output format."""
-        return _MIME_BY_FORMAT.get(self.out_format.lower(), "application/octet-stream")
+        """Return the MIME type of the current request's output (a tar for shards)."""
+        return request_mime_type(
+            _MIME_BY_FORMAT.get(self.out_format.lower(), "application/octet-stream")
+        )
 
 
 # Expose FastAPI app
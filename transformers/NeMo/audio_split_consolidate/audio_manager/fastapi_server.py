@@ -3,7 +3,8 @@ Audio Manager ETL Server
 
 This FastAPI server reads a newline-delimited JSON manifest from AIS, invokes an ETL
 transformer for each record to slice audio files, and streams a TAR archive of the
-resulting WAV segments — without buffering the entire archive in memory.
+resulting WAV segments — without buffering the entire archive in memory. Slices are
+fetched concurrently and written to the archive in manifest order.
 
 Environment variables:
 - AIS_TARGET_URL (required): Base URL for AIS target, used for FQN or network fetch.
@@ -14,7 +15,8 @@ Environment variables:
 - OBJ_EXTENSION: Audio file extension (default: "wav").
 - ETL_NAME (required): Name of the ETL job to invoke.
 - DIRECT_FROM_TARGET: Whether to use direct_put (default: "true").
-- MAX_POOL_SIZE: HTTP connection pool size for AIS SDK client (default: "50").
+- MAX_POOL_SIZE: HTTP connection pool size for AIS SDK client, and number of slices
+  fetched concurrently per manifest (default: "50").
 
 Copyright (c) 2025-2026, NVIDIA CORPORATION. All rights reserved.
 """
@@ -23,6 +25,8 @@ import io
 import json
 import os
 import tarfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, BinaryIO, Dict, Iterator, Optional
 
 from aistore import Client
@@ -60,8 +64,9 @@ class AudioManagerServer(FastAPIServer):  # pylint: disable=too-many-instance-at
         {"id": "<object_id>", "part": <int>, "from_time": <float>, "to_time": <float>, ...}
 
     Returns:
-        A streamed TAR archive of `<id>_<part>.wav` files produced by the ETL.
-        Only one WAV file is held in memory at a time.
+        A streamed TAR archive of `<id>_<part>.wav` files produced by the ETL,
+        in manifest order. At most `MAX_POOL_SIZE` WAV files are held in memory
+        per manifest.
     """
 
     def __init__(self, port: int = 8000) -> None:
@@ -88,6 +93,8 @@ class AudioManagerServer(FastAPIServer):  # pylint: disable=too-many-instance-at
         self.src_bucket = self.ais_client.bucket(
             bck_name=self.bucket_name, provider=self.provider
         )
+        # Fetches slices through the ETL (one connection of the pool each)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, self.max_pool_size))
 
         self.logger.info(
             "AudioManagerServer initialized for bucket %s", self.bucket_name
@@ -137,15 +144,36 @@ class AudioManagerServer(FastAPIServer):  # pylint: disable=too-many-instance-at
         )
         return reader.read_all()
 
+    def _add_slice(
+        self, tar: tarfile.TarFile, idx: int, record: Dict[str, Any], future: Future
+    ) -> bool:
+        """
+        Wait for one fetched slice and add it to the archive.
+
+        Returns:
+            True if the slice was added, False if fetching it failed.
+        """
+        try:
+            audio = future.result()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error("Line %d failed: %s", idx, e)
+            return False
+        tar_info = tarfile.TarInfo(name=f"{record['id']}_{record['part']}.wav")
+        tar_info.size = len(audio)
+        tar.addfile(tarinfo=tar_info, fileobj=io.BytesIO(audio))
+        return True
+
     def transform_stream(
         self, reader: BinaryIO, _path: str, _etl_args: str
     ) -> Iterator[bytes]:
         """
         Stream a TAR archive of audio segments given a JSONL manifest.
 
-        Uses tarfile streaming mode ('w|') and a drainable buffer so that
-        only one WAV file is held in memory at a time. Each chunk is yielded
-        as soon as tarfile writes it.
+        Slices are fetched by a pool of `MAX_POOL_SIZE` threads, with at most
+        `MAX_POOL_SIZE` slices in flight or waiting to be written (and thus
+        WAV files held in memory). They are written in manifest order, using
+        tarfile streaming mode ('w|') and a drainable buffer, and each chunk
+        is yielded as soon as tarfile writes it.
 
         Args:
             reader: File-like object containing JSONL manifest data.
@@ -161,28 +189,38 @@ class AudioManagerServer(FastAPIServer):  # pylint: disable=too-many-instance-at
         self.logger.info("transform_stream: received %d bytes", len(data))
 
         buf = _StreamingTarBuffer()
+        in_flight: deque = deque()
         processed, errors = 0, 0
 
-        with tarfile.open(fileobj=buf, mode="w|", format=tarfile.GNU_FORMAT) as tar:
-            for idx, line in enumerate(
-                (l.strip() for l in data.splitlines() if l.strip()), start=1
-            ):
-                record = self._process_json_line(line)
-                if record is None:
-                    self.logger.warning("Skipping invalid manifest line %d", idx)
-                    continue
+        try:
+            with tarfile.open(fileobj=buf, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+                for idx, line in enumerate(
+                    (l.strip() for l in data.splitlines() if l.strip()), start=1
+                ):
+                    record = self._process_json_line(line)
+                    if record is None:
+                        self.logger.warning("Skipping invalid manifest line %d", idx)
+                        continue
 
-                try:
                     self.logger.debug(
                         "Line %d: fetching audio for %s", idx, record["id"]
                     )
-                    audio = self._fetch_transformed_audio(record)
-                    tar_info = tarfile.TarInfo(
-                        name=f"{record['id']}_{record['part']}.wav"
+                    in_flight.append(
+                        (
+                            idx,
+                            record,
+                            self._pool.submit(self._fetch_transformed_audio, record),
+                        )
                     )
-                    tar_info.size = len(audio)
-                    tar.addfile(tarinfo=tar_info, fileobj=io.BytesIO(audio))
-                    processed += 1
+
+                    # Write fetched slices in manifest order, bounding the
+                    # slices in flight
+                    while in_flight and (
+                        in_flight[0][2].done() or len(in_flight) >= self.max_pool_size
+                    ):
+                        added = self._add_slice(tar, *in_flight.popleft())
+                        processed += added
+                        errors += not added
 
                     chunk = buf.drain()
                     if chunk:
@@ -194,9 +232,17 @@ class AudioManagerServer(FastAPIServer):  # pylint: disable=too-many-instance-at
                         )
                         yield chunk
 
-                except Exception as e:  # pylint: disable=broad-exception-caught
-                    errors += 1
-                    self.logger.error("Line %d failed: %s", idx, e)
+                while in_flight:
+                    added = self._add_slice(tar, *in_flight.popleft())
+                    processed += added
+                    errors += not added
+                    chunk = buf.drain()
+                    if chunk:
+                        yield chunk
+        finally:
+            # Drop pending fetches if the client goes away
+            for *_, future in in_flight:
+                future.cancel()
 
         # Yield final TAR end-of-archive markers written by tar.close() (via with)
         chunk = buf.drain()
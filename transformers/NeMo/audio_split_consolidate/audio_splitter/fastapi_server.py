@@ -15,7 +15,6 @@ Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
 import json
 from io import BytesIO
 from typing import Any, Dict
-from urllib.parse import unquote_plus
 
 import soundfile as sf
 from fastapi import HTTPException
@@ -41,7 +40,7 @@ class AudioSplitterServer(FastAPIServer):
 
     def _parse_etl_args(self, raw: str) -> Dict[str, Any]:
         """
-        Decode and validate the `etl_args` JSON string.
+        Parse and validate the `etl_args` JSON string (already URL-decoded).
 
         Raises:
             HTTPException(400): if missing or invalid JSON or required keys.
@@ -49,8 +48,7 @@ class AudioSplitterServer(FastAPIServer):
         if not raw:
             raise HTTPException(400, "Missing required query parameter 'etl_args'")
         try:
-            decoded = unquote_plus(raw)
-            args = json.loads(decoded)
+            args = json.loads(raw)
         except Exception as e:
             self.logger.error("Failed to decode etl_args: %s", e)
             raise HTTPException(400, "Invalid etl_args JSON") from e
@@ -0,0 +1,5 @@
+#
+# Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+#
+
+"""Helpers shared by the FastAPI transformer servers."""
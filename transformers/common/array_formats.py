@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+#
+
+"""
+Output formats shared by the image transformers (torchvision, keras): tar
+member extensions, MIME types and the array formats written without image
+encoding.
+"""
+
+import io
+import json
+import struct
+
+import numpy as np
+from PIL import Image
+
+# Array output formats, written without image encoding
+ARRAY_FORMATS = ("npy", "safetensors", "raw")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+# Extension of tar members written in each output format (first one is preferred)
+FORMAT_EXTENSIONS = {
+    "jpeg": (".jpg", ".jpeg"),
+    "jpg": (".jpg", ".jpeg"),
+    "png": (".png",),
+    "bmp": (".bmp",),
+    "tiff": (".tiff", ".tif"),
+    "webp": (".webp",),
+    "npy": (".npy",),
+    "safetensors": (".safetensors",),
+    "raw": (".raw",),
+}
+
+# Header of the `raw` format: magic, number of dimensions, then one uint32 per dimension
+RAW_MAGIC = b"AIU8"
+
+SAFETENSORS_DTYPES = {
+    "float16": "F16",
+    "float32": "F32",
+    "float64": "F64",
+    "uint8": "U8",
+    "int8": "I8",
+    "int16": "I16",
+    "int32": "I32",
+    "int64": "I64",
+    "bool": "BOOL",
+}
+
+
+def output_mime_type(output_format: str) -> str:
+    """Return the MIME type of an object written in an output format."""
+    output_format = output_format.upper()
+    if output_format.lower() in ARRAY_FORMATS:
+        return "application/octet-stream"
+    Image.init()
+    return Image.MIME.get(
+        "JPEG" if output_format == "JPG" else output_format, "application/octet-stream"
+    )
+
+
+def encode_array(array: np.ndarray, output_format: str) -> bytes:
+    """
+    Serialize an array as `.npy`, safetensors (single tensor named `image`)
+    or `raw` (`RAW_MAGIC`, uint32 ndim, uint32 dims, then uint8 C-order data).
+
+    All three formats can be memory-mapped by the reader without decoding.
+    """
+    array = np.ascontiguousarray(array)
+    output_format = output_format.lower()
+    if output_format == "npy":
+        buf = io.BytesIO()
+        np.save(buf, array, allow_pickle=False)
+        return buf.getvalue()
+    if output_format == "safetensors":
+        header = json.dumps(
+            {
+                "image": {
+                    "dtype": SAFETENSORS_DTYPES[array.dtype.name],
+                    "shape": list(array.shape),
+                    "data_offsets": [0, array.nbytes],
+                }
+            }
+        ).encode()
+        # Pad the header so that the data is 8-byte aligned
+        header += b" " * (-len(header) % 8)
+        return struct.pack("<Q", len(header)) + header + array.tobytes()
+    if array.dtype != np.uint8:
+        raise ValueError(f"raw output requires uint8 data, got {array.dtype}")
+    header = RAW_MAGIC + struct.pack(f"<I{array.ndim}I", array.ndim, *array.shape)
+    return header + array.tobytes()
@@ -0,0 +1,98 @@
+#
+# Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+#
+
+"""
+Building blocks shared by the FastAPI transformer servers: environment flags,
+per-request MIME types, tar streaming and Prometheus rendering of cache
+statistics.
+
+Images copy this package next to their server (see each transformer's
+Dockerfile, built with `transformers/` as the context).
+"""
+
+import io
+import os
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Any, Optional
+
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+TAR_MIME = "application/x-tar"
+
+# MIME type of the response to the request being served, for `get_mime_type`.
+# The SDK calls `get_mime_type` after `transform` (or `transform_stream`) in the
+# same request context, so the value set by the request is the one it reads.
+_REQUEST_MIME_TYPE: ContextVar[Optional[str]] = ContextVar(
+    "request_mime_type", default=None
+)
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    """Return True if the environment variable is "1", "true" or "yes"."""
+    return os.environ.get(name, default).lower() in ("1", "true", "yes")
+
+
+def streaming_enabled() -> bool:
+    """
+    Return True if requests are served by `transform_stream` (`STREAMING=true`).
+
+    The SDK prefers `transform` whenever it is overridden, so streaming
+    (`transform_stream`) is opted into explicitly.
+    """
+    return env_flag("STREAMING")
+
+
+def set_request_mime_type(mime_type: str) -> None:
+    """Record the MIME type of the response to the request being served."""
+    _REQUEST_MIME_TYPE.set(mime_type)
+
+
+def request_mime_type(default: str) -> str:
+    """Return the MIME type recorded by the request being served, or `default`."""
+    return _REQUEST_MIME_TYPE.get() or default
+
+
+class StreamingTarBuffer:
+    """Write-only buffer that lets you drain chunks as tarfile writes them."""
+
+    def __init__(self) -> None:
+        self._buf: io.BytesIO = io.BytesIO()
+
+    def write(self, data: bytes) -> int:
+        """Write data to the internal buffer."""
+        self._buf.write(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """Return the current buffer position."""
+        return self._buf.tell()
+
+    def drain(self) -> bytes:
+        """Return buffered data and reset."""
+        val = self._buf.getvalue()
+        self._buf = io.BytesIO()
+        return val
+
+
+def completed(value: Any) -> Future:
+    """Wrap a value in an already completed future."""
+    future: Future = Future()
+    future.set_result(value)
+    return future
+
+
+def render_cache_metrics(prefix: str, info: Any) -> str:
+    """Render `functools.lru_cache` statistics in Prometheus text format."""
+    lines = []
+    for name, kind, help_text, value in (
+        ("hits_total", "counter", "Lookups served from the cache.", info.hits),
+        ("misses_total", "counter", "Lookups that built a new entry.", info.misses),
+        ("size", "gauge", "Entries currently cached.", info.currsize),
+    ):
+        lines += [
+            f"# HELP {prefix}_{name} {help_text}",
+            f"# TYPE {prefix}_{name} {kind}",
+            f"{prefix}_{name} {value}",
+        ]
+    return "\n".join(lines) + "\n"
@@ -17,7 +17,6 @@ import bz2
 import gzip
 import json
 import os
-from urllib.parse import unquote_plus
 
 from aistore.sdk.etl.webserver.fastapi_server import FastAPIServer
 
@@ -96,9 +95,8 @@ class CompressServer(FastAPIServer):
         # Override with etl_args if provided
         if etl_args:
             try:
-                # URL decode the ETL args first
-                decoded_args = unquote_plus(etl_args)
-                args_dict = json.loads(decoded_args)
+                # etl_args arrive URL-decoded (query parameter or control message)
+                args_dict = json.loads(etl_args)
 
                 # Override mode if provided in etl_args
                 if "mode" in args_dict and args_dict["mode"] in [
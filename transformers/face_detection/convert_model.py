@@ -0,0 +1,493 @@
+"""
+Caffe to ONNX conversion of the SSD face detection model.
+
+Converts the Caffe model used by the face detection transformer
+(`architecture.txt` + `weights.caffemodel`) to ONNX, so that it can be run
+with ONNX Runtime or OpenVINO, and optionally quantizes it to INT8.
+
+The converted graph covers the network up to the SSD heads and has three
+outputs:
+  - mbox_loc           : [N, num_priors * 4] box regressions
+  - mbox_conf_flatten  : [N, num_priors * 2] class probabilities
+  - mbox_priorbox      : [1, 2, num_priors * 4] prior boxes and variances
+
+`PriorBox` layers only depend on the (fixed) input size, so the priors are
+computed once with OpenCV and stored as a constant. The `DetectionOutput`
+layer (box decoding and NMS) has no ONNX equivalent and is applied by the
+transformer on the model outputs.
+
+INT8 quantization is calibrated on a directory of unannotated images
+representative of the dataset (a few hundred are enough).
+
+Usage (e.g., at image build time):
+  python convert_model.py --model-dir ./model --precision fp32
+  python convert_model.py --model-dir ./model --precision int8 --calibration-dir ./calibration
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import os
+import re
+import argparse
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+MODEL_INPUT_SIZE = (300, 300)
+MODEL_MEAN = (104.0, 117.0, 123.0)
+ONNX_OPSET = 17
+# Oldest IR version supporting ONNX_OPSET, so that older runtimes load the model
+ONNX_IR_VERSION = 8
+OUTPUT_NAMES = ("mbox_loc", "mbox_conf_flatten", "mbox_priorbox")
+CALIBRATION_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}:]|[^\s{}:"]+')
+
+
+def _parse_value(token: str) -> Any:
+    """Convert a prototxt scalar token to a Python value."""
+    if token.startswith('"'):
+        return token[1:-1]
+    if token in ("true", "false"):
+        return token == "true"
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return token  # enum value, e.g. MAX or CENTER_SIZE
+
+
+def parse_prototxt(text: str) -> Dict[str, List[Any]]:
+    """
+    Parse a Caffe prototxt (protobuf text format) into nested dicts.
+
+    Every field maps to the list of its values, since most Caffe fields
+    (e.g., `layer`, `bottom`, `order`) may be repeated.
+    """
+    text = "\n".join(line.split("#", 1)[0] for line in text.splitlines())
+    root: Dict[str, List[Any]] = {}
+    stack = [root]
+    tokens = _TOKEN_RE.findall(text)
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "}":
+            stack.pop()
+            i += 1
+            continue
+        if tokens[i + 1] == ":" and tokens[i + 2] != "{":
+            stack[-1].setdefault(token, []).append(_parse_value(tokens[i + 2]))
+            i += 3
+            continue
+        # Message field, with or without the optional colon
+        i += 3 if tokens[i + 1] == ":" else 2
+        message: Dict[str, List[Any]] = {}
+        stack[-1].setdefault(token, []).append(message)
+        stack.append(message)
+    return root
+
+
+def _param(layer: Dict[str, List[Any]], section: str) -> Dict[str, List[Any]]:
+    """Return the `<type>_param` message of a layer (empty if not set)."""
+    return layer.get(section, [{}])[0]
+
+
+def _first(message: Dict[str, List[Any]], field: str, default: Any) -> Any:
+    """Return the first value of a (possibly repeated) field."""
+    return message.get(field, [default])[0]
+
+
+class _GraphBuilder:
+    """Accumulate ONNX nodes and initializers while walking the Caffe layers."""
+
+    def __init__(self):
+        # pylint: disable=import-outside-toplevel
+        from onnx import helper, numpy_helper
+
+        self.helper = helper
+        self.numpy_helper = numpy_helper
+        self.nodes = []
+        self.initializers = []
+        self.tensors: Dict[str, str] = {}  # Caffe blob name -> current ONNX name
+        self._counter = 0
+
+    def constant(self, name: str, value: np.ndarray) -> str:
+        """Add an initializer and return its name."""
+        self.initializers.append(self.numpy_helper.from_array(value, name))
+        return name
+
+    def add(self, op_type: str, inputs: List[str], top: str, **attrs) -> str:
+        """
+        Add a node producing Caffe blob `top`.
+
+        Caffe layers often run in place (`top` == `bottom`), so every output
+        gets a unique ONNX name and `tensors` tracks the latest one.
+        """
+        self._counter += 1
+        output = f"{top}__{self._counter}"
+        self.nodes.append(
+            self.helper.make_node(
+                op_type, inputs, [output], name=f"{op_type}_{self._counter}", **attrs
+            )
+        )
+        self.tensors[top] = output
+        return output
+
+
+def _convolution(builder, layer, blobs, bottom, top):
+    conv = _param(layer, "convolution_param")
+    kernel = _first(conv, "kernel_size", 1)
+    pad = _first(conv, "pad", 0)
+    stride = _first(conv, "stride", 1)
+    dilation = _first(conv, "dilation", 1)
+    name = layer["name"][0]
+    inputs = [bottom, builder.constant(f"{name}_w", blobs[0])]
+    if _first(conv, "bias_term", True):
+        inputs.append(builder.constant(f"{name}_b", blobs[1].reshape(-1)))
+    builder.add(
+        "Conv",
+        inputs,
+        top,
+        kernel_shape=[kernel, kernel],
+        pads=[pad] * 4,
+        strides=[stride, stride],
+        dilations=[dilation, dilation],
+        group=_first(conv, "group", 1),
+    )
+
+
+def _batch_norm(builder, layer, blobs, bottom, top):
+    name = layer["name"][0]
+    scale_factor = float(blobs[2].reshape(-1)[0])
+    scale_factor = 1.0 / scale_factor if scale_factor else 0.0
+    mean = blobs[0].reshape(-1) * scale_factor
+    var = blobs[1].reshape(-1) * scale_factor
+    eps = _first(_param(layer, "batch_norm_param"), "eps", 1e-5)
+    builder.add(
+        "BatchNormalization",
+        [
+            bottom,
+            builder.constant(f"{name}_gamma", np.ones_like(mean)),
+            builder.constant(f"{name}_beta", np.zeros_like(mean)),
+            builder.constant(f"{name}_mean", mean),
+            builder.constant(f"{name}_var", var),
+        ],
+        top,
+        epsilon=float(eps),
+    )
+
+
+def _scale(builder, layer, blobs, bottom, top):
+    name = layer["name"][0]
+    scaled = builder.add(
+        "Mul",
+        [bottom, builder.constant(f"{name}_gamma", blobs[0].reshape(1, -1, 1, 1))],
+        top,
+    )
+    if _first(_param(layer, "scale_param"), "bias_term", False):
+        builder.add(
+            "Add",
+            [scaled, builder.constant(f"{name}_beta", blobs[1].reshape(1, -1, 1, 1))],
+            top,
+        )
+
+
+def _pooling(builder, layer, _blobs, bottom, top):
+    pool = _param(layer, "pooling_param")
+    kernel = _first(pool, "kernel_size", 1)
+    stride = _first(pool, "stride", 1)
+    pad = _first(pool, "pad", 0)
+    op_type = "MaxPool" if _first(pool, "pool", "MAX") == "MAX" else "AveragePool"
+    # Caffe rounds the output size up
+    builder.add(
+        op_type,
+        [bottom],
+        top,
+        kernel_shape=[kernel, kernel],
+        strides=[stride, stride],
+        pads=[pad] * 4,
+        ceil_mode=1,
+    )
+
+
+def _normalize(builder, layer, blobs, bottom, top):
+    norm = _param(layer, "norm_param")
+    if _first(norm, "across_spatial", True):
+        raise ValueError("Normalize with across_spatial=true is not supported")
+    name = layer["name"][0]
+    eps = float(_first(norm, "eps", 1e-10))
+    squared = builder.add("Mul", [bottom, bottom], f"{top}_sq")
+    sum_squared = builder.add(
+        "ReduceSum",
+        [squared, builder.constant(f"{name}_axes", np.array([1], dtype=np.int64))],
+        f"{top}_sum",
+        keepdims=1,
+    )
+    shifted = builder.add(
+        "Add",
+        [sum_squared, builder.constant(f"{name}_eps", np.array(eps, np.float32))],
+        f"{top}_eps",
+    )
+    norm_value = builder.add("Sqrt", [shifted], f"{top}_norm")
+    normalized = builder.add("Div", [bottom, norm_value], top)
+    scale = blobs[0].reshape(-1)
+    if _first(norm, "channel_shared", True):
+        scale = scale[:1]
+    builder.add(
+        "Mul",
+        [normalized, builder.constant(f"{name}_scale", scale.reshape(1, -1, 1, 1))],
+        top,
+    )
+
+
+def _permute(builder, layer, _blobs, bottom, top):
+    builder.add(
+        "Transpose", [bottom], top, perm=_param(layer, "permute_param")["order"]
+    )
+
+
+def _flatten(builder, layer, _blobs, bottom, top):
+    builder.add(
+        "Flatten", [bottom], top, axis=_first(_param(layer, "flatten_param"), "axis", 1)
+    )
+
+
+def _reshape(builder, layer, _blobs, bottom, top):
+    shape = _param(layer, "reshape_param")["shape"][0]["dim"]
+    builder.add(
+        "Reshape",
+        [
+            bottom,
+            builder.constant(f"{layer['name'][0]}_shape", np.array(shape, np.int64)),
+        ],
+        top,
+    )
+
+
+def _softmax(builder, layer, _blobs, bottom, top):
+    builder.add(
+        "Softmax", [bottom], top, axis=_first(_param(layer, "softmax_param"), "axis", 1)
+    )
+
+
+_LAYER_CONVERTERS = {
+    "Convolution": _convolution,
+    "BatchNorm": _batch_norm,
+    "Scale": _scale,
+    "ReLU": lambda builder, _layer, _blobs, bottom, top: builder.add(
+        "Relu", [bottom], top
+    ),
+    "Pooling": _pooling,
+    "Normalize": _normalize,
+    "Permute": _permute,
+    "Flatten": _flatten,
+    "Reshape": _reshape,
+    "Softmax": _softmax,
+}
+
+
+def convert_caffe_to_onnx(  # pylint: disable=too-many-locals
+    prototxt_path: str, weights_path: str, onnx_path: str
+):
+    """
+    Convert the Caffe SSD model to ONNX (see the module docstring).
+
+    Args:
+        prototxt_path: Path to the network definition (`architecture.txt`).
+        weights_path: Path to the trained weights (`weights.caffemodel`).
+        onnx_path: Where to write the ONNX model.
+    """
+    # pylint: disable=import-outside-toplevel
+    import onnx
+    from onnx import TensorProto
+
+    with open(prototxt_path, "r", encoding="utf-8") as f:
+        network = parse_prototxt(f.read())
+    net = cv2.dnn.readNetFromCaffe(  # pylint: disable=no-member
+        prototxt_path, weights_path
+    )
+
+    # Priors only depend on the input size: compute them once with OpenCV
+    net.setInput(np.zeros((1, 3, *MODEL_INPUT_SIZE[::-1]), dtype=np.float32))
+    priors = net.forward("mbox_priorbox").astype(np.float32)
+    num_coords = priors.shape[2]  # 4 per prior
+
+    builder = _GraphBuilder()
+    input_name = network["input"][0]
+    builder.tensors[input_name] = input_name
+    for layer in network["layer"]:
+        layer_type = layer["type"][0]
+        bottoms = [builder.tensors.get(name) for name in layer.get("bottom", [])]
+        top = layer["top"][0]
+        if layer_type in ("PriorBox", "DetectionOutput"):
+            continue
+        if layer_type == "Concat":
+            if top == "mbox_priorbox":
+                builder.tensors[top] = builder.constant(f"{top}_const", priors)
+                continue
+            axis = _first(_param(layer, "concat_param"), "axis", 1)
+            builder.add("Concat", bottoms, top, axis=axis)
+        elif layer_type == "Eltwise":
+            builder.add("Sum", bottoms, top)
+        elif layer_type in _LAYER_CONVERTERS:
+            blobs = [
+                blob.astype(np.float32)
+                for blob in net.getLayer(net.getLayerId(layer["name"][0])).blobs
+            ]
+            _LAYER_CONVERTERS[layer_type](builder, layer, blobs, bottoms[0], top)
+        else:
+            raise ValueError(f"Unsupported Caffe layer type: {layer_type}")
+
+    # Expose the SSD heads under their Caffe names
+    for name in OUTPUT_NAMES:
+        builder.nodes.append(
+            builder.helper.make_node("Identity", [builder.tensors[name]], [name])
+        )
+
+    graph = builder.helper.make_graph(
+        builder.nodes,
+        "face_detection_ssd",
+        [
+            builder.helper.make_tensor_value_info(
+                input_name, TensorProto.FLOAT, ["N", 3, *MODEL_INPUT_SIZE[::-1]]
+            )
+        ],
+        [
+            builder.helper.make_tensor_value_info(name, TensorProto.FLOAT, shape)
+            for name, shape in zip(
+                OUTPUT_NAMES,
+                (["N", num_coords], ["N", num_coords // 2], list(priors.shape)),
+            )
+        ],
+        builder.initializers,
+    )
+    model = builder.helper.make_model(
+        graph,
+        opset_imports=[builder.helper.make_opsetid("", ONNX_OPSET)],
+        ir_version=ONNX_IR_VERSION,
+    )
+    onnx.checker.check_model(model)
+    onnx.save(model, onnx_path)
+    logger.info("Converted %s to %s", weights_path, onnx_path)
+
+
+def _calibration_blobs(calibration_dir: Optional[str]) -> List[np.ndarray]:
+    """Load calibration images as model input blobs (one image per blob)."""
+    blobs = []
+    if calibration_dir and os.path.isdir(calibration_dir):
+        for name in sorted(os.listdir(calibration_dir)):
+            if not name.lower().endswith(CALIBRATION_EXTENSIONS):
+                continue
+            image = cv2.imread(  # pylint: disable=no-member
+                os.path.join(calibration_dir, name)
+            )
+            if image is not None:
+                blobs.append(
+                    cv2.dnn.blobFromImage(  # pylint: disable=no-member
+                        image, 1.0, MODEL_INPUT_SIZE, MODEL_MEAN
+                    )
+                )
+    if not blobs:
+        raise ValueError(f"No calibration images found in {calibration_dir!r}")
+    return blobs
+
+
+def quantize_onnx(fp32_path: str, int8_path: str, calibration_dir: Optional[str]):
+    """
+    Quantize the converted model to INT8 (static, QDQ format).
+
+    Activation ranges are calibrated on the images in `calibration_dir`.
+    The resulting model runs with both ONNX Runtime and OpenVINO.
+    """
+    # pylint: disable=import-outside-toplevel
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    class _Reader(CalibrationDataReader):  # pylint: disable=abstract-method
+        def __init__(self, blobs: List[np.ndarray]):
+            self._blobs: Iterator[np.ndarray] = iter(blobs)
+
+        def get_next(self):
+            blob = next(self._blobs, None)
+            return None if blob is None else {"data": blob}
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        _Reader(_calibration_blobs(calibration_dir)),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        # Keep the normalization and softmax heads in float precision
+        op_types_to_quantize=["Conv", "MaxPool", "Add", "Mul", "Concat"],
+    )
+    logger.info("Quantized %s to %s", fp32_path, int8_path)
+
+
+def convert_model(
+    model_dir: str,
+    output_path: str,
+    precision: str = "fp32",
+    calibration_dir: Optional[str] = None,
+):
+    """
+    Convert the Caffe model in `model_dir` to ONNX at `output_path`.
+
+    Args:
+        model_dir: Directory with `architecture.txt` and `weights.caffemodel`.
+        output_path: Where to write the ONNX model.
+        precision: 'fp32' or 'int8' (statically quantized).
+        calibration_dir: Directory with calibration images (required for 'int8').
+    """
+    if precision not in ("fp32", "int8"):
+        raise ValueError(f"Unsupported precision: {precision!r}")
+    prototxt_path = os.path.join(model_dir, "architecture.txt")
+    weights_path = os.path.join(model_dir, "weights.caffemodel")
+    if precision == "fp32":
+        convert_caffe_to_onnx(prototxt_path, weights_path, output_path)
+        return
+    fp32_path = f"{output_path}.fp32.tmp"
+    try:
+        convert_caffe_to_onnx(prototxt_path, weights_path, fp32_path)
+        quantize_onnx(fp32_path, output_path, calibration_dir)
+    finally:
+        if os.path.exists(fp32_path):
+            os.remove(fp32_path)
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--output", default=None, help="ONNX output path")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "int8"])
+    parser.add_argument(
+        "--calibration-dir",
+        default=None,
+        help="Directory with calibration images (required for int8)",
+    )
+    args = parser.parse_args()
+    if args.precision == "int8" and not args.calibration_dir:
+        parser.error("--calibration-dir is required with --precision int8")
+
+    logging.basicConfig(level=logging.INFO)
+    output_path = args.output or os.path.join(
+        args.model_dir, f"face_detection_{args.precision}.onnx"
+    )
+    convert_model(args.model_dir, output_path, args.precision, args.calibration_dir)
+
+
+if __name__ == "__main__":
+    main()
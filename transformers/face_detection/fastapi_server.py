@@ -5,28 +5,368 @@ FastAPI-based ETL server detects faces in images using SSD (Single Shot MultiBox
 Supports both individual images and tar/webdataset archives.
 
 Environment:
-  FORMAT: Output image format (e.g., 'jpg', 'png')
+  FORMAT: Output format, overridable per request with etl_args `{"format": ...}`:
+          - image format (e.g., 'jpg', 'png'): annotated image(s)
+          - 'json': detected face boxes only (JSON per image, NDJSON per tar),
+            without decoding the image at full resolution
+          - 'crops': tar archive of the detected face crops
   ARG_TYPE: Type of argument passed ('fqn' for file path or empty for URL)
   AIS_TARGET_URL: URL of the AIS target
+  MODEL_DIR: Directory with the SSD model files (default: './model')
+  INFERENCE_BACKEND: 'opencv' (Caffe model with OpenCV DNN), 'onnxruntime' or
+                     'openvino' (converted ONNX model) (default: 'opencv')
+  MODEL_PRECISION: 'fp32' or 'int8' for the ONNX backends (default: 'fp32')
+  MODEL_CACHE_DIR: Directory where the converted ONNX model is cached
+                   (default: MODEL_DIR)
+  CALIBRATION_DIR: Unannotated images used to calibrate INT8 quantization when
+                   converting on first start (default: './calibration')
+  BATCH_SIZE: Maximum number of images per batched forward pass (default: 16)
+  BATCH_WAIT_MS: Maximum time a single-image request waits for concurrent requests
+                 to join its batch; 0 disables cross-request batching (default: 0).
+                 STREAMING=true only: requests served by `transform` (buffered
+                 HTTP and WebSocket) are not batched
+  DECODE_WORKERS: Threads used to decode/encode tar members (default: CPU count)
+  STREAMING: Process requests with `transform_stream` (default: 'false');
+             not supported with WebSocket communication
 
 Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
 """
 
 import os
 import io
+import json
+import fcntl
 import logging
+import mimetypes
+import queue
 import tarfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import repeat
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Sequence, Tuple
 
 import cv2
 import numpy as np
+from PIL import Image, UnidentifiedImageError
+from fastapi import Response
 from aistore.sdk.etl.webserver.fastapi_server import FastAPIServer
 
+from common.server_utils import (
+    TAR_EXTENSIONS,
+    TAR_MIME,
+    StreamingTarBuffer,
+    request_mime_type,
+    set_request_mime_type,
+    streaming_enabled,
+)
+
 # Constants
 IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp")
-TAR_EXTENSIONS = [".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz"]
 
+# SSD model input parameters
+MODEL_INPUT_SIZE = (300, 300)
+MODEL_MEAN = (104.0, 117.0, 123.0)
+CONFIDENCE_THRESHOLD = 0.6
+
+# Parameters of the model's DetectionOutput layer, applied to the outputs of
+# the converted (ONNX) model
+DETECTION_OUTPUT_THRESHOLD = 0.01
+NMS_THRESHOLD = 0.45
+NMS_TOP_K = 400
+KEEP_TOP_K = 200
+
+# Output formats returning detected boxes / face crops instead of annotated images
+JSON_FORMAT = "json"
+CROPS_FORMAT = "crops"
+
+# JPEG DCT scale factors usable for detection-only decoding, largest first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),  # pylint: disable=no-member
+    (4, cv2.IMREAD_REDUCED_COLOR_4),  # pylint: disable=no-member
+    (2, cv2.IMREAD_REDUCED_COLOR_2),  # pylint: disable=no-member
+)
+
+# Histogram buckets (seconds) for queue wait and per-image latency metrics
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class _Histogram:
+    """Minimal cumulative histogram rendered in Prometheus text format."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, help_text: str) -> List[str]:
+        """Return the histogram as Prometheus exposition lines."""
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {count}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum:.6f}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class _MicroBatcher:  # pylint: disable=too-many-instance-attributes
+    """
+    Collects concurrent single-image detection requests into batched forward passes.
+
+    Callers block in `submit` while a background thread gathers up to
+    `max_batch_size` queued images, waiting at most `max_wait_ms` after the
+    first one arrives, runs one batched detection and hands each caller its
+    own result.
+    """
+
+    def __init__(
+        self,
+        detect: Callable[[List[np.ndarray]], List[np.ndarray]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ) -> None:
+        self._detect = detect
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future, float]]" = queue.Queue()
+
+        self._metrics_lock = threading.Lock()
+        batch_buckets = [2**i for i in range(max_batch_size.bit_length())]
+        if batch_buckets[-1] != max_batch_size:
+            batch_buckets.append(max_batch_size)
+        self.batch_size = _Histogram(batch_buckets)
+        self.queue_wait = _Histogram(LATENCY_BUCKETS)
+        self.latency = _Histogram(LATENCY_BUCKETS)
+
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+
+    def submit(self, image: np.ndarray) -> np.ndarray:
+        """Queue one image for detection and block until its result is ready."""
+        future: Future = Future()
+        self._queue.put((image, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[np.ndarray, Future, float]]:
+        """Block for the first request, then gather more until full or timed out."""
+        items = [self._queue.get()]
+        deadline = time.perf_counter() + self._max_wait
+        while len(items) < self._max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    items.append(self._queue.get(timeout=timeout))
+                else:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self) -> None:
+        """Batching loop executed by the background thread."""
+        while True:
+            items = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self._detect([image for image, _, _ in items])
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                for _, future, _ in items:
+                    future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            for (_, future, _), detections in zip(items, results):
+                future.set_result(detections)
+
+            with self._metrics_lock:
+                self.batch_size.observe(len(items))
+                for _, _, enqueued in items:
+                    self.queue_wait.observe(started - enqueued)
+                    self.latency.observe(finished - enqueued)
+
+    def render_metrics(self) -> str:
+        """Return batching metrics in Prometheus text format."""
+        with self._metrics_lock:
+            lines = self.batch_size.render(
+                "face_detection_batch_size", "Images per batched forward pass."
+            )
+            lines += self.queue_wait.render(
+                "face_detection_queue_wait_seconds",
+                "Time a request waits before its batch starts.",
+            )
+            lines += self.latency.render(
+                "face_detection_image_latency_seconds",
+                "Time from enqueue to detection result, per image.",
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _is_image(name: str) -> bool:
+    """Return True if the file name has an image extension."""
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def _detection_output(  # pylint: disable=too-many-locals
+    loc: np.ndarray, conf: np.ndarray, priors: np.ndarray
+) -> np.ndarray:
+    """
+    Decode SSD head outputs into detections, like Caffe's `DetectionOutput` layer.
+
+    Args:
+        loc: `[N, num_priors * 4]` box regressions.
+        conf: `[N, num_priors * 2]` background/face probabilities.
+        priors: `[1, 2, num_priors * 4]` prior boxes and their variances.
 
-class FaceDetection(FastAPIServer):
+    Returns:
+        Detections of the whole batch; each row is
+        `[image_id, label, confidence, x_1, y_1, x_2, y_2]`.
+    """
+    prior_boxes = priors[0, 0].reshape(-1, 4)
+    variances = priors[0, 1].reshape(-1, 4)
+    prior_size = prior_boxes[:, 2:] - prior_boxes[:, :2]
+    prior_center = (prior_boxes[:, :2] + prior_boxes[:, 2:]) / 2
+
+    rows = []
+    for image_id in range(loc.shape[0]):
+        scores = conf[image_id].reshape(-1, 2)[:, 1]
+        (candidates,) = np.nonzero(scores > DETECTION_OUTPUT_THRESHOLD)
+        offsets = loc[image_id].reshape(-1, 4)[candidates]
+        var = variances[candidates]
+        center = var[:, :2] * offsets[:, :2] * prior_size[candidates]
+        center += prior_center[candidates]
+        size = np.exp(var[:, 2:] * offsets[:, 2:]) * prior_size[candidates]
+        boxes = np.hstack([center - size / 2, center + size / 2])
+
+        keep = cv2.dnn.NMSBoxes(  # pylint: disable=no-member
+            np.hstack([boxes[:, :2], size]).tolist(),
+            scores[candidates].tolist(),
+            DETECTION_OUTPUT_THRESHOLD,
+            NMS_THRESHOLD,
+            top_k=NMS_TOP_K,
+        )
+        keep = np.asarray(keep, dtype=np.int64).reshape(-1)[:KEEP_TOP_K]
+        image_rows = np.empty((len(keep), 7), dtype=np.float32)
+        image_rows[:, 0] = image_id
+        image_rows[:, 1] = 1
+        image_rows[:, 2] = scores[candidates[keep]]
+        image_rows[:, 3:] = boxes[keep]
+        rows.append(image_rows)
+    return np.concatenate(rows) if rows else np.empty((0, 7), dtype=np.float32)
+
+
+def _converted_model_path(model_dir: str, cache_dir: str, precision: str) -> str:
+    """
+    Return the ONNX model converted from the Caffe model, converting it if needed.
+
+    Conversion normally happens at image build time (see `convert_model.py`);
+    otherwise it runs on first start and the result is cached in `cache_dir`.
+    A file lock ensures only one uvicorn worker converts while the others wait.
+    """
+    onnx_path = os.path.join(cache_dir, f"face_detection_{precision}.onnx")
+    if os.path.exists(onnx_path):
+        return onnx_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(f"{onnx_path}.lock", "w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(onnx_path):
+            # Runs as a top-level module in the container, as a package in tests
+            # pylint: disable=import-outside-toplevel
+            try:
+                from convert_model import convert_model
+            except ImportError:
+                from face_detection.convert_model import convert_model
+
+            tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+            convert_model(
+                model_dir,
+                tmp_path,
+                precision,
+                os.environ.get("CALIBRATION_DIR", "./calibration"),
+            )
+            os.replace(tmp_path, onnx_path)
+    return onnx_path
+
+
+class _OpenCVBackend:  # pylint: disable=too-few-public-methods
+    """Runs the Caffe model with the OpenCV DNN module (CPU)."""
+
+    def __init__(self, model_dir: str):
+        self.net = cv2.dnn.readNetFromCaffe(  # pylint: disable=no-member
+            os.path.join(model_dir, "architecture.txt"),
+            os.path.join(model_dir, "weights.caffemodel"),
+        )
+
+    def forward(self, blob: np.ndarray) -> np.ndarray:
+        """Run the model and return the `DetectionOutput` rows of the batch."""
+        self.net.setInput(blob)
+        return self.net.forward()[0, 0]
+
+
+class _OnnxRuntimeBackend:  # pylint: disable=too-few-public-methods
+    """Runs the converted ONNX model with ONNX Runtime (CPU)."""
+
+    def __init__(self, onnx_path: str):
+        import onnxruntime  # pylint: disable=import-outside-toplevel
+
+        self.session = onnxruntime.InferenceSession(
+            onnx_path, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def forward(self, blob: np.ndarray) -> np.ndarray:
+        """Run the model and return the `DetectionOutput` rows of the batch."""
+        loc, conf, priors = self.session.run(None, {self.input_name: blob})
+        return _detection_output(loc, conf, priors)
+
+
+class _OpenVINOBackend:  # pylint: disable=too-few-public-methods
+    """Runs the converted ONNX model with OpenVINO (CPU)."""
+
+    def __init__(self, onnx_path: str, cache_dir: str):
+        import openvino  # pylint: disable=import-outside-toplevel
+
+        core = openvino.Core()
+        # Cache the compiled model next to the converted one
+        core.set_property({"CACHE_DIR": os.path.join(cache_dir, "openvino_cache")})
+        self.compiled_model = core.compile_model(onnx_path, "CPU")
+        self.request = self.compiled_model.create_infer_request()
+
+    def forward(self, blob: np.ndarray) -> np.ndarray:
+        """Run the model and return the `DetectionOutput` rows of the batch."""
+        results = self.request.infer([blob])
+        loc, conf, priors = (results[output] for output in self.compiled_model.outputs)
+        return _detection_output(loc, conf, priors)
+
+
+def _load_backend(name: str, model_dir: str, cache_dir: str, precision: str):
+    """Create the inference backend selected by `INFERENCE_BACKEND`."""
+    if name == "opencv":
+        return _OpenCVBackend(model_dir)
+    if name == "onnxruntime":
+        return _OnnxRuntimeBackend(
+            _converted_model_path(model_dir, cache_dir, precision)
+        )
+    if name == "openvino":
+        return _OpenVINOBackend(
+            _converted_model_path(model_dir, cache_dir, precision), cache_dir
+        )
+    raise ValueError(
+        f"Unsupported INFERENCE_BACKEND {name!r}: "
+        "expected 'opencv', 'onnxruntime' or 'openvino'"
+    )
+
+
+class FaceDetection(FastAPIServer):  # pylint: disable=too-many-instance-attributes
     """
     ETL server that detects faces in images using SSD model.
     Supports both individual images and tar/webdataset archives.
@@ -48,48 +388,179 @@ class FaceDetection(FastAPIServer):
         self.format = os.environ.get("FORMAT", "jpg")
         self.arg_type = os.environ.get("ARG_TYPE", "")
         self.host_target = os.environ.get("AIS_TARGET_URL")
+        self.batch_size = max(1, int(os.environ.get("BATCH_SIZE", "16")))
+        decode_workers = int(os.environ.get("DECODE_WORKERS", str(os.cpu_count())))
+        model_dir = os.environ.get("MODEL_DIR", "./model")
+
+        self.use_streaming = streaming_enabled()
+
+        # Load the face detection model. Backends are not thread-safe (e.g.,
+        # `cv2.dnn.Net`), so every forward pass is serialized by `_model_lock`.
+        self.backend = _load_backend(
+            os.environ.get("INFERENCE_BACKEND", "opencv").lower(),
+            model_dir,
+            os.environ.get("MODEL_CACHE_DIR", model_dir),
+            os.environ.get("MODEL_PRECISION", "fp32").lower(),
+        )
+        self._model_lock = threading.Lock()
 
-        # Load the face detection model
-        self.model = cv2.dnn.readNetFromCaffe(
-            "./model/architecture.txt", "./model/weights.caffemodel"
+        # Shared pool for decoding/encoding tar members (OpenCV releases the GIL)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, decode_workers))
+
+        # Cross-request micro-batching for single-image requests
+        batch_wait_ms = float(os.environ.get("BATCH_WAIT_MS", "0"))
+        self._batcher = (
+            _MicroBatcher(self._detect, self.batch_size, batch_wait_ms)
+            if batch_wait_ms > 0
+            else None
         )
+        if self._batcher and not self.use_streaming:
+            self.logger.warning(
+                "BATCH_WAIT_MS is set without STREAMING=true: requests are not "
+                "batched (cross-request batching only applies to streaming requests)"
+            )
 
-    def _transform_image(  # pylint: disable=too-many-locals
-        self, image_bytes: bytes
-    ) -> bytes:
+    def _setup_app(self):
+        """Register the `/metrics` route ahead of the catch-all object routes."""
+
+        @self.app.get("/metrics")
+        async def metrics():
+            body = self._batcher.render_metrics() if self._batcher else ""
+            return Response(content=body, media_type="text/plain; version=0.0.4")
+
+        super()._setup_app()
+
+    @staticmethod
+    def _decode_image(image_bytes: bytes) -> np.ndarray:
         """
-        Detect faces in a single image.
+        Decode raw image bytes into an OpenCV (BGR/BGRA) array.
 
         Args:
             image_bytes: Raw image data.
 
         Returns:
-            Processed image with detected faces marked.
+            Decoded image.
+
+        Raises:
+            ValueError: If the data cannot be decoded as an image.
         """
         image = cv2.imdecode(  # pylint: disable=no-member
             np.frombuffer(image_bytes, np.uint8), -1
         )
-        image_height, image_width, _ = image.shape
-        output_image = image.copy()
+        if image is None:
+            raise ValueError("Failed to decode image data")
+        return image
+
+    @staticmethod
+    def _decode_for_detection(image_bytes: bytes) -> Tuple[np.ndarray, int, int]:
+        """
+        Decode an image at the smallest scale that still covers the model input.
+
+        The model resizes every input to 300x300, so a full-resolution decode
+        is wasted work when only the boxes are needed. The original size is
+        read from the header, then the image is decoded with the largest
+        reduction (1/2, 1/4 or 1/8, OpenCV's `IMREAD_REDUCED_*` flags) that
+        keeps both sides at or above the model input size. The flags apply to
+        every format, but only JPEGs are decoded at the reduced DCT scale, which
+        skips most of the decoding work; other formats are decoded in full and
+        then downscaled by OpenCV.
+
+        Args:
+            image_bytes: Raw image data.
+
+        Returns:
+            The (possibly reduced) BGR image, and the original width and height.
+
+        Raises:
+            ValueError: If the data cannot be decoded as an image.
+        """
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as header:
+                width, height = header.size
+        except (UnidentifiedImageError, OSError):
+            width, height = 0, 0
+
+        flags = cv2.IMREAD_COLOR  # pylint: disable=no-member
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+            if min(width, height) // factor >= max(MODEL_INPUT_SIZE):
+                flags = reduced_flag
+                break
+
+        # Ignore EXIF orientation, consistently with the full (unchanged) decode
+        image = cv2.imdecode(  # pylint: disable=no-member
+            np.frombuffer(image_bytes, np.uint8),
+            flags | cv2.IMREAD_IGNORE_ORIENTATION,  # pylint: disable=no-member
+        )
+        if image is None:
+            raise ValueError("Failed to decode image data")
+        if not width or not height:
+            height, width = image.shape[:2]
+        return image, width, height
+
+    @staticmethod
+    def _to_model_input(image: np.ndarray) -> np.ndarray:
+        """
+        Normalize a decoded image to the 8-bit, 3-channel BGR layout the model expects.
+
+        `cv2.dnn.blobFromImages` requires every image in a batch to have the same
+        number of channels, so grayscale and BGRA inputs are converted here.
+        """
+        if image.dtype == np.uint16:
+            image = (image >> 8).astype(np.uint8)
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)  # pylint: disable=no-member
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)  # pylint: disable=no-member
+        return image
+
+    def _detect(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Run face detection on a batch of images with a single forward pass.
+
+        Args:
+            images: Decoded images (any size).
 
-        # Preprocess image for the model
-        preprocessed_image = cv2.dnn.blobFromImage(
-            image,
+        Returns:
+            Per-image arrays of detections; each row is
+            `[image_id, label, confidence, x_1, y_1, x_2, y_2]` with
+            coordinates normalized to [0, 1].
+        """
+        blob = cv2.dnn.blobFromImages(
+            [self._to_model_input(image) for image in images],
             scalefactor=1.0,
-            size=(300, 300),
-            mean=(104.0, 117.0, 123.0),
+            size=MODEL_INPUT_SIZE,
+            mean=MODEL_MEAN,
             swapRB=False,
             crop=False,
         )
+        with self._model_lock:
+            detections = self.backend.forward(blob)
 
-        # Run face detection
-        self.model.setInput(preprocessed_image)
-        results = self.model.forward()
+        # DetectionOutput concatenates the detections of the whole batch;
+        # the first column holds the index of the image each row belongs to.
+        return [detections[detections[:, 0] == idx] for idx in range(len(images))]
+
+    def _annotate_image(
+        self, image: np.ndarray, detections: np.ndarray, fmt: str
+    ) -> bytes:
+        """
+        Draw rectangles around detected faces and encode the result.
+
+        Args:
+            image: Decoded image.
+            detections: Detections for this image, as returned by `_detect`.
+            fmt: Output image format (e.g., 'jpg', 'png').
+
+        Returns:
+            Processed image with detected faces marked.
+        """
+        image_height, image_width = image.shape[:2]
+        output_image = image.copy()
 
         # Draw rectangles around detected faces
-        for face in results[0][0]:
+        for face in detections:
             face_confidence = face[2]
-            if face_confidence > 0.6:
+            if face_confidence > CONFIDENCE_THRESHOLD:
                 bbox = face[3:]
                 x_1 = int(bbox[0] * image_width)
                 y_1 = int(bbox[1] * image_height)
@@ -105,45 +576,275 @@ class FaceDetection(FastAPIServer):
 
         # Encode and return the processed image
         _, encoded_image = cv2.imencode(  # pylint: disable=no-member
-            f".{self.format}", output_image
+            f".{fmt}", output_image
         )
         return encoded_image.tobytes()
 
-    def _transform_tar(self, data: bytes) -> bytes:
+    @staticmethod
+    def _to_boxes(
+        detections: np.ndarray, width: int, height: int
+    ) -> List[Dict[str, Any]]:
         """
-        Process a tar archive containing images.
+        Convert detections to face boxes in pixel coordinates of the original image.
 
         Args:
-            data: Raw tar archive data as bytes.
+            detections: Detections for one image, as returned by `_detect`.
+            width: Original image width.
+            height: Original image height.
+
+        Returns:
+            One `{"confidence": float, "box": [x_1, y_1, x_2, y_2]}` dict per face.
+        """
+        faces = []
+        for face in detections:
+            face_confidence = float(face[2])
+            if face_confidence > CONFIDENCE_THRESHOLD:
+                bbox = np.clip(face[3:7], 0.0, 1.0)
+                faces.append(
+                    {
+                        "confidence": round(face_confidence, 4),
+                        "box": [
+                            int(bbox[0] * width),
+                            int(bbox[1] * height),
+                            int(bbox[2] * width),
+                            int(bbox[3] * height),
+                        ],
+                    }
+                )
+        return faces
+
+    def _encode_crops(
+        self, name: str, image: np.ndarray, detections: np.ndarray
+    ) -> List[Tuple[str, bytes]]:
+        """
+        Crop every detected face out of the image and encode the crops.
+
+        Crops are named `<stem>_<idx><ext>` after the source image and encoded
+        in the same format (JPEG if the extension is not a known image format).
+
+        Args:
+            name: Name of the source image (object key or tar member name).
+            image: Decoded full-resolution image.
+            detections: Detections for this image, as returned by `_detect`.
 
         Returns:
-            Processed tar archive with face detection applied to each image.
-        """
-        input_buffer = io.BytesIO(data)
-        output_buffer = io.BytesIO()
-
-        with tarfile.open(fileobj=input_buffer, mode="r") as input_tar, tarfile.open(
-            fileobj=output_buffer, mode="w"
-        ) as output_tar:
-
-            # Process each file in the tar
-            for member in input_tar.getmembers():
-                if member.isfile():
-                    file_data = input_tar.extractfile(member).read()
-                    if member.name.lower().endswith(IMAGE_EXTENSIONS):
-                        processed_data = self._transform_image(file_data)
-                        member.size = len(processed_data)
-                        output_tar.addfile(member, io.BytesIO(processed_data))
-                    else:
+            `(name, encoded crop)` pairs, one per detected face.
+        """
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            ext = ".jpg"
+
+        height, width = image.shape[:2]
+        crops = []
+        for idx, face in enumerate(self._to_boxes(detections, width, height)):
+            box = face["box"]
+            crop = image[box[1] : box[3], box[0] : box[2]]
+            if crop.size:
+                _, crop = cv2.imencode(ext, crop)  # pylint: disable=no-member
+                crops.append((f"{stem}_{idx}{ext}", crop.tobytes()))
+        return crops
+
+    def _describe_image(
+        self, detections: np.ndarray, width: int, height: int, name: str = ""
+    ) -> Dict[str, Any]:
+        """Build the JSON description (size and face boxes) of one image."""
+        result = {"name": name} if name else {}
+        result.update(width=width, height=height)
+        result["faces"] = self._to_boxes(detections, width, height)
+        return result
+
+    def _detect_one(self, image: np.ndarray, batch: bool = False) -> np.ndarray:
+        """
+        Run detection on a single image, joining a cross-request batch if
+        `batch` is set and batching is enabled.
+        """
+        if batch and self._batcher:
+            return self._batcher.submit(image)
+        return self._detect([image])[0]
+
+    def _transform_image(
+        self, image_bytes: bytes, path: str, fmt: str, batch: bool = False
+    ) -> bytes:
+        """
+        Detect faces in a single image.
+
+        Args:
+            image_bytes: Raw image data.
+            path: Request path or object key (names the crops).
+            fmt: Output format (image format, 'json' or 'crops').
+            batch: Join a cross-request batch (`BATCH_WAIT_MS`); only set by
+                `transform_stream`, whose requests run in worker threads.
+                Buffered requests call `transform` on the event loop, where a
+                request waiting for a batch would block every other one.
+
+        Returns:
+            Processed image with detected faces marked, a JSON document with
+            the detected boxes (`json`), or a tar archive of face crops (`crops`).
+        """
+        if fmt == JSON_FORMAT:
+            image, width, height = self._decode_for_detection(image_bytes)
+            result = self._describe_image(self._detect_one(image, batch), width, height)
+            return json.dumps(result).encode()
+
+        image = self._decode_image(image_bytes)
+        detections = self._detect_one(image, batch)
+        if fmt == CROPS_FORMAT:
+            output_buffer = io.BytesIO()
+            with tarfile.open(fileobj=output_buffer, mode="w") as output_tar:
+                for crop_name, crop in self._encode_crops(
+                    os.path.basename(path), image, detections
+                ):
+                    crop_info = tarfile.TarInfo(name=crop_name)
+                    crop_info.size = len(crop)
+                    output_tar.addfile(crop_info, io.BytesIO(crop))
+            return output_buffer.getvalue()
+        return self._annotate_image(image, detections, fmt)
+
+    def _iter_batches(
+        self, input_tar: tarfile.TarFile
+    ) -> Iterator[List[Tuple[tarfile.TarInfo, bytes]]]:
+        """
+        Group tar members into batches holding up to `BATCH_SIZE` images.
+
+        Members are yielded in archive order; a member that is not preceded by
+        pending images is yielded on its own right away.
+        """
+        pending: List[Tuple[tarfile.TarInfo, bytes]] = []
+        num_images = 0
+        for member in input_tar:
+            if not member.isfile():
+                continue
+            pending.append((member, input_tar.extractfile(member).read()))
+            if _is_image(member.name):
+                num_images += 1
+            if num_images in (0, self.batch_size):
+                yield pending
+                pending, num_images = [], 0
+        if pending:
+            yield pending
+
+    def _process_batch(
+        self, batch: List[Tuple[tarfile.TarInfo, bytes]], fmt: str
+    ) -> List[Tuple[tarfile.TarInfo, bytes]]:
+        """
+        Detect faces in the image members of a batch with a single forward pass.
+
+        Images are decoded in parallel, stacked into one blob, then annotated
+        (or cropped) and encoded in parallel. Non-image members are returned
+        unchanged and the original member order is preserved.
+
+        Args:
+            batch: `(member, data)` pairs, as yielded by `_iter_batches`.
+            fmt: Output format (image format or 'crops').
+
+        Returns:
+            `(member, data)` pairs to write to the output tar.
+        """
+        images_data = [data for member, data in batch if _is_image(member.name)]
+        if not images_data:
+            return batch
+        images = list(self._pool.map(self._decode_image, images_data))
+        detections = self._detect(images)
+        image_names = [member.name for member, _ in batch if _is_image(member.name)]
+
+        if fmt == CROPS_FORMAT:
+            processed = iter(
+                self._pool.map(self._encode_crops, image_names, images, detections)
+            )
+        else:
+            processed = iter(
+                self._pool.map(self._annotate_image, images, detections, repeat(fmt))
+            )
+
+        output = []
+        for member, data in batch:
+            if not _is_image(member.name):
+                output.append((member, data))
+            elif fmt == CROPS_FORMAT:
+                for crop_name, crop in next(processed):
+                    output.append((tarfile.TarInfo(name=crop_name), crop))
+            else:
+                output.append((member, next(processed)))
+        return output
+
+    def _describe_batch(self, batch: List[Tuple[tarfile.TarInfo, bytes]]) -> bytes:
+        """
+        Describe the image members of a batch as NDJSON (one line per image).
+
+        Images are decoded at reduced scale in parallel and run through the
+        model with a single forward pass; non-image members are skipped.
+        """
+        images = [
+            (member.name, data) for member, data in batch if _is_image(member.name)
+        ]
+        if not images:
+            return b""
+        decoded = list(
+            self._pool.map(self._decode_for_detection, [data for _, data in images])
+        )
+        detections = self._detect([image for image, _, _ in decoded])
+        lines = [
+            json.dumps(self._describe_image(dets, width, height, name))
+            for (name, _), (_, width, height), dets in zip(images, decoded, detections)
+        ]
+        return ("\n".join(lines) + "\n").encode()
+
+    def _transform_tar_stream(self, reader: BinaryIO, fmt: str) -> Iterator[bytes]:
+        """
+        Process a tar archive containing images, one batch of members at a time.
+
+        The input archive is opened in streaming mode (`r|*`), so output is
+        emitted as soon as each batch is processed and memory stays bounded
+        by a single batch of `BATCH_SIZE` images instead of the whole archive.
+
+        Output depends on `fmt`:
+        - image format: tar (`w|`) with annotated images; other members unchanged
+        - 'crops': tar with the face crops of every image; other members unchanged
+        - 'json': NDJSON with one line (name, size, face boxes) per image member
+
+        Args:
+            reader: File-like object containing the tar archive.
+            fmt: Output format.
+
+        Yields:
+            Chunks of the processed tar archive (or NDJSON document).
+        """
+        with tarfile.open(fileobj=reader, mode="r|*") as input_tar:
+            if fmt == JSON_FORMAT:
+                for batch in self._iter_batches(input_tar):
+                    lines = self._describe_batch(batch)
+                    if lines:
+                        yield lines
+                return
+
+            buf = StreamingTarBuffer()
+            with tarfile.open(fileobj=buf, mode="w|") as output_tar:
+                for batch in self._iter_batches(input_tar):
+                    for member, file_data in self._process_batch(batch, fmt):
+                        member.size = len(file_data)
                         output_tar.addfile(member, io.BytesIO(file_data))
+                    chunk = buf.drain()
+                    if chunk:
+                        yield chunk
 
-        # Return the processed tar data
-        output_buffer.seek(0)
-        result_data = output_buffer.read()
-        output_buffer.close()
-        input_buffer.close()
+        # Yield the end-of-archive markers
+        chunk = buf.drain()
+        if chunk:
+            yield chunk
 
-        return result_data
+    def _transform_tar(self, data: bytes, fmt: str) -> bytes:
+        """
+        Process a tar archive containing images.
+
+        Args:
+            data: Raw tar archive data as bytes.
+            fmt: Output format.
+
+        Returns:
+            Processed tar archive with face detection applied to each image
+            (or an NDJSON document for the 'json' format).
+        """
+        return b"".join(self._transform_tar_stream(io.BytesIO(data), fmt))
 
     def _is_tar_file(self, path: str) -> bool:
         """
@@ -158,11 +859,32 @@ class FaceDetection(FastAPIServer):
         path_lower = path.lower()
         return any(path_lower.endswith(ext) for ext in TAR_EXTENSIONS)
 
+    def _get_format(self, etl_args: str) -> str:
+        """
+        Return the output format for a request.
+
+        Args:
+            etl_args: Optional JSON string overriding the `FORMAT` environment
+                variable, e.g. `{"format": "json"}` (already URL-decoded by the
+                SDK, as in the other servers).
+
+        Returns:
+            The requested output format, or `FORMAT` if not overridden.
+        """
+        if etl_args:
+            try:
+                args_dict = json.loads(etl_args)
+                if isinstance(args_dict, dict) and args_dict.get("format"):
+                    return str(args_dict["format"]).lower()
+            except json.JSONDecodeError:
+                pass  # Ignore invalid JSON and use default format
+        return self.format
+
     def transform(
         self,
         data: bytes,
         path: str,
-        _etl_args: str,
+        etl_args: str,
     ) -> bytes:
         """
         Transform the input data by detecting faces.
@@ -170,14 +892,76 @@ class FaceDetection(FastAPIServer):
         Args:
             data: Raw request payload (image data).
             path: Request path or object key.
-            etl_args: Optional arguments (unused).
+            etl_args: Optional JSON string with a `format` override.
 
         Returns:
-            Processed image data with detected faces marked.
+            Processed image data with detected faces marked, detected boxes
+            as JSON/NDJSON, or a tar archive of face crops.
         """
+        fmt = self._get_format(etl_args)
+        set_request_mime_type(self._mime_type(path, fmt))
         if self._is_tar_file(path):
-            return self._transform_tar(data)
-        return self._transform_image(data)
+            return self._transform_tar(data, fmt)
+        return self._transform_image(data, path, fmt)
+
+    def transform_stream(
+        self,
+        reader: BinaryIO,
+        path: str,
+        etl_args: str,
+    ) -> Iterator[bytes]:
+        """
+        Transform the input stream by detecting faces (used when `STREAMING=true`).
+
+        Tar archives are read, transformed and emitted batch by batch, so the
+        output starts flowing before the whole archive has arrived. Single
+        images are read fully and transformed as in `transform`, joining a
+        cross-request batch when `BATCH_WAIT_MS` is set.
+
+        Args:
+            reader: File-like object with the request payload.
+            path: Request path or object key.
+            etl_args: Optional JSON string with a `format` override.
+
+        Returns:
+            Iterator over chunks of the processed image, tar archive or NDJSON
+            document.
+
+        The format is resolved before the output generator is returned, so
+        that `get_mime_type` sees the request's output.
+        """
+        fmt = self._get_format(etl_args)
+        set_request_mime_type(self._mime_type(path, fmt))
+        return self._stream(reader, path, fmt)
+
+    def _stream(self, reader: BinaryIO, path: str, fmt: str) -> Iterator[bytes]:
+        """Yield the transformed stream (see `transform_stream`)."""
+        if self._is_tar_file(path):
+            yield from self._transform_tar_stream(reader, fmt)
+            return
+        yield self._transform_image(reader.read(), path, fmt, batch=True)
+
+    def _mime_type(self, path: str, fmt: str) -> str:
+        """
+        Return the MIME type of the output for an object and an output format.
+
+        Tar archives are returned as tars, except with the 'json' format (NDJSON,
+        one line per image); a single image is returned as a JSON document
+        ('json'), a tar of crops ('crops') or an image.
+        """
+        if fmt == JSON_FORMAT:
+            return (
+                "application/x-ndjson"
+                if self._is_tar_file(path)
+                else "application/json"
+            )
+        if fmt == CROPS_FORMAT or self._is_tar_file(path):
+            return TAR_MIME
+        return mimetypes.guess_type(f"image.{fmt}")[0] or "application/octet-stream"
+
+    def get_mime_type(self) -> str:
+        """Return the MIME type of the current request's output."""
+        return request_mime_type(self._mime_type("", self.format))
 
 
 # instantiate and expose
@@ -4,32 +4,551 @@ Keras Preprocessing ETL Transformer (FastAPI)
 FastAPI-based ETL server that performs image preprocessing using Keras utilities.
 Supports various image transformations through the Keras ImageDataGenerator.
 
+The ImageDataGenerator parameters used for augmentation are implemented with
+NumPy/SciPy and Pillow by default, so TensorFlow is only imported (lazily) for
+parameters outside that subset or with `AUGMENT_BACKEND=tensorflow`.
+
 Environment Variables:
     AIS_TARGET_URL      - AIStore target URL (required for hpull mode)
     TRANSFORM           - JSON string with transformation parameters for ImageDataGenerator
-    FORMAT              - Output image format (default: JPEG)
+    FORMAT              - Output image format (default: JPEG), or an array format
+                          written without encoding: "npy", "safetensors" or "raw"
+    DATAGEN_CACHE_SIZE  - Number of per-request ImageDataGenerators (etl_args)
+                          kept in an LRU cache (default: 32)
+    DETERMINISTIC       - "true" to seed every augmentation from the object path,
+                          the transform parameters and the epoch (default: false)
+    SEED                - Base seed mixed into every derived seed (default: 0)
+    EPOCH               - Default epoch; overridden by the `epoch` etl_arg (default: 0)
+    CACHE_DIR           - Directory for cached results of deterministic
+                          augmentations (default: unset, no caching)
+    CACHE_MAX_BYTES     - Size of CACHE_DIR above which the least recently used
+                          results are evicted; 0 for no limit (default: 1 GiB)
+    BATCH_SIZE          - Images of a tar shard augmented together (default: 32)
+    WORKERS             - Threads decoding and encoding the images of a tar shard
+                          (default: CPU count)
+    AUGMENT_BACKEND     - "numpy" (NumPy/SciPy/Pillow, TensorFlow only for
+                          unsupported parameters) or "tensorflow" (Keras
+                          ImageDataGenerator) (default: numpy)
 
 Copyright (c) 2023-2025, NVIDIA CORPORATION. All rights reserved.
 """
 
+# pylint: disable=too-many-lines
+
+import fcntl
+import hashlib
 import io
 import json
 import os
-from urllib.parse import unquote_plus
+import resource
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageEnhance
+from scipy import ndimage
 
-from tensorflow.keras.utils import (  # pylint: disable=import-error,no-name-in-module
-    load_img,
-    array_to_img,
-    img_to_array,
+from fastapi import Response
+from aistore.sdk.etl.webserver.fastapi_server import FastAPIServer
+
+from common.array_formats import (
+    ARRAY_FORMATS,
+    FORMAT_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    encode_array,
+    output_mime_type,
 )
-from tensorflow.keras.preprocessing.image import (  # pylint: disable=import-error,no-name-in-module
-    ImageDataGenerator,
+from common.server_utils import (
+    TAR_EXTENSIONS,
+    TAR_MIME,
+    env_flag,
+    render_cache_metrics,
+    request_mime_type,
+    set_request_mime_type,
 )
 
-from aistore.sdk.etl.webserver.fastapi_server import FastAPIServer
+# `NumpyImageDataGenerator` or Keras `ImageDataGenerator`
+DataGenerator = Any
+
+AUGMENT_BACKENDS = ("numpy", "tensorflow")
+
+# ImageDataGenerator parameters implemented by `NumpyImageDataGenerator`; the
+# others (standardization, `preprocessing_function`, ...) need Keras
+NUMPY_DATAGEN_PARAMS = frozenset(
+    {
+        "rotation_range",
+        "width_shift_range",
+        "height_shift_range",
+        "brightness_range",
+        "shear_range",
+        "zoom_range",
+        "channel_shift_range",
+        "fill_mode",
+        "cval",
+        "horizontal_flip",
+        "vertical_flip",
+        "interpolation_order",
+    }
+)
+
+# ImageDataGenerator parameters accepted in `TRANSFORM` and etl_args
+DATAGEN_PARAMS = NUMPY_DATAGEN_PARAMS | {
+    "featurewise_center",
+    "samplewise_center",
+    "featurewise_std_normalization",
+    "samplewise_std_normalization",
+    "zca_whitening",
+    "zca_epsilon",
+    "rescale",
+    "data_format",
+    "validation_split",
+    "dtype",
+}
+
+# Parameters of `get_random_transform` applied by `_affine_batch_tf`; the others
+# (flips, channel and brightness shifts) are left to `apply_transform`
+IDENTITY_AFFINE = {"theta": 0, "tx": 0, "ty": 0, "shear": 0, "zx": 1, "zy": 1}
+
+
+def _output_name(name: str, output_format: str) -> str:
+    """Rename a tar member so that its extension matches the output format."""
+    stem, ext = os.path.splitext(name)
+    extensions = FORMAT_EXTENSIONS.get(output_format.lower())
+    if extensions is None or ext.lower() in extensions:
+        return name
+    return stem + extensions[0]
+
+
+def _affine_matrix(params: Dict[str, Any], height: int, width: int) -> np.ndarray:
+    """
+    Return the sampling matrix of `apply_affine_transform` for HWC images.
+
+    Maps output `(row, col, 1)` coordinates to input coordinates, composed in
+    the same order as Keras (rotation, shift, shear, zoom, about the center).
+    """
+    matrix = np.eye(3)
+    theta = np.deg2rad(params.get("theta", 0))
+    matrix = matrix @ np.array(
+        [
+            [np.cos(theta), -np.sin(theta), 0],
+            [np.sin(theta), np.cos(theta), 0],
+            [0, 0, 1],
+        ]
+    )
+    matrix = matrix @ np.array(
+        [[1, 0, params.get("tx", 0)], [0, 1, params.get("ty", 0)], [0, 0, 1]]
+    )
+    shear = np.deg2rad(params.get("shear", 0))
+    matrix = matrix @ np.array(
+        [[1, -np.sin(shear), 0], [0, np.cos(shear), 0], [0, 0, 1]]
+    )
+    matrix = matrix @ np.diag([params.get("zx", 1), params.get("zy", 1), 1])
+
+    o_x, o_y = height / 2 - 0.5, width / 2 - 0.5
+    matrix = (
+        np.array([[1, 0, o_x], [0, 1, o_y], [0, 0, 1]])
+        @ matrix
+        @ np.array([[1, 0, -o_x], [0, 1, -o_y], [0, 0, 1]])
+    )
+    # Keras builds the matrix in (x, y) order and swaps it to (row, col)
+    matrix[:, [0, 1]] = matrix[:, [1, 0]]
+    matrix[[0, 1]] = matrix[[1, 0]]
+    return matrix
+
+
+def _max_rss_bytes() -> int:
+    """Return the peak resident set size of the process (`ru_maxrss` is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _process_uptime() -> Optional[float]:
+    """Return seconds since process start (`starttime`, field 22 of `/proc/self/stat`), or None."""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def _is_affine(params: Dict[str, Any]) -> bool:
+    """Return whether transform parameters include a (non-identity) affine transform."""
+    return any(
+        params.get(key, value) != value for key, value in IDENTITY_AFFINE.items()
+    )
+
+
+def _import_tensorflow() -> Any:
+    """Import TensorFlow on first use; the NumPy backend never needs it."""
+    import tensorflow as tf  # pylint: disable=import-error,import-outside-toplevel
+
+    return tf
+
+
+def _import_image_data_generator() -> Any:
+    """Import the Keras `ImageDataGenerator` (and TensorFlow) on first use."""
+    # pylint: disable=import-error,no-name-in-module,import-outside-toplevel
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    return ImageDataGenerator
+
+
+def _affine_batch_tf(
+    images: np.ndarray, params: List[Dict[str, Any]], fill_mode: str, cval: float
+) -> np.ndarray:
+    """
+    Apply the affine part of Keras augmentations to a stack of same-shape images
+    with a single vectorized (bilinear) TensorFlow projective transform.
+
+    Args:
+        images: `[N, H, W, C]` float32 images.
+        params: Random transform parameters of each image.
+        fill_mode: Keras fill mode ("nearest", "constant", "reflect"); "wrap" differs
+            from SciPy (period `size` instead of `size - 1`), see `_augment_batch`.
+        cval: Fill value for "constant".
+
+    Returns:
+        The transformed `[N, H, W, C]` images.
+    """
+    height, width = images.shape[1:3]
+    transforms = []
+    for image_params in params:
+        matrix = _affine_matrix(image_params, height, width)
+        # TF maps output (x=col, y=row) to input (x', y')
+        transforms.append(
+            [
+                matrix[1, 1],
+                matrix[1, 0],
+                matrix[1, 2],
+                matrix[0, 1],
+                matrix[0, 0],
+                matrix[0, 2],
+                0,
+                0,
+            ]
+        )
+    return (
+        _import_tensorflow()
+        .raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=np.asarray(transforms, dtype=np.float32),
+            output_shape=np.asarray([height, width], dtype=np.int32),
+            fill_value=np.float32(cval),
+            interpolation="BILINEAR",
+            fill_mode=fill_mode.upper(),
+        )
+        .numpy()
+    )
+
+
+def _sample_indices(
+    coords: np.ndarray, size: int, fill_mode: str
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the two neighbouring indices and the (float32) interpolation weight
+    of sampling coordinates along one axis, extended like `scipy.ndimage` modes.
+    """
+    if fill_mode == "reflect":
+        lower = np.floor(coords)
+        weight = (coords - lower).astype(np.float32)
+        lower = lower.astype(np.intp)
+        indices = []
+        for index in (lower, lower + 1):
+            index = np.mod(index, 2 * size)
+            indices.append(np.where(index < size, index, 2 * size - 1 - index))
+        return indices[0], indices[1], weight
 
+    if fill_mode == "wrap":
+        # SciPy's "wrap" maps coordinates with a period of `size - 1` (and
+        # maps negative multiples of the period to `size - 1`, not 0)
+        period = max(size - 1, 1)
+        coords = np.where(
+            coords < 0,
+            coords + period * (np.floor(-coords / period) + 1),
+            np.where(
+                coords > period, coords - period * np.floor(coords / period), coords
+            ),
+        )
+        coords = np.minimum(coords, size - 1)
+    else:
+        # "nearest" extends the edges; "constant" is masked by the caller
+        coords = np.clip(coords, 0, size - 1)
+    lower = coords.astype(np.intp)
+    weight = (coords - lower).astype(np.float32)
+    return lower, np.minimum(lower + 1, size - 1), weight
 
-class KerasPreprocessServer(FastAPIServer):
+
+def _affine_numpy(  # pylint: disable=too-many-locals
+    image: np.ndarray, matrix: np.ndarray, fill_mode: str, cval: float
+) -> np.ndarray:
+    """
+    Bilinearly resample an HWC image with a `_affine_matrix` sampling matrix.
+
+    Equivalent to the per-channel `scipy.ndimage.affine_transform` (order 1)
+    used by Keras, but samples all channels with one gather per neighbour.
+    """
+    height, width, channels = image.shape
+    rows = np.arange(height, dtype=np.float64)[:, None]
+    cols = np.arange(width, dtype=np.float64)[None, :]
+    src_rows = (matrix[0, 0] * rows + matrix[0, 1] * cols + matrix[0, 2]).ravel()
+    src_cols = (matrix[1, 0] * rows + matrix[1, 1] * cols + matrix[1, 2]).ravel()
+
+    row0, row1, row_weight = _sample_indices(src_rows, height, fill_mode)
+    col0, col1, col_weight = _sample_indices(src_cols, width, fill_mode)
+    row_weight, col_weight = row_weight[:, None], col_weight[:, None]
+
+    pixels = image.reshape(-1, channels)
+    row0, row1 = row0 * width, row1 * width
+
+    def lerp(start: np.ndarray, end: np.ndarray, weight: np.ndarray) -> np.ndarray:
+        end -= start
+        end *= weight
+        start += end
+        return start
+
+    top = lerp(
+        pixels.take(row0 + col0, axis=0), pixels.take(row0 + col1, axis=0), col_weight
+    )
+    bottom = lerp(
+        pixels.take(row1 + col0, axis=0), pixels.take(row1 + col1, axis=0), col_weight
+    )
+    top = lerp(top, bottom, row_weight)
+
+    if fill_mode == "constant":
+        outside = (
+            (src_rows < 0)
+            | (src_rows > height - 1)
+            | (src_cols < 0)
+            | (src_cols > width - 1)
+        )
+        top[outside] = cval
+    return top.reshape(height, width, channels)
+
+
+def _array_to_image(x: np.ndarray, scale: bool = True) -> Image.Image:
+    """Convert an HWC array to a PIL image, like Keras `array_to_img`."""
+    x = np.asarray(x, dtype=np.float32)
+    if scale:
+        x = x - np.min(x)
+        x_max = np.max(x)
+        if x_max != 0:
+            x /= x_max
+        x *= 255
+    if x.shape[2] == 1:
+        return Image.fromarray(x[:, :, 0].astype("uint8"), "L")
+    return Image.fromarray(x.astype("uint8"), {3: "RGB", 4: "RGBA"}[x.shape[2]])
+
+
+def _decode_image(data: bytes) -> np.ndarray:
+    """Decode image bytes into an HWC float32 RGB array, like `load_img` + `img_to_array`."""
+    img = Image.open(io.BytesIO(data))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return np.asarray(img, dtype=np.float32)
+
+
+def _is_output_format(output_format: Any) -> bool:
+    """Return whether a format is an array format or an image format PIL can write."""
+    if not isinstance(output_format, str):
+        return False
+    Image.init()
+    return output_format.lower() in ARRAY_FORMATS or output_format.upper() in Image.SAVE
+
+
+def _encode_output(img: np.ndarray, output_format: str) -> bytes:
+    """Encode an augmented HWC float32 array as an image or an array format."""
+    # Write the array as is (HWC float32), or as uint8 for `raw`
+    if output_format.lower() in ARRAY_FORMATS:
+        if output_format.lower() == "raw":
+            img = np.clip(img, 0, 255).astype(np.uint8)
+        return encode_array(img, output_format)
+
+    # Convert back to image and bytes
+    buf = io.BytesIO()
+    _array_to_image(img).save(buf, format=output_format)
+    return buf.getvalue()
+
+
+class NumpyImageDataGenerator:  # pylint: disable=too-many-instance-attributes
+    """
+    NumPy/SciPy/Pillow implementation of the augmentation subset of the Keras
+    `ImageDataGenerator` (`NUMPY_DATAGEN_PARAMS`, channels-last images).
+
+    `get_random_transform` draws from the global NumPy RNG in the same order
+    as Keras and `apply_transform` performs the same operations, so both
+    produce identical results for the same seed.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        rotation_range: float = 0,
+        width_shift_range: Any = 0.0,
+        height_shift_range: Any = 0.0,
+        brightness_range: Optional[List[float]] = None,
+        shear_range: float = 0.0,
+        zoom_range: Any = 0.0,
+        channel_shift_range: float = 0.0,
+        fill_mode: str = "nearest",
+        cval: float = 0.0,
+        horizontal_flip: bool = False,
+        vertical_flip: bool = False,
+        interpolation_order: int = 1,
+    ):
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.channel_shift_range = channel_shift_range
+        self.fill_mode = fill_mode
+        self.cval = cval
+        self.horizontal_flip = horizontal_flip
+        self.vertical_flip = vertical_flip
+        self.interpolation_order = interpolation_order
+
+        if isinstance(zoom_range, (float, int)):
+            self.zoom_range = [1 - zoom_range, 1 + zoom_range]
+        elif len(zoom_range) == 2 and all(
+            isinstance(val, (float, int)) for val in zoom_range
+        ):
+            self.zoom_range = [zoom_range[0], zoom_range[1]]
+        else:
+            raise ValueError(
+                f"`zoom_range` should be a float or a list of two floats, got {zoom_range}"
+            )
+        if brightness_range is not None and (
+            not isinstance(brightness_range, (tuple, list))
+            or len(brightness_range) != 2
+        ):
+            raise ValueError(
+                f"`brightness_range` should be a list of two floats, got {brightness_range}"
+            )
+        self.brightness_range = brightness_range
+
+    @staticmethod
+    def _random_shift(shift_range: Any, size: int) -> float:
+        """Draw a shift in pixels from an int, float or list range (as Keras)."""
+        try:  # 1-D array-like or int
+            shift = np.random.choice(shift_range)
+            shift *= np.random.choice([-1, 1])
+        except ValueError:  # floating point
+            shift = np.random.uniform(-shift_range, shift_range)
+        if np.max(shift_range) < 1:
+            shift *= size
+        return shift
+
+    def get_random_transform(
+        self, img_shape: Tuple[int, ...], seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Draw random transform parameters for an HWC image shape."""
+        if seed is not None:
+            np.random.seed(seed)
+
+        theta = 0
+        if self.rotation_range:
+            theta = np.random.uniform(-self.rotation_range, self.rotation_range)
+        tx = 0
+        if self.height_shift_range:
+            tx = self._random_shift(self.height_shift_range, img_shape[0])
+        ty = 0
+        if self.width_shift_range:
+            ty = self._random_shift(self.width_shift_range, img_shape[1])
+        shear = 0
+        if self.shear_range:
+            shear = np.random.uniform(-self.shear_range, self.shear_range)
+        zx, zy = 1, 1
+        if self.zoom_range[0] != 1 or self.zoom_range[1] != 1:
+            zx, zy = np.random.uniform(self.zoom_range[0], self.zoom_range[1], 2)
+
+        flip_horizontal = (np.random.random() < 0.5) * self.horizontal_flip
+        flip_vertical = (np.random.random() < 0.5) * self.vertical_flip
+
+        channel_shift_intensity = None
+        if self.channel_shift_range != 0:
+            channel_shift_intensity = np.random.uniform(
+                -self.channel_shift_range, self.channel_shift_range
+            )
+        brightness = None
+        if self.brightness_range is not None:
+            brightness = np.random.uniform(
+                self.brightness_range[0], self.brightness_range[1]
+            )
+
+        return {
+            "theta": theta,
+            "tx": tx,
+            "ty": ty,
+            "shear": shear,
+            "zx": zx,
+            "zy": zy,
+            "flip_horizontal": flip_horizontal,
+            "flip_vertical": flip_vertical,
+            "channel_shift_intensity": channel_shift_intensity,
+            "brightness": brightness,
+        }
+
+    def apply_transform(self, x: np.ndarray, params: Dict[str, Any]) -> np.ndarray:
+        """Apply transform parameters to an HWC image, in the order of Keras."""
+        if _is_affine(params):
+            matrix = _affine_matrix(params, x.shape[0], x.shape[1])
+            x = np.stack(
+                [
+                    ndimage.affine_transform(
+                        x[:, :, channel],
+                        matrix[:2, :2],
+                        matrix[:2, 2],
+                        order=self.interpolation_order,
+                        mode=self.fill_mode,
+                        cval=self.cval,
+                    )
+                    for channel in range(x.shape[2])
+                ],
+                axis=2,
+            )
+
+        intensity = params.get("channel_shift_intensity")
+        if intensity is not None:
+            min_x, max_x = np.min(x), np.max(x)
+            x = np.clip(x + intensity, min_x, max_x)
+
+        if params.get("flip_horizontal", False):
+            x = x[:, ::-1]
+        if params.get("flip_vertical", False):
+            x = x[::-1]
+
+        brightness = params.get("brightness")
+        if brightness is not None:
+            # Keras `apply_brightness_shift(x, brightness, scale=False)`
+            x_min, x_max = np.min(x), np.max(x)
+            local_scale = x_min < 0 or x_max > 255
+            img = ImageEnhance.Brightness(_array_to_image(x, scale=local_scale))
+            x = np.asarray(img.enhance(brightness), dtype=np.float32)
+            if local_scale:
+                x = x / 255 * (x_max - x_min) + x_min
+        return x
+
+    def apply_affine(self, x: np.ndarray, params: Dict[str, Any]) -> np.ndarray:
+        """
+        Apply only the affine part of the transform parameters (rotation, shifts,
+        shear, zoom) with `_affine_numpy`; requires `interpolation_order=1`.
+        """
+        if not _is_affine(params):
+            return x
+        matrix = _affine_matrix(params, x.shape[0], x.shape[1])
+        return _affine_numpy(x, matrix, self.fill_mode, self.cval)
+
+
+class KerasPreprocessServer(
+    FastAPIServer
+):  # pylint: disable=too-many-instance-attributes
     """
     FastAPI-based server for Keras image preprocessing transformation.
 
@@ -45,11 +564,23 @@ class KerasPreprocessServer(FastAPIServer):
         - TRANSFORM: JSON string with transformation parameters
         - FORMAT: Output image format (default: JPEG)
         """
+        start = time.monotonic()
         super().__init__()
 
         # Initialize image generator and format
         self._init_transform_config()
 
+        # From process start to include module imports (initialization only without `/proc`)
+        uptime = _process_uptime()
+        self.startup_seconds = time.monotonic() - start if uptime is None else uptime
+        self.logger.info(
+            "Started in %.2fs (augment backend: %s, TensorFlow loaded: %s, max RSS: %.0f MiB)",
+            self.startup_seconds,
+            self.backend,
+            "tensorflow" in sys.modules,
+            _max_rss_bytes() / (1 << 20),
+        )
+
     def _init_transform_config(self):
         """Parse and validate transform configuration from environment variables."""
         # Get transform parameters
@@ -68,57 +599,461 @@ class KerasPreprocessServer(FastAPIServer):
         # Get output format
         self.format = os.environ.get("FORMAT", "JPEG")
 
+        self.backend = os.environ.get("AUGMENT_BACKEND", "numpy").lower()
+        if self.backend not in AUGMENT_BACKENDS:
+            raise EnvironmentError(
+                f"Invalid AUGMENT_BACKEND '{self.backend}', expected one of {AUGMENT_BACKENDS}"
+            )
+
+        # Generators for per-request parameters (etl_args) are built once per
+        # normalized parameter set and kept in a bounded LRU cache
+        self._get_datagen = lru_cache(
+            maxsize=int(os.environ.get("DATAGEN_CACHE_SIZE", "32"))
+        )(self._create_datagen)
+
         # Initialize the data generator with transform parameters
-        self.datagen = ImageDataGenerator(**self.transform_params)
+        self.datagen = self._create_datagen(
+            json.dumps(self.transform_params, sort_keys=True, separators=(",", ":"))
+        )
+
+        # Deterministic augmentation: seeds derived from the request, so that
+        # results are reproducible and can be cached on disk
+        self.deterministic = env_flag("DETERMINISTIC")
+        self.seed = int(os.environ.get("SEED", "0"))
+        self.epoch = int(os.environ.get("EPOCH", "0"))
+        self.cache_dir = os.environ.get("CACHE_DIR") or None
+        if self.cache_dir:
+            if not self.deterministic:
+                raise EnvironmentError("CACHE_DIR requires DETERMINISTIC=true")
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_max_bytes = int(os.environ.get("CACHE_MAX_BYTES", str(1 << 30)))
+        self.result_cache_hits = 0
+        self.result_cache_misses = 0
+        self.result_cache_evictions = 0
+        # Bytes this process wrote to the cache since it last scanned it
+        self._cache_written = 0
+        # Results differ between augmentation backends
+        self._cache_namespace = f"{self.backend}\0{os.environ.get('KERAS_BACKEND', '')}"
+        # Requests run on pool and WebSocket threads
+        self._cache_stats_lock = threading.Lock()
+        # `get_random_transform(seed=...)` reseeds the global NumPy RNG
+        self._rng_lock = threading.Lock()
 
-    def transform(self, data: bytes, _path: str, etl_args: str) -> bytes:
+        # Tar shards: images are augmented in batches, decoded and encoded by a pool
+        self.batch_size = max(1, int(os.environ.get("BATCH_SIZE", "32")))
+        self.workers = max(1, int(os.environ.get("WORKERS", str(os.cpu_count()))))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _create_datagen(self, params_key: str) -> DataGenerator:
         """
-        Transform the input image using Keras preprocessing.
+        Build a generator from normalized (sorted-key JSON) parameters: a
+        `NumpyImageDataGenerator` unless the parameters need Keras (or
+        `AUGMENT_BACKEND=tensorflow`), in which case TensorFlow is imported.
+        """
+        params = json.loads(params_key)
+        unsupported = set(params) - NUMPY_DATAGEN_PARAMS
+        if self.backend == "numpy" and not unsupported:
+            return NumpyImageDataGenerator(**params)
+        if self.backend == "numpy":
+            self.logger.info(
+                "Parameters %s need the Keras ImageDataGenerator, importing TensorFlow",
+                sorted(unsupported),
+            )
+        return _import_image_data_generator()(**params)
 
-        Args:
-            data: Input image data as bytes
-            _path: Path to the object (unused)
-            etl_args: JSON string with transform parameters (optional, overrides env vars)
+    def _setup_app(self):
+        """Register the `/metrics` route ahead of the catch-all object routes."""
 
-        Returns:
-            Transformed image as bytes
+        @self.app.get("/metrics")
+        async def metrics():
+            return Response(
+                content=self.render_metrics(), media_type="text/plain; version=0.0.4"
+            )
+
+        super()._setup_app()
+
+    def render_metrics(self) -> str:
+        """Return ImageDataGenerator, result cache and startup metrics in Prometheus text format."""
+        metrics = render_cache_metrics(
+            "keras_datagen_cache", self._get_datagen.cache_info()
+        )
+        for name, help_text, value in (
+            ("startup_seconds", "Time from process start.", self.startup_seconds),
+            ("max_rss_bytes", "Peak resident memory of the worker.", _max_rss_bytes()),
+            (
+                "tensorflow_loaded",
+                "Whether TensorFlow is imported in the worker.",
+                int("tensorflow" in sys.modules),
+            ),
+        ):
+            metrics += (
+                f"# HELP keras_{name} {help_text}\n"
+                f"# TYPE keras_{name} gauge\nkeras_{name} {value}\n"
+            )
+        if self.cache_dir:
+            for name, value in (
+                ("hits_total", self.result_cache_hits),
+                ("misses_total", self.result_cache_misses),
+                ("evictions_total", self.result_cache_evictions),
+            ):
+                metric = f"keras_result_cache_{name}"
+                metrics += f"# TYPE {metric} counter\n{metric} {value}\n"
+        return metrics
+
+    def _parse_etl_args(
+        self, etl_args: Optional[str]
+    ) -> Tuple[DataGenerator, str, str, int]:
+        """
+        Return the generator, its normalized parameters, the output format and
+        the epoch of a request.
+
+        etl_args hold ImageDataGenerator parameters that replace `TRANSFORM`,
+        plus optional `format` and `epoch` keys. etl_args that are not a JSON
+        object are ignored with a warning.
 
         Raises:
-            Exception: If image processing fails
+            ValueError: If the format, the epoch or a generator parameter is invalid
         """
-        # Use etl_args if provided, otherwise fall back to environment defaults
-        if etl_args:
+        datagen = self.datagen
+        params_key = json.dumps(
+            self.transform_params, sort_keys=True, separators=(",", ":")
+        )
+        output_format = self.format
+        epoch = self.epoch
+        if not etl_args:
+            return datagen, params_key, output_format, epoch
+        try:
+            transform_params = json.loads(etl_args)
+        except json.JSONDecodeError:
+            transform_params = None
+        if not isinstance(transform_params, dict):
+            self.logger.warning("Ignoring etl_args, not a JSON object: %r", etl_args)
+            return datagen, params_key, output_format, epoch
+
+        output_format = transform_params.pop("format", None) or self.format
+        if not _is_output_format(output_format):
+            raise ValueError(f"Invalid format in etl_args: {output_format!r}")
+        try:
+            epoch = int(transform_params.pop("epoch", self.epoch))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid epoch in etl_args: {e}") from e
+        if transform_params:
+            unknown = sorted(set(transform_params) - DATAGEN_PARAMS)
+            if unknown:
+                raise ValueError(f"Unknown ImageDataGenerator parameters: {unknown}")
+            params_key = json.dumps(
+                transform_params, sort_keys=True, separators=(",", ":")
+            )
             try:
-                decoded_args = unquote_plus(etl_args)
-                transform_params = json.loads(decoded_args)
-                datagen = ImageDataGenerator(**transform_params)
-            except json.JSONDecodeError:
-                datagen = self.datagen
-            except (ValueError, TypeError):
-                datagen = self.datagen
-        else:
-            datagen = self.datagen
+                datagen = self._get_datagen(params_key)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Invalid ImageDataGenerator parameters: {e}") from e
+        return datagen, params_key, output_format, epoch
+
+    def _derive_seed(self, path: str, params_key: str, epoch: int) -> int:
+        """Derive a 32-bit seed from `SEED`, the object path, the parameters and the epoch."""
+        material = f"{self.seed}\0{path}\0{params_key}\0{epoch}".encode()
+        return int.from_bytes(hashlib.sha256(material).digest()[:4], "little")
+
+    def _cache_path(self, data: bytes, seed: int, params_key: str, fmt: str) -> str:
+        """
+        Return the cache file of a result (keyed by input content, augmentation
+        backend, seed and output).
+        """
+        digest = hashlib.sha256(data)
+        digest.update(
+            f"\0{self._cache_namespace}\0{seed}\0{params_key}\0{fmt.lower()}".encode()
+        )
+        key = digest.hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
 
+    def _write_cache(self, cache_path: str, output: bytes) -> None:
+        """Write a cache entry atomically; failures only cost a recomputation."""
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(cache_path), delete=False
+            ) as tmp:
+                tmp.write(output)
+            os.replace(tmp.name, cache_path)
+        except OSError as e:
+            self.logger.warning("Failed to write cache entry %s: %s", cache_path, e)
+            return
+        if not self.cache_max_bytes:
+            return
+        # Rescan the directory after every tenth of the limit written, so that
+        # writes of all server processes are accounted for
+        with self._cache_stats_lock:
+            self._cache_written += len(output)
+            if self._cache_written < self.cache_max_bytes // 10:
+                return
+            self._cache_written = 0
+        self._evict_cache()
+
+    def _evict_cache(self) -> None:
+        """
+        Evict the least recently used results while the cache exceeds
+        `CACHE_MAX_BYTES`, down to 90% of it.
+
+        Entries are ordered by modification time, which cache hits refresh.
+        Server processes share the directory: one of them evicts at a time,
+        and the others skip the pass.
+        """
+        try:
+            # pylint: disable-next=consider-using-with
+            lock = open(os.path.join(self.cache_dir, ".lock"), "wb")
+        except OSError as e:
+            self.logger.warning("Failed to open the cache lock: %s", e)
+            return
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return  # Another process (or thread) is evicting
+            entries = []
+            for prefix in os.scandir(self.cache_dir):
+                if not prefix.is_dir():
+                    continue
+                with os.scandir(prefix.path) as files:
+                    for entry in files:
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        # Entries in progress are `tmp*` (keys are hexadecimal)
+                        if not entry.name.startswith("tmp"):
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            if total <= self.cache_max_bytes:
+                return
+            evicted = 0
+            for _, size, entry_path in sorted(entries):
+                if total <= self.cache_max_bytes * 9 // 10:
+                    break
+                try:
+                    os.remove(entry_path)
+                    evicted += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with self._cache_stats_lock:
+            self.result_cache_evictions += evicted
+
+    def _random_transform(
+        self, datagen: DataGenerator, shape: Tuple[int, ...], seed: Optional[int]
+    ) -> Dict[str, Any]:
+        """Draw random (or seeded) augmentation parameters for an image shape."""
+        if seed is None:
+            return datagen.get_random_transform(shape)
+        with self._rng_lock:
+            return datagen.get_random_transform(shape, seed=seed)
+
+    def _augment(
+        self,
+        data: bytes,
+        datagen: DataGenerator,
+        seed: Optional[int],
+        output_format: str,
+    ) -> bytes:
+        """Decode an image, apply a random (or seeded) augmentation and encode it."""
         try:
             # Load and preprocess image
-            img = load_img(io.BytesIO(data))
-            img = img_to_array(img)
+            img = _decode_image(data)
 
             # Generate random transform parameters and apply transformation
-            transform_params_actual = datagen.get_random_transform(img.shape)
+            transform_params_actual = self._random_transform(datagen, img.shape, seed)
             img = datagen.apply_transform(img, transform_params_actual)
 
-            # Convert back to image and bytes
-            img = array_to_img(img)
-            buf = io.BytesIO()
-            img.save(buf, format=self.format)
-
-            return buf.getvalue()
+            return _encode_output(img, output_format)
 
         except (IOError, ValueError, OSError) as e:
             self.logger.error("Error processing image: %s", str(e), exc_info=True)
             raise
 
+    def _augment_batch(
+        self,
+        images: List[np.ndarray],
+        datagen: DataGenerator,
+        seeds: List[Optional[int]],
+    ) -> List[np.ndarray]:
+        """
+        Augment a batch of decoded images.
+
+        The affine part of the augmentation (rotation, shift, shear, zoom) is
+        applied first. For Keras generators, it is one TensorFlow projective
+        transform per group of same-shape images. The NumPy generator resamples
+        image by image (on the worker pool): `_affine_numpy` is memory-bound
+        and already vectorized over pixels and channels, so stacking images
+        only makes it slower. Flips and channel/brightness shifts are then
+        applied per image, in the same order as `ImageDataGenerator.apply_transform`.
+
+        Generators with a non-bilinear `interpolation_order` are augmented
+        image by image, as are Keras generators with `fill_mode="wrap"`: the
+        "WRAP" mode of TensorFlow's transform wraps with a period of the image
+        size, while SciPy (used by Keras) wraps with a period of `size - 1`.
+        """
+        params = [
+            self._random_transform(datagen, img.shape, seed)
+            for img, seed in zip(images, seeds)
+        ]
+        numpy_backend = isinstance(datagen, NumpyImageDataGenerator)
+        if datagen.interpolation_order != 1 or (
+            not numpy_backend and datagen.fill_mode == "wrap"
+        ):
+            return list(self._pool.map(datagen.apply_transform, images, params))
+
+        if numpy_backend:
+            transformed = list(self._pool.map(datagen.apply_affine, images, params))
+        else:
+            groups: Dict[Tuple[int, ...], List[int]] = {}
+            for idx, img in enumerate(images):
+                groups.setdefault(img.shape, []).append(idx)
+            transformed = list(images)
+            for indices in groups.values():
+                stacked = _affine_batch_tf(
+                    np.stack([images[idx] for idx in indices]),
+                    [params[idx] for idx in indices],
+                    datagen.fill_mode,
+                    datagen.cval,
+                )
+                for idx, img in zip(indices, stacked):
+                    transformed[idx] = img
+
+        return list(
+            self._pool.map(
+                lambda img, image_params: datagen.apply_transform(
+                    img, {**image_params, **IDENTITY_AFFINE}
+                ),
+                transformed,
+                params,
+            )
+        )
+
+    def _process_batch(  # pylint: disable=too-many-locals
+        self,
+        batch: List[Tuple[tarfile.TarInfo, bytes]],
+        path: str,
+        request: Tuple[DataGenerator, str, str, int],
+    ) -> List[Tuple[tarfile.TarInfo, bytes]]:
+        """Augment the image members of a batch; other members pass through."""
+        datagen, params_key, output_format, epoch = request
+        image_indices = [
+            idx
+            for idx, (member, _) in enumerate(batch)
+            if member.name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        if not image_indices:
+            return batch
+
+        images = list(
+            self._pool.map(_decode_image, [batch[idx][1] for idx in image_indices])
+        )
+        seeds = [
+            (
+                self._derive_seed(f"{path}/{batch[idx][0].name}", params_key, epoch)
+                if self.deterministic
+                else None
+            )
+            for idx in image_indices
+        ]
+        augmented = self._augment_batch(images, datagen, seeds)
+        encoded = self._pool.map(
+            _encode_output, augmented, [output_format] * len(augmented)
+        )
+
+        output = list(batch)
+        for idx, data in zip(image_indices, encoded):
+            member = batch[idx][0]
+            member.name = _output_name(member.name, output_format)
+            member.size = len(data)
+            output[idx] = (member, data)
+        return output
+
+    def _transform_tar(
+        self,
+        data: bytes,
+        path: str,
+        request: Tuple[DataGenerator, str, str, int],
+    ) -> bytes:
+        """
+        Augment the image members of a tar (e.g., WebDataset) shard in batches
+        of `BATCH_SIZE` images, keeping member order; non-image members pass
+        through unchanged.
+        """
+        output = io.BytesIO()
+        with tarfile.open(
+            fileobj=io.BytesIO(data), mode="r|*"
+        ) as input_tar, tarfile.open(fileobj=output, mode="w|") as output_tar:
+            batch: List[Tuple[tarfile.TarInfo, bytes]] = []
+            num_images = 0
+            for member in input_tar:
+                if not member.isfile():
+                    continue
+                batch.append((member, input_tar.extractfile(member).read()))
+                if member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    num_images += 1
+                if num_images == self.batch_size:
+                    for out_member, out_data in self._process_batch(
+                        batch, path, request
+                    ):
+                        output_tar.addfile(out_member, io.BytesIO(out_data))
+                    batch, num_images = [], 0
+            for out_member, out_data in self._process_batch(batch, path, request):
+                output_tar.addfile(out_member, io.BytesIO(out_data))
+        return output.getvalue()
+
+    def transform(self, data: bytes, path: str, etl_args: str) -> bytes:
+        """
+        Transform the input image using Keras preprocessing.
+
+        Args:
+            data: Input image data as bytes
+            path: Path to the object (seeds the augmentation with `DETERMINISTIC=true`)
+            etl_args: JSON string with transform parameters (optional, overrides env vars);
+                optional `format` and `epoch` keys override `FORMAT` and `EPOCH`
+
+        Returns:
+            Transformed image as bytes
+
+        Raises:
+            Exception: If image processing fails
+        """
+        # Use etl_args if provided, otherwise fall back to environment defaults
+        request = self._parse_etl_args(etl_args)
+        datagen, params_key, output_format, epoch = request
+        is_tar = path.lower().endswith(TAR_EXTENSIONS)
+        set_request_mime_type(TAR_MIME if is_tar else output_mime_type(output_format))
+
+        seed = None
+        cache_path = None
+        if self.deterministic:
+            seed = self._derive_seed(path, params_key, epoch)
+            if self.cache_dir:
+                cache_path = self._cache_path(data, seed, params_key, output_format)
+                try:
+                    with open(cache_path, "rb") as f:
+                        output = f.read()
+                        # Mark the entry as recently used for eviction
+                        os.utime(f.fileno())
+                    with self._cache_stats_lock:
+                        self.result_cache_hits += 1
+                    return output
+                except FileNotFoundError:
+                    with self._cache_stats_lock:
+                        self.result_cache_misses += 1
+
+        if is_tar:
+            output = self._transform_tar(data, path, request)
+        else:
+            output = self._augment(data, datagen, seed, output_format)
+        if cache_path:
+            self._write_cache(cache_path, output)
+        return output
+
+    def get_mime_type(self) -> str:
+        """Return the MIME type of the current request's output (a tar for shards)."""
+        return request_mime_type(output_mime_type(self.format))
+
 
 # Create the server instance and expose the FastAPI app
 fastapi_server = KerasPreprocessServer()
@@ -0,0 +1,190 @@
+"""
+Local Benchmark for Face Detection Transformer
+
+Builds a synthetic WebDataset shard (one image + one `.cls` member per sample)
+and measures in-process shard throughput of `FaceDetection.transform` for
+several values of `BATCH_SIZE` (number of images per SSD forward pass).
+Also compares single-image throughput on a large photo between the annotated
+image output and the detection-only `FORMAT=json` output (reduced-scale decode),
+and shard throughput across inference backends (`INFERENCE_BACKEND`).
+
+Configuration via environment variables:
+  MODEL_DIR      : Directory with `architecture.txt` and `weights.caffemodel`
+                   (default ./face_detection/model)
+  IMAGE_PATH     : Image replicated into the shard
+                   (default tests/resources/test-face-detection.png)
+  NUM_IMAGES     : Number of samples in the shard (default 256)
+  BATCH_SIZES    : Comma-separated batch sizes to compare (default 1,2,4,8,16,32,64)
+  ITERATIONS     : Timed runs per batch size (default 3)
+  LARGE_IMAGE_PATH: Large JPEG for the output-format comparison
+                   (default tests/resources/test-image.jpg)
+  DECODE_WORKERS : Threads used to decode/encode members (default CPU count)
+  BACKENDS       : Comma-separated `backend:precision` pairs to compare
+                   (default opencv:fp32,onnxruntime:fp32,onnxruntime:int8,
+                   openvino:fp32,openvino:int8)
+  BACKEND_BATCH_SIZE: Batch size used for the backend comparison (default 16)
+
+Usage (from the `transformers/` directory):
+  python -m tests.local_benchmark.face_detection_benchmark
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import os
+import sys
+import logging
+import tarfile
+import time
+
+MODEL_DIR = os.getenv("MODEL_DIR", "./face_detection/model")
+IMAGE_PATH = os.getenv("IMAGE_PATH", "tests/resources/test-face-detection.png")
+NUM_IMAGES = int(os.getenv("NUM_IMAGES", "256"))
+BATCH_SIZES = [
+    int(bs) for bs in os.getenv("BATCH_SIZES", "1,2,4,8,16,32,64").split(",")
+]
+ITERATIONS = int(os.getenv("ITERATIONS", "3"))
+LARGE_IMAGE_PATH = os.getenv("LARGE_IMAGE_PATH", "tests/resources/test-image.jpg")
+BACKENDS = [
+    tuple(backend.split(":"))
+    for backend in os.getenv(
+        "BACKENDS",
+        "opencv:fp32,onnxruntime:fp32,onnxruntime:int8,openvino:fp32,openvino:int8",
+    ).split(",")
+]
+BACKEND_BATCH_SIZE = int(os.getenv("BACKEND_BATCH_SIZE", "16"))
+
+# The server module instantiates `FaceDetection` on import
+os.environ.setdefault("AIS_TARGET_URL", "http://localhost:8080")
+os.environ["MODEL_DIR"] = MODEL_DIR
+
+# pylint: disable=wrong-import-position
+from face_detection.fastapi_server import FaceDetection, fastapi_server
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)-8s %(name)s: %(message)s",
+    stream=sys.stdout,
+)
+logger = logging.getLogger("face_detection_local")
+
+
+def build_shard(image_bytes: bytes, num_images: int) -> bytes:
+    """
+    Build an in-memory WebDataset-style shard with `num_images` samples.
+
+    Each sample holds the image (`<key>.png`) and a class label (`<key>.cls`).
+    """
+    ext = os.path.splitext(IMAGE_PATH)[1].lower()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for i in range(num_images):
+            for name, data in (
+                (f"sample{i:06d}{ext}", image_bytes),
+                (f"sample{i:06d}.cls", str(i % 10).encode()),
+            ):
+                info = tarfile.TarInfo(name=name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def run_benchmark(server: FaceDetection, shard: bytes, batch_size: int) -> float:
+    """
+    Transform the shard `ITERATIONS` times with the given batch size.
+
+    Returns:
+        Best observed throughput in images per second.
+    """
+    server.batch_size = batch_size
+    server.transform(shard, "warmup.tar", "")
+
+    best = 0.0
+    for _ in range(ITERATIONS):
+        t0 = time.perf_counter()
+        server.transform(shard, "bench.tar", "")
+        elapsed = time.perf_counter() - t0
+        best = max(best, NUM_IMAGES / elapsed)
+    return best
+
+
+def run_format_benchmark(server: FaceDetection, image_bytes: bytes, fmt: str) -> float:
+    """
+    Transform a single image `ITERATIONS` times with the given output format.
+
+    Returns:
+        Best observed throughput in images per second.
+    """
+    server.format = fmt
+    server.transform(image_bytes, "warmup.jpg", "")
+
+    best = 0.0
+    for _ in range(ITERATIONS):
+        t0 = time.perf_counter()
+        server.transform(image_bytes, "bench.jpg", "")
+        best = max(best, 1 / (time.perf_counter() - t0))
+    return best
+
+
+def run_backend_benchmark(shard: bytes, backend: str, precision: str) -> float:
+    """
+    Measure shard throughput with the given inference backend and precision.
+
+    The converted ONNX model is cached in `MODEL_DIR`, so only the first run
+    of an ONNX backend pays for the conversion.
+
+    Returns:
+        Best observed throughput in images per second.
+    """
+    os.environ["INFERENCE_BACKEND"] = backend
+    os.environ["MODEL_PRECISION"] = precision
+    os.environ.setdefault("CALIBRATION_DIR", "./tests/resources")
+    return run_benchmark(FaceDetection(), shard, BACKEND_BATCH_SIZE)
+
+
+def main():
+    """Run the benchmark for every configured batch size and log a summary."""
+    with open(IMAGE_PATH, "rb") as f:
+        image_bytes = f.read()
+    shard = build_shard(image_bytes, NUM_IMAGES)
+    logger.info(
+        "Shard: %d samples, %.1f MiB (image: %s)",
+        NUM_IMAGES,
+        len(shard) / (1 << 20),
+        IMAGE_PATH,
+    )
+
+    results = []
+    for batch_size in BATCH_SIZES:
+        rate = run_benchmark(fastapi_server, shard, batch_size)
+        results.append((batch_size, rate))
+        logger.info("batch_size=%-3d %8.1f images/s", batch_size, rate)
+
+    baseline = results[0][1]
+    logger.info("%-10s | %-12s | %s", "Batch size", "Images/s", "Speedup")
+    for batch_size, rate in results:
+        logger.info("%-10d | %-12.1f | %.2fx", batch_size, rate, rate / baseline)
+
+    with open(LARGE_IMAGE_PATH, "rb") as f:
+        large_image = f.read()
+    annotated = run_format_benchmark(fastapi_server, large_image, "jpg")
+    boxes_only = run_format_benchmark(fastapi_server, large_image, "json")
+    logger.info("Large image: %s", LARGE_IMAGE_PATH)
+    logger.info("%-10s | %-12s | %s", "Format", "Images/s", "Speedup")
+    logger.info("%-10s | %-12.2f | %.2fx", "jpg", annotated, 1.0)
+    logger.info("%-10s | %-12.2f | %.2fx", "json", boxes_only, boxes_only / annotated)
+
+    backend_results = []
+    for backend, precision in BACKENDS:
+        rate = run_backend_benchmark(shard, backend, precision)
+        backend_results.append((f"{backend}:{precision}", rate))
+        logger.info("backend=%s:%s %8.1f images/s", backend, precision, rate)
+
+    baseline = backend_results[0][1]
+    logger.info("%-18s | %-12s | %s", "Backend", "Images/s", "Speedup")
+    for name, rate in backend_results:
+        logger.info("%-18s | %-12.1f | %.2fx", name, rate, rate / baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,189 +1,701 @@
 """
-Local Benchmark for FFmpeg Transformer
+Local Benchmark for the FFmpeg Transformer
 
-Batch-transcode all .flac files in a source AIS bucket to WAV at specified
-channels and sampling rate, uploading results to a destination bucket.
-Uses concurrent workers and logs progress and summary.
+Generates a synthetic audio corpus (tones and noise, in every combination of
+the configured durations, codecs, sample rates and channel counts) and
+transcodes it at several concurrencies with:
+
+  - `script`: one FFmpeg process per object to raw PCM, wrapped in a WAV
+    header in Python (the sequential script of NeMo's Speech Data Processor
+    that the README compares with; formerly `FFmpeg/benchmark.py`)
+  - `inprocess`: `FFmpegServer.transform` called from a thread pool
+  - `inprocess-fqn`: the same, with the objects passed as file paths (direct
+    file access, as with `ETL_DIRECT_FQN=true`)
+  - `http`: the FastAPI server (`FFmpeg/fastapi_server.py`, under uvicorn) in
+    hpull mode, with a local stand-in for the AIS target serving the corpus,
+    so the numbers cover fetch + transform + response without a cluster
+
+The server modes run once per server variant (`SERVER_VARIANTS`): a set of
+server variables overriding the environment, e.g. to compare the audio
+backends (`AUDIO_BACKEND=ffmpeg;AUDIO_BACKEND=soundfile`) or single-process
+and segmented transcoding of long objects
+(`SEGMENT_THRESHOLD=0;SEGMENT_THRESHOLD=1,SEGMENT_WORKERS=4`). In-process
+outputs of each variant are decoded and compared with those of the first
+variant (largest absolute sample difference, `max_sample_diff`). The run fails
+if a variant does not apply its configuration to the WAV/FLAC samples (see
+`check_sample`). WAV and FLAC objects are written by soundfile, so that their
+headers give their length; FFmpeg encodes the other codecs.
+
+For each mode, variant and concurrency, the throughput (objects/s,
+audio-seconds/s), the latency percentiles (p50, p99) and the peak RSS are
+logged and written to a JSON file, so that runs on different commits can be
+compared.
 
 Configuration via environment variables:
-  AIS_ENDPOINT: AIS cluster endpoint URL (default http://localhost:8080)
-  SRC_BUCKET  : Source bucket name (default LibriSpeech)
-  DST_BUCKET  : Destination bucket name (default LibriSpeech-16k)
-  WORKERS     : Number of parallel FFmpeg workers (default 24)
-  AC          : Number of audio channels in output WAV (default 1)
-  AR          : Sample rate in output WAV (default 16000)
+  NUM_OBJECTS  : Objects in the corpus (default 96)
+  DURATIONS    : Comma-separated object durations in seconds (default 2,12,30)
+  CODECS       : Comma-separated input codecs, among wav, flac, mp3 and vorbis
+                 (default flac,wav,mp3)
+  SAMPLE_RATES : Comma-separated input sample rates (default 16000,44100,48000)
+  CHANNELS     : Comma-separated input channel counts (default 1,2)
+  CONCURRENCIES: Comma-separated concurrencies (default 1,4,16)
+  MODES        : Comma-separated modes, among script, inprocess, inprocess-fqn
+                 and http (default script,inprocess,http)
+  SERVER_VARIANTS: Semicolon-separated server variants, each a comma-separated
+                 list of VAR=VALUE (default: one variant, the environment as is)
+  UVICORN_WORKERS: Uvicorn worker processes of the FastAPI server (default 1)
+  OUTPUT       : JSON file the results are written to
+                 (default ffmpeg_benchmark.json)
+  BASELINE     : JSON file of an earlier run to compare the throughput with
+                 (default: none)
+
+The output settings are read from the server's own variables (`AR`, `AC`,
+`CODEC`, `FORMAT`, `STREAMING`, `AUDIO_BACKEND`, ...; default 16 kHz mono
+WAV), and are recorded in the JSON file with each variant's overrides.
+
+Peak RSS:
+  - `script`/`inprocess`/`inprocess-fqn`: this process (FFmpeg processes excluded)
+  - `http`: the uvicorn processes (FFmpeg processes excluded)
+  - The largest FFmpeg process started by this process (corpus encoding,
+    `script` and in-process runs) is recorded once (`ffmpeg_peak_rss_mib`).
+  Peaks are reset between configurations through `/proc/<pid>/clear_refs`
+  (Linux); elsewhere, the peak of this process over the run so far is reported.
 
 Note:
-  - Requires ffmpeg installed and available in PATH.
-  - Assumes source bucket contains .flac files. In our case,
-    we used LibriSpeech Dataset.
-  - Destination bucket is reset before processing.
-  - For best results, run on a machine in same network (VCN) as AIS cluster.
+  - Requires ffmpeg installed and available in PATH (with libmp3lame and
+    libvorbis for the mp3 and vorbis inputs).
+  - Segments only help with idle cores: compare them on a machine with several.
+
+Usage (from the `transformers/` directory):
+  python -m tests.local_benchmark.ffmpeg_benchmark
+
+  # Audio backends on short FLAC utterances
+  CODECS=flac DURATIONS=2,12 SAMPLE_RATES=16000,44100 MODES=inprocess \\
+    SERVER_VARIANTS="AUDIO_BACKEND=ffmpeg;AUDIO_BACKEND=soundfile" \\
+    python -m tests.local_benchmark.ffmpeg_benchmark
+
+  # Segmented transcoding of long recordings
+  CODECS=wav,flac DURATIONS=1800 SAMPLE_RATES=44100 CHANNELS=2 NUM_OBJECTS=4 \\
+    CONCURRENCIES=1 MODES=inprocess,inprocess-fqn \\
+    SERVER_VARIANTS="SEGMENT_THRESHOLD=0;SEGMENT_THRESHOLD=1,SEGMENT_WORKERS=4" \\
+    python -m tests.local_benchmark.ffmpeg_benchmark
 
 Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
 """
 
-# pylint: disable=too-many-locals, broad-exception-caught
+# pylint: disable=consider-using-with
+import io
 import os
 import sys
+import json
 import logging
+import platform
+import resource
+import socket
+import statistics
 import subprocess
+import tempfile
+import threading
 import time
-from datetime import timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Tuple
-
-from aistore import Client
-
-# Configuration
-AIS_ENDPOINT = os.getenv("AIS_ENDPOINT", "http://localhost:8080")
-SRC_BUCKET = os.getenv("SRC_BUCKET", "LibriSpeech")
-DST_BUCKET = os.getenv("DST_BUCKET", "LibriSpeech-16k")
-WORKERS = int(os.getenv("WORKERS", "24"))
-CHANNELS = int(os.getenv("AC", "1"))
-SAMPLE_RATE = int(os.getenv("AR", "16000"))
-
-FFMPEG_CMD = [
-    "ffmpeg",
-    "-nostdin",
-    "-loglevel",
-    "error",
-    "-i",
-    "pipe:0",
-    "-ac",
-    str(CHANNELS),
-    "-ar",
-    str(SAMPLE_RATE),
-    "-c:a",
-    "pcm_s16le",
-    "-f",
-    "wav",
-    "pipe:1",
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import product
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+import numpy as np
+import requests
+import soundfile as sf
+
+
+def _ints(name: str, default: str) -> List[int]:
+    return [int(value) for value in os.getenv(name, default).split(",")]
+
+
+FFMPEG_DIR = Path(__file__).parent.parent.parent / "FFmpeg"
+NUM_OBJECTS = int(os.getenv("NUM_OBJECTS", "96"))
+DURATIONS = [float(d) for d in os.getenv("DURATIONS", "2,12,30").split(",")]
+CODECS = os.getenv("CODECS", "flac,wav,mp3").split(",")
+SAMPLE_RATES = _ints("SAMPLE_RATES", "16000,44100,48000")
+CHANNELS = _ints("CHANNELS", "1,2")
+CONCURRENCIES = _ints("CONCURRENCIES", "1,4,16")
+MODES = os.getenv("MODES", "script,inprocess,http").split(",")
+SERVER_VARIANTS = [
+    dict(item.split("=", 1) for item in variant.split(",") if item)
+    for variant in os.getenv("SERVER_VARIANTS", "").split(";")
 ]
+UVICORN_WORKERS = os.getenv("UVICORN_WORKERS", "1")
+OUTPUT = os.getenv("OUTPUT", "ffmpeg_benchmark.json")
+BASELINE = os.getenv("BASELINE")
+
+# Input codec -> (object extension, FFmpeg encoder arguments; None for the
+# codecs written by soundfile)
+INPUT_CODECS = {
+    "wav": (".wav", None),
+    "flac": (".flac", None),
+    "mp3": (".mp3", ["-c:a", "libmp3lame", "-b:a", "128k", "-f", "mp3"]),
+    "vorbis": (".ogg", ["-c:a", "libvorbis", "-f", "ogg"]),
+}
+
+# Server variables recorded with the results
+SERVER_ENV = (
+    "AR",
+    "AC",
+    "BR",
+    "CODEC",
+    "FORMAT",
+    "AUDIO_FILTERS",
+    "STREAMING",
+    "AUDIO_BACKEND",
+    "SKIP_CONFORMANT",
+    "SEGMENT_THRESHOLD",
+    "SEGMENT_SECONDS",
+    "SEGMENT_WORKERS",
+    "FFMPEG_SLOTS",
+    "FFMPEG_THREADS",
+)
+
+# The server module instantiates `FFmpegServer` on import
+os.environ.setdefault("AIS_TARGET_URL", "http://localhost:8080")
+os.environ.setdefault("AR", "16000")
+os.environ.setdefault("AC", "1")
+os.environ.setdefault("FFMPEG_LOCK_DIR", tempfile.mkdtemp(prefix="ffmpeg-slots-"))
+
+# pylint: disable=wrong-import-position
+from FFmpeg.fastapi_server import FFmpegServer, probe_audio
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(levelname)-8s %(name)s: %(message)s",
     stream=sys.stdout,
 )
-logger = logging.getLogger("ffmpeg_local")
+logger = logging.getLogger("ffmpeg_benchmark")
+
+Corpus = List[Tuple[str, bytes, float]]
+# (mode, variant, concurrency, results)
+Row = Tuple[str, Dict[str, str], int, Dict[str, Optional[float]]]
+
+
+def synth_audio(codec: str, duration: float, samplerate: int, channels: int) -> bytes:
+    """Return `duration` seconds of speech-like audio (tones and noise) as `codec`."""
+    rng = np.random.default_rng(samplerate + channels)
+    t = np.arange(int(duration * samplerate)) / samplerate
+    tone = 0.2 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t))
+    audio = np.stack(
+        [tone + 0.02 * rng.standard_normal(len(t)) for _ in range(channels)], axis=1
+    )
+    encoder = INPUT_CODECS[codec][1]
+    buf = io.BytesIO()
+    # soundfile seeks back to complete the headers: FFmpeg writing to a pipe
+    # cannot, and leaves the length of FLAC objects unset in STREAMINFO, so
+    # that they would neither be segmented nor read by the soundfile backend
+    sf.write(
+        buf,
+        audio,
+        samplerate,
+        format="WAV" if encoder else codec.upper(),
+        subtype="PCM_16",
+    )
+    if encoder is None:
+        return buf.getvalue()
+    return subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0", *encoder]
+        + ["pipe:1"],
+        input=buf.getvalue(),
+        capture_output=True,
+        check=True,
+    ).stdout
+
 
+def _combinations() -> list:
+    return list(product(DURATIONS, CODECS, SAMPLE_RATES, CHANNELS))
 
-def transcode_flac_to_wav(input_bytes: bytes) -> bytes:
+
+def build_corpus() -> Corpus:
+    """Return `NUM_OBJECTS` (name, data, seconds) objects cycling through the combinations."""
+    combos = _combinations()
+    audio = {
+        (duration, codec, samplerate, channels): synth_audio(
+            codec, duration, samplerate, channels
+        )
+        for duration, codec, samplerate, channels in combos
+    }
+    corpus = []
+    for i in range(NUM_OBJECTS):
+        duration, codec, samplerate, channels = combo = combos[i % len(combos)]
+        name = f"obj{i:05d}-{samplerate}-{channels}ch-{duration:g}s"
+        corpus.append((name + INPUT_CODECS[codec][0], audio[combo], duration))
+    return corpus
+
+
+def script_transform(data: bytes, ac: int, ar: int) -> bytes:
     """
-    Transcode FLAC audio bytes to WAV using ffmpeg.
+    Transcode like NeMo's Speech Data Processor: FFmpeg outputs raw 16-bit PCM,
+    which is wrapped in a WAV header in Python.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0"]
+    cmd += ["-map", "0:a", "-ac", str(ac), "-ar", str(ar)]
+    cmd += ["-c:a", "pcm_s16le", "-f", "s16le", "-y", "pipe:1"]
+    raw = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    with io.BytesIO() as wav_io:
+        # pylint: disable=no-member
+        with wave.open(wav_io, "wb") as wav_file:
+            wav_file.setnchannels(ac)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(ar)
+            wav_file.writeframes(raw)
+        return wav_io.getvalue()
 
-    Parameters:
-        input_bytes (bytes): Raw .flac file data.
 
-    Returns:
-        bytes: WAV-encoded audio data.
+def variant_label(variant: Dict[str, str]) -> str:
+    """Return the overrides of a server variant as `VAR=VALUE,...` ("-" if none)."""
+    return ",".join(f"{key}={value}" for key, value in variant.items()) or "-"
 
-    Raises:
-        RuntimeError: If ffmpeg returns a non-zero exit code.
+
+@contextmanager
+def server_env(variant: Dict[str, str]) -> Iterator[None]:
+    """Apply the overrides of a server variant to the environment."""
+    saved = {key: os.environ.get(key) for key in variant}
+    os.environ.update(variant)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def decode_output(data: bytes) -> Optional[np.ndarray]:
+    """Decode a transformed object (None if libsndfile cannot read the format)."""
+    try:
+        return sf.read(io.BytesIO(data), dtype="float64", always_2d=True)[0]
+    except sf.LibsndfileError:
+        return None
+
+
+def max_sample_diff(
+    outputs: List[Optional[np.ndarray]], reference: List[Optional[np.ndarray]]
+) -> Optional[float]:
+    """
+    Return the largest absolute sample difference between two variants' outputs,
+    over the length of the shorter output (None if an output was not decoded).
     """
+    diff = 0.0
+    for out, ref in zip(outputs, reference):
+        if out is None or ref is None or out.shape[1] != ref.shape[1]:
+            return None
+        length = min(len(out), len(ref))
+        if length:
+            diff = max(diff, float(np.max(np.abs(out[:length] - ref[:length]))))
+    return diff
+
+
+def reset_peak_rss(pids: List[int]) -> bool:
+    """Reset the peak RSS of `pids` (Linux); return False if unsupported."""
+    try:
+        for pid in pids:
+            with open(f"/proc/{pid}/clear_refs", "w", encoding="ascii") as f:
+                f.write("5")
+    except OSError:
+        return False
+    return True
 
-    with subprocess.Popen(
-        FFMPEG_CMD,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    ) as proc:
-        out, err = proc.communicate(input=input_bytes)
-        if proc.returncode != 0:
-            msg = err.decode("utf-8", errors="ignore").strip()
-            raise RuntimeError(f"ffmpeg failed: {msg}")
-        return out
-
-
-def process_object(
-    client: Client,
-    src_bucket: str,
-    dst_bucket: str,
-    obj_name: str,
-) -> Tuple[str, bool, str]:
+
+def peak_rss_mib(pids: List[int]) -> float:
+    """Return the summed peak RSS of `pids` in MiB (this process's if no /proc)."""
+    try:
+        total_kib = 0
+        for pid in pids:
+            with open(f"/proc/{pid}/status", encoding="ascii") as f:
+                total_kib += next(
+                    int(line.split()[1]) for line in f if line.startswith("VmHWM:")
+                )
+        return total_kib / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_load(
+    corpus: Corpus,
+    concurrency: int,
+    request: Callable[[str, bytes], object],
+    pids: List[int],
+) -> Dict[str, float]:
     """
-    If `obj_name` ends with .flac, fetch it, transcode it, and upload
-    as a .wav to dst_bucket.  Otherwise skip.
+    Transform the whole corpus with `concurrency` clients calling `request`.
 
     Returns:
-        (obj_name, success_flag, errmsg_or_empty)
+        Throughput, latency percentiles (ms) and peak RSS (MiB).
     """
-    if not obj_name.lower().endswith(".flac"):
-        return obj_name, True, "skipped (not .flac)"
+    request(*corpus[0][:2])  # Warm up
+
+    def client(client_id: int) -> List[float]:
+        latencies = []
+        for name, data, _ in corpus[client_id::concurrency]:
+            t0 = time.perf_counter()
+            request(name, data)
+            latencies.append(time.perf_counter() - t0)
+        return latencies
 
-    bck_src = client.bucket(src_bucket)
-    bck_dst = client.bucket(dst_bucket)
+    reset_peak_rss(pids)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [
+            lat for lats in pool.map(client, range(concurrency)) for lat in lats
+        ]
+    elapsed = time.perf_counter() - t0
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "objects_per_s": len(latencies) / elapsed,
+        "audio_seconds_per_s": sum(seconds for *_, seconds in corpus) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "peak_rss_mib": peak_rss_mib(pids),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_target(corpus: Corpus) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a stand-in AIS target that serves the corpus under `/bench/<name>`."""
+    objects = {f"/bench/{name}": data for name, data, _ in corpus}
+
+    class TargetHandler(BaseHTTPRequestHandler):
+        """Serve the corpus with keep-alive."""
+
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, code="-", size="-"):
+            pass
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Return the object at the request path."""
+            # The ETL server quotes the object path, slashes included
+            data = objects.get(unquote(self.path))
+            if data is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", _free_port()), TargetHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_server(
+    target_url: str, variant: Dict[str, str]
+) -> Tuple[subprocess.Popen, str]:
+    """Start the FastAPI server under uvicorn and wait until it answers `/health`."""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "fastapi_server:fastapi_app"]
+    cmd += ["--host", "127.0.0.1", "--port", str(port)]
+    cmd += ["--workers", UVICORN_WORKERS, "--no-access-log", "--log-level", "warning"]
+    proc = subprocess.Popen(
+        cmd,
+        cwd=FFMPEG_DIR,
+        env={
+            **os.environ,
+            **variant,
+            "AIS_TARGET_URL": target_url,
+            # The server imports the shared `common` package
+            "PYTHONPATH": str(FFMPEG_DIR.parent),
+        },
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("The FastAPI server did not start")
+
+
+def server_pids(proc: subprocess.Popen) -> List[int]:
+    """Return the pids of uvicorn and its worker processes, if any."""
     try:
-        data = bck_src.object(obj_name).get_reader().read_all()
-        wav = transcode_flac_to_wav(data)
-        new_name = obj_name[:-5] + ".wav"
-        bck_dst.object(new_name).get_writer().put_content(wav)
-        return obj_name, True, ""
-    except Exception as e:
-        return obj_name, False, str(e)
+        path = f"/proc/{proc.pid}/task/{proc.pid}/children"
+        with open(path, encoding="ascii") as f:
+            children = [int(pid) for pid in f.read().split()]
+    except OSError:
+        children = []
+    # With several workers, the supervisor forks them (and a resource tracker)
+    return [proc.pid] + (children if int(UVICORN_WORKERS) > 1 else [])
 
 
-def main():
+def benchmark_http(corpus: Corpus, variant: Dict[str, str]) -> List[Row]:
+    """Benchmark the FastAPI server (one variant) over HTTP at each concurrency."""
+    target, target_url = start_target(corpus)
+    proc, url = start_server(target_url, variant)
+    sessions = threading.local()
+
+    def request(name: str, _data: bytes):
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        resp = sessions.session.get(f"{url}/bench/{name}", timeout=600)
+        resp.raise_for_status()
+
+    try:
+        return [
+            ("http", variant, n, run_load(corpus, n, request, server_pids(proc)))
+            for n in CONCURRENCIES
+        ]
+    finally:
+        proc.terminate()
+        proc.wait()
+        target.shutdown()
+
+
+def benchmark_script(corpus: Corpus) -> List[Row]:
+    """Benchmark the NeMo-style script at each concurrency."""
+    ac, ar = int(os.environ["AC"]), int(os.environ["AR"])
+
+    def request(_name: str, data: bytes):
+        script_transform(data, ac, ar)
+
+    return [
+        ("script", {}, n, run_load(corpus, n, request, [os.getpid()]))
+        for n in CONCURRENCIES
+    ]
+
+
+def check_sample(
+    server: FFmpegServer,
+    variant: Dict[str, str],
+    name: str,
+    data: bytes,
+    seconds: float,
+) -> bytes:
     """
-    Main entrypoint: reset destination bucket, list all objects in source, and
-    process them in parallel.
+    Transform a comparison sample and check that the variant handled it as
+    configured: with `AUDIO_BACKEND=soundfile`, WAV/FLAC objects are
+    transcoded in-process (not by FFmpeg), and with `SEGMENT_THRESHOLD`, those
+    long enough are segmented. Otherwise the variant measures the plain FFmpeg
+    path and the comparison is meaningless.
 
-    Exit Codes:
-        0: all succeeded or skipped
-        1: one or more failures occurred
+    Raises:
+        RuntimeError: If a WAV/FLAC object was not handled as configured.
     """
-    t0 = time.perf_counter()
-    client = Client(AIS_ENDPOINT, max_pool_size=100)
-    logger.info("Using AIS endpoint %s", AIS_ENDPOINT)
-
-    # prepare buckets
-    src = client.bucket(SRC_BUCKET)
-    dst = client.bucket(DST_BUCKET)
-    logger.info("Resetting destination bucket %s", DST_BUCKET)
-    dst.delete(missing_ok=True)
-    dst.create(exist_ok=True)
-
-    # list objects
-    objs = [o.name for o in src.list_all_objects()]
-    logger.info("Found %d objects in %s", len(objs), SRC_BUCKET)
-
-    successes: List[str] = []
-    failures: List[Tuple[str, str]] = []
-
-    # parallel processing
-    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-        futures = {
-            executor.submit(process_object, client, SRC_BUCKET, DST_BUCKET, name): name
-            for name in objs
-        }
-        for future in as_completed(futures):
-            name = futures[future]
-            ok, errmsg = False, ""
-            try:
-                _, ok, errmsg = future.result()
-            except Exception as e:
-                errmsg = f"executor error: {e}"
-            if ok:
-                successes.append(name)
-                logger.debug("✅ %s", name)
+    counters = ("soundfile_objects", "segmented_objects", "skipped_objects")
+    before = [getattr(server, counter) for counter in counters]
+    output = server.transform(data, name, "")
+    in_process, segmented, skipped = (
+        getattr(server, counter) - count for counter, count in zip(counters, before)
+    )
+    if probe_audio(data) is None or skipped:
+        return output
+    segments = min(server.segment_workers, int(seconds // server.segment_seconds))
+    if (
+        server.segment_threshold
+        and len(data) >= server.segment_threshold
+        and segments >= 2
+        and not segmented
+    ):
+        raise RuntimeError(f"{variant_label(variant)}: {name} was not segmented")
+    if server.audio_backend == "soundfile" and not (in_process or segmented):
+        raise RuntimeError(
+            f"{variant_label(variant)}: {name} was transcoded by FFmpeg, not by "
+            "the soundfile backend"
+        )
+    return output
+
+
+def benchmark_in_process(corpus: Corpus, mode: str, corpus_dir: str) -> List[Row]:
+    """
+    Benchmark `FFmpegServer.transform` for each server variant at each
+    concurrency, with the objects as bytes or, in `inprocess-fqn` mode, as
+    paths under `corpus_dir`.
+    """
+    fqn = mode == "inprocess-fqn"
+    # One object per input combination for the output comparison
+    samples = corpus[: len(_combinations())]
+    rows, reference = [], None
+    for variant in SERVER_VARIANTS:
+        with server_env(variant):
+            server = FFmpegServer()
+
+        def request(name: str, data: bytes, server=server):
+            server.transform(os.path.join(corpus_dir, name) if fqn else data, name, "")
+
+        outputs = [
+            decode_output(check_sample(server, variant, name, data, seconds))
+            for name, data, seconds in samples
+        ]
+        reference = reference or outputs
+        diff = max_sample_diff(outputs, reference)
+        if server.soundfile_fallbacks:
+            logger.warning("%s: the soundfile backend fell back to FFmpeg", variant)
+        rows += [
+            (
+                mode,
+                variant,
+                n,
+                {
+                    **run_load(corpus, n, request, [os.getpid()]),
+                    "max_sample_diff": diff,
+                },
+            )
+            for n in CONCURRENCIES
+        ]
+    return rows
+
+
+def write_corpus(corpus: Corpus, corpus_dir: str):
+    """Write the corpus objects as files under `corpus_dir` (for `inprocess-fqn`)."""
+    for name, data, _ in corpus:
+        Path(corpus_dir, name).write_bytes(data)
+
+
+def run_metadata(corpus: Corpus) -> dict:
+    """Return the commit, host, FFmpeg version, settings and corpus of this run."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=FFMPEG_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    ffmpeg_version = subprocess.run(
+        ["ffmpeg", "-version"], capture_output=True, check=True, text=True
+    ).stdout.splitlines()[0]
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "ffmpeg": ffmpeg_version,
+        },
+        "settings": {key: os.environ[key] for key in SERVER_ENV if key in os.environ},
+        "uvicorn_workers": int(UVICORN_WORKERS),
+        "corpus": {
+            "objects": len(corpus),
+            "bytes": sum(len(data) for _, data, _ in corpus),
+            "audio_seconds": sum(seconds for *_, seconds in corpus),
+            "durations": DURATIONS,
+            "codecs": CODECS,
+            "sample_rates": SAMPLE_RATES,
+            "channels": CHANNELS,
+        },
+    }
+
+
+def load_baseline(path: Optional[str]) -> Dict[Tuple[str, str, int], float]:
+    """Return the objects/s of an earlier run by (mode, variant label, concurrency)."""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        results = json.load(f)["results"]
+    return {
+        (r["mode"], variant_label(r.get("variant", {})), r["concurrency"]): r[
+            "objects_per_s"
+        ]
+        for r in results
+    }
+
+
+def main():
+    """Benchmark the configured modes, log a summary and write the JSON results."""
+    corpus = build_corpus()
+    metadata = run_metadata(corpus)
+    logger.info(
+        "Corpus: %d objects, %.1f MiB, %.0f audio-seconds; output settings: %s",
+        len(corpus),
+        metadata["corpus"]["bytes"] / (1 << 20),
+        metadata["corpus"]["audio_seconds"],
+        metadata["settings"],
+    )
+
+    rows = []
+    # Read before the uvicorn process exits, which would count as a child
+    ffmpeg_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    with tempfile.TemporaryDirectory(prefix="ffmpeg-corpus-") as corpus_dir:
+        if "inprocess-fqn" in MODES:
+            write_corpus(corpus, corpus_dir)
+        for mode in MODES:
+            if mode == "http":
+                for variant in SERVER_VARIANTS:
+                    rows += benchmark_http(corpus, variant)
             else:
-                failures.append((name, errmsg))
-                logger.error("❌ %s → %s", name, errmsg)
+                if mode == "script":
+                    rows += benchmark_script(corpus)
+                else:
+                    rows += benchmark_in_process(corpus, mode, corpus_dir)
+                ffmpeg_rss = max(
+                    ffmpeg_rss,
+                    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+                )
+            logger.info("%s: done", mode)
 
-    # summary
+    baseline = load_baseline(BASELINE)
     logger.info(
-        "Done: %d succeeded, %d failed, %d skipped",
-        len(successes),
-        len(failures),
-        len(objs) - len(successes) - len(failures),
+        "%-13s | %-38s | %-5s | %-9s | %-11s | %-8s | %-8s | %-8s | %s",
+        "Mode",
+        "Variant",
+        "Conc.",
+        "Objects/s",
+        "Audio-s/s",
+        "p50 ms",
+        "p99 ms",
+        "RSS MiB",
+        "vs baseline",
     )
-    if failures:
-        logger.warning("Failures for %d files. See logs above.", len(failures))
-        sys.exit(1)
-    t1 = time.perf_counter()
-    elapsed = timedelta(seconds=t1 - t0)
-    logger.info("Total transformation wall-time: %s", str(elapsed))
+    for mode, variant, concurrency, res in rows:
+        label = variant_label(variant)
+        before = baseline.get((mode, label, concurrency))
+        logger.info(
+            "%-13s | %-38s | %-5d | %-9.1f | %-11.1f | %-8.1f | %-8.1f | %-8.0f | %s",
+            mode,
+            label,
+            concurrency,
+            res["objects_per_s"],
+            res["audio_seconds_per_s"],
+            res["p50_ms"],
+            res["p99_ms"],
+            res["peak_rss_mib"],
+            f"{res['objects_per_s'] / before:.2f}x" if before else "-",
+        )
+
+    with open(OUTPUT, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                **metadata,
+                "ffmpeg_peak_rss_mib": ffmpeg_rss,
+                "results": [
+                    {
+                        "mode": mode,
+                        "variant": variant,
+                        "concurrency": concurrency,
+                        **res,
+                    }
+                    for mode, variant, concurrency, res in rows
+                ],
+            },
+            f,
+            indent=2,
+        )
+    logger.info("Results written to %s", OUTPUT)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+"""
+Local Benchmark for Keras Preprocessing Transformer
+
+Builds a synthetic WebDataset shard (one image + one `.cls` member per sample)
+and compares in-process throughput of the per-image loop
+(decode -> `apply_transform` -> encode, one image at a time) with the batched
+shard path of `KerasPreprocessServer.transform` (vectorized affine transforms
+per batch, parallel decode/encode) for several values of `BATCH_SIZE`, for
+each augmentation backend (`AUGMENT_BACKEND`). Also reports the startup time
+and peak RSS of a server process (module import and initialization) per
+backend.
+
+Configuration via environment variables:
+  IMAGE_PATH  : Image replicated into the shard
+                (default tests/resources/test-face-detection.png)
+  NUM_IMAGES  : Number of samples in the shard (default 128)
+  BATCH_SIZES : Comma-separated batch sizes to compare (default 1,8,32,64)
+  ITERATIONS  : Timed runs per configuration (default 3)
+  TRANSFORM   : ImageDataGenerator parameters
+                (default rotation, shifts, shear, zoom and horizontal flip)
+  FORMAT      : Output format (default JPEG)
+  WORKERS     : Threads decoding/encoding shard members (default CPU count)
+  BACKENDS    : Comma-separated augmentation backends to compare
+                (default numpy,tensorflow)
+
+Usage (from the `transformers/` directory):
+  python -m tests.local_benchmark.keras_benchmark
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import os
+import sys
+import json
+import logging
+import subprocess
+import tarfile
+import time
+
+IMAGE_PATH = os.getenv("IMAGE_PATH", "tests/resources/test-face-detection.png")
+NUM_IMAGES = int(os.getenv("NUM_IMAGES", "128"))
+BATCH_SIZES = [int(bs) for bs in os.getenv("BATCH_SIZES", "1,8,32,64").split(",")]
+ITERATIONS = int(os.getenv("ITERATIONS", "3"))
+BACKENDS = os.getenv("BACKENDS", "numpy,tensorflow").split(",")
+
+# Run in a fresh interpreter: time and peak RSS of importing (and thereby
+# initializing) the server module
+STARTUP_SCRIPT = """
+import json, resource, time
+start = time.monotonic()
+import keras_preprocess.fastapi_server
+print(json.dumps({
+    "seconds": time.monotonic() - start,
+    "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+}))
+"""
+
+# The server module instantiates `KerasPreprocessServer` on import
+os.environ.setdefault("AIS_TARGET_URL", "http://localhost:8080")
+os.environ.setdefault(
+    "TRANSFORM",
+    json.dumps(
+        {
+            "rotation_range": 40,
+            "width_shift_range": 0.2,
+            "height_shift_range": 0.2,
+            "shear_range": 0.2,
+            "zoom_range": 0.2,
+            "horizontal_flip": True,
+        }
+    ),
+)
+os.environ.setdefault("FORMAT", "JPEG")
+
+# pylint: disable=wrong-import-position
+from keras_preprocess.fastapi_server import KerasPreprocessServer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)-8s %(name)s: %(message)s",
+    stream=sys.stdout,
+)
+logger = logging.getLogger("keras_local")
+
+
+def build_shard(image_bytes: bytes, num_images: int) -> bytes:
+    """Build an in-memory WebDataset-style shard with `num_images` samples."""
+    ext = os.path.splitext(IMAGE_PATH)[1].lower()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for i in range(num_images):
+            for name, data in (
+                (f"sample{i:06d}{ext}", image_bytes),
+                (f"sample{i:06d}.cls", str(i % 10).encode()),
+            ):
+                info = tarfile.TarInfo(name=name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def best_rate(run) -> float:
+    """Run `run` once to warm up, then `ITERATIONS` times; return the best images/s."""
+    run()
+    best = 0.0
+    for _ in range(ITERATIONS):
+        t0 = time.perf_counter()
+        run()
+        best = max(best, NUM_IMAGES / (time.perf_counter() - t0))
+    return best
+
+
+def measure_startup(backend: str) -> dict:
+    """Return the startup time and peak RSS of a server process with `backend`."""
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        env={**os.environ, "AUGMENT_BACKEND": backend},
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark_backend(backend: str, image_bytes: bytes, shard: bytes) -> list:
+    """Compare the per-image loop with the batched shard path for `backend`."""
+    os.environ["AUGMENT_BACKEND"] = backend
+    server = KerasPreprocessServer()
+    results = [
+        (
+            f"{backend} per-image",
+            best_rate(
+                lambda: [
+                    server._augment(  # pylint: disable=protected-access
+                        image_bytes, server.datagen, None, server.format
+                    )
+                    for _ in range(NUM_IMAGES)
+                ]
+            ),
+        )
+    ]
+    logger.info("%s %8.1f images/s", *results[0])
+
+    for batch_size in BATCH_SIZES:
+        server.batch_size = batch_size
+        rate = best_rate(lambda: server.transform(shard, "bench.tar", ""))
+        results.append((f"{backend} batch={batch_size}", rate))
+        logger.info("%s %8.1f images/s", *results[-1])
+    return results
+
+
+def main():
+    """Compare startup cost and throughput of the augmentation backends."""
+    startup = [(backend, measure_startup(backend)) for backend in BACKENDS]
+    logger.info("%-12s | %-12s | %s", "Backend", "Startup (s)", "Peak RSS (MiB)")
+    for backend, stats in startup:
+        logger.info(
+            "%-12s | %-12.2f | %.0f",
+            backend,
+            stats["seconds"],
+            stats["rss"] / (1 << 20),
+        )
+
+    with open(IMAGE_PATH, "rb") as f:
+        image_bytes = f.read()
+    shard = build_shard(image_bytes, NUM_IMAGES)
+    logger.info(
+        "Shard: %d samples, %.1f MiB (image: %s)",
+        NUM_IMAGES,
+        len(shard) / (1 << 20),
+        IMAGE_PATH,
+    )
+
+    results = []
+    for backend in BACKENDS:
+        results += benchmark_backend(backend, image_bytes, shard)
+
+    baseline = results[0][1]
+    logger.info("%-22s | %-12s | %s", "Mode", "Images/s", "Speedup")
+    for name, rate in results:
+        logger.info("%-22s | %-12.1f | %.2fx", name, rate, rate / baseline)
+
+
+if __name__ == "__main__":
+    main()
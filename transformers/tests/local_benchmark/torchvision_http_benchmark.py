@@ -0,0 +1,196 @@
+"""
+Local Benchmark for the Torchvision Transformer Web Servers
+
+Compares request throughput of the http-multithreaded-server
+(`torchvision_preprocess/http-multithreaded-server/server.py`) with the
+FastAPI server (`torchvision_preprocess/fastapi_server.py`, under uvicorn)
+in hpull mode. A local stand-in for the AIS target serves the same image for
+every object path, so the numbers cover fetch + transform + response without
+a cluster.
+
+Each server is started as a subprocess; concurrent clients (one keep-alive
+session each) then issue GET requests and the throughput and latency
+percentiles are logged.
+
+Configuration via environment variables:
+  IMAGE_PATH  : Image served by the stand-in target
+                (default tests/resources/test-face-detection.png)
+  TRANSFORM   : Transform pipeline
+                (default {"Resize": {"size": [224, 224]}})
+  FORMAT      : Output format (default JPEG)
+  NUM_REQUESTS: Requests per server (default 960)
+  CONCURRENCY : Concurrent clients (default 16)
+  WORKERS     : Worker threads of the http-multithreaded-server
+                (default: server default)
+  UVICORN_WORKERS: Uvicorn worker processes of the FastAPI server (default 1)
+
+Usage (from the `transformers/` directory):
+  python -m tests.local_benchmark.torchvision_http_benchmark
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+# pylint: disable=consider-using-with
+import os
+import sys
+import json
+import logging
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import requests
+
+TORCHVISION_DIR = Path(__file__).parent.parent.parent / "torchvision_preprocess"
+IMAGE_PATH = os.getenv("IMAGE_PATH", "tests/resources/test-face-detection.png")
+TRANSFORM = os.getenv("TRANSFORM", json.dumps({"Resize": {"size": [224, 224]}}))
+FORMAT = os.getenv("FORMAT", "JPEG")
+NUM_REQUESTS = int(os.getenv("NUM_REQUESTS", "960"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "16"))
+WORKERS = os.getenv("WORKERS")
+UVICORN_WORKERS = os.getenv("UVICORN_WORKERS", "1")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)-8s %(name)s: %(message)s",
+    stream=sys.stdout,
+)
+logger = logging.getLogger("torchvision_http_benchmark")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_target(image_bytes: bytes) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a stand-in AIS target that serves `image_bytes` for every GET."""
+
+    class TargetHandler(BaseHTTPRequestHandler):
+        """Serve the image with keep-alive."""
+
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, code="-", size="-"):
+            pass
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Return the image for any object path."""
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(image_bytes)))
+            self.end_headers()
+            self.wfile.write(image_bytes)
+
+    server = ThreadingHTTPServer(("127.0.0.1", _free_port()), TargetHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_server(name: str, target_url: str) -> Tuple[subprocess.Popen, str]:
+    """Start one of the web servers and wait until it answers `/health`."""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "AIS_TARGET_URL": target_url,
+        "TRANSFORM": TRANSFORM,
+        "FORMAT": FORMAT,
+    }
+    if name == "http-multithreaded-server":
+        if WORKERS:
+            env["WORKERS"] = WORKERS
+        cmd = [sys.executable, "server.py", "--listen", "127.0.0.1"]
+        cmd += ["--port", str(port)]
+        cwd = TORCHVISION_DIR / "http-multithreaded-server"
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "fastapi_server:fastapi_app"]
+        cmd += ["--host", "127.0.0.1", "--port", str(port)]
+        cmd += ["--workers", UVICORN_WORKERS, "--no-access-log"]
+        cmd += ["--log-level", "warning"]
+        cwd = TORCHVISION_DIR
+        # The server imports the shared `common` package
+        env["PYTHONPATH"] = str(TORCHVISION_DIR.parent)
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{name} did not start")
+
+
+def run_load(url: str) -> Dict[str, float]:
+    """
+    Issue `NUM_REQUESTS` GETs from `CONCURRENCY` clients with keep-alive sessions.
+
+    Returns:
+        Throughput (requests/s) and latency percentiles (ms).
+    """
+    per_client = NUM_REQUESTS // CONCURRENCY
+
+    def client(client_id: int) -> List[float]:
+        latencies = []
+        with requests.Session() as session:
+            for i in range(per_client):
+                t0 = time.perf_counter()
+                resp = session.get(f"{url}/bench/obj-{client_id}-{i}.jpg", timeout=60)
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+        return latencies
+
+    client(-1)  # Warm up
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        latencies = [
+            lat for lats in pool.map(client, range(CONCURRENCY)) for lat in lats
+        ]
+    elapsed = time.perf_counter() - t0
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": quantiles[49] * 1000,
+        "p99": quantiles[98] * 1000,
+    }
+
+
+def main():
+    """Benchmark both servers and log a summary."""
+    with open(IMAGE_PATH, "rb") as f:
+        target, target_url = start_target(f.read())
+    logger.info(
+        "Image: %s, %d requests, %d clients", IMAGE_PATH, NUM_REQUESTS, CONCURRENCY
+    )
+
+    results = []
+    try:
+        for name in ("http-multithreaded-server", "fastapi"):
+            proc, url = start_server(name, target_url)
+            try:
+                results.append((name, run_load(url)))
+                logger.info("%s: %.1f req/s", name, results[-1][1]["rps"])
+            finally:
+                proc.terminate()
+                proc.wait()
+    finally:
+        target.shutdown()
+
+    logger.info("%-26s | %-8s | %-8s | %s", "Server", "Req/s", "p50 ms", "p99 ms")
+    for name, res in results:
+        logger.info(
+            "%-26s | %-8.1f | %-8.1f | %.1f", name, res["rps"], res["p50"], res["p99"]
+        )
+
+
+if __name__ == "__main__":
+    main()
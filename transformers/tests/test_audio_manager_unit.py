@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the Audio Manager ETL Transformer (FastAPI).
+
+Runs the AudioManagerServer in-process with the slice fetch (an SDK GET through
+the Audio Splitter ETL) replaced by a local stub, and checks that slices are
+fetched concurrently but written in manifest order, with a bounded number in
+flight.
+
+Copyright (c) 2025-2026, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import unittest
+
+# Set environment variables before importing the server
+os.environ["AIS_TARGET_URL"] = "http://localhost:8080"
+os.environ["AIS_ENDPOINT"] = "http://localhost:8080"
+os.environ["SRC_BUCKET"] = "audio"
+os.environ["ETL_NAME"] = "audio-splitter"
+os.environ["MAX_POOL_SIZE"] = "4"
+
+# pylint: disable=wrong-import-position
+from NeMo.audio_split_consolidate.audio_manager.fastapi_server import (
+    AudioManagerServer,
+)
+
+NUM_LINES = 20
+
+
+def _manifest(num_lines: int) -> bytes:
+    """Return a JSONL manifest with an invalid line in the middle."""
+    lines = [
+        json.dumps({"id": f"obj{i}", "part": i, "from_time": 0, "to_time": 1})
+        for i in range(num_lines)
+    ]
+    lines.insert(num_lines // 2, "not json")
+    return "\n".join(lines).encode()
+
+
+class TestAudioManagerServer(unittest.TestCase):
+    """Test cases for concurrent, order-preserving slice fetching."""
+
+    def setUp(self):
+        """Set up a server whose fetches take longer for earlier lines."""
+        self.server = AudioManagerServer()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.running = 0
+        self.max_running = 0
+
+        def fetch(record):
+            with self.lock:
+                self.started += 1
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            try:
+                # Complete out of manifest order
+                time.sleep(0.002 * (NUM_LINES - record["part"]))
+                if record["part"] == 7:
+                    raise RuntimeError("ETL request failed")
+                return f"audio {record['id']}".encode() * 2000
+            finally:
+                with self.lock:
+                    self.running -= 1
+
+        # pylint: disable-next=protected-access
+        self.server._fetch_transformed_audio = fetch
+
+    def test_manifest_order(self):
+        """Slices are written in manifest order; invalid and failed lines are skipped."""
+        output = b"".join(
+            self.server.transform_stream(io.BytesIO(_manifest(NUM_LINES)), "m", "")
+        )
+        with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+            members = [(m.name, tar.extractfile(m).read()) for m in tar]
+        expected = [i for i in range(NUM_LINES) if i != 7]
+        self.assertEqual(
+            [name for name, _ in members], [f"obj{i}_{i}.wav" for i in expected]
+        )
+        for i, (_, data) in zip(expected, members):
+            self.assertEqual(data, f"audio obj{i}".encode() * 2000)
+        self.assertGreater(self.max_running, 1)
+        self.assertLessEqual(self.max_running, self.server.max_pool_size)
+
+    def test_bounded_in_flight(self):
+        """The archive streams before the whole manifest has been fetched."""
+        chunks = self.server.transform_stream(io.BytesIO(_manifest(NUM_LINES)), "m", "")
+        next(chunks)
+        self.assertLessEqual(self.started, self.server.max_pool_size)
+        chunks.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,17 +6,20 @@ Tests face detection functionality in both single image and tar/webdataset modes
 Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
 """
 
+import json
 import logging
 import cv2
 import numpy as np
 import io
 import tarfile
+from itertools import product
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Tuple
 
 import pytest
 import webdataset as wds
 from aistore.sdk.etl import ETLConfig
+from aistore.sdk.etl.etl_const import ETL_COMM_HPULL, ETL_COMM_HPUSH
 from aistore.sdk import Bucket
 
 from tests.const import FASTAPI_PARAM_COMBINATIONS
@@ -148,6 +151,47 @@ def _verify_tar_face_detection(
             assert has_green, f"No face detection markers found in {member.name}"
 
 
+def _build_test_tar(num_samples: int) -> Tuple[bytes, List[str]]:
+    """
+    Build a WebDataset-style tar with `num_samples` (`.png` + `.cls`) samples.
+
+    Returns:
+        The tar bytes and the member names in archive order.
+    """
+    image_path = Path(__file__).parent / "resources" / "test-face-detection.png"
+    image_bytes = image_path.read_bytes()
+
+    member_names = []
+    tar_stream = io.BytesIO()
+    with tarfile.open(fileobj=tar_stream, mode="w") as tar:
+        for idx in range(num_samples):
+            for name, data in (
+                (f"face{idx}.png", image_bytes),
+                (f"face{idx}.cls", str(idx).encode()),
+            ):
+                tarinfo = tarfile.TarInfo(name=name)
+                tarinfo.size = len(data)
+                tar.addfile(tarinfo, io.BytesIO(data))
+                member_names.append(name)
+    return tar_stream.getvalue(), member_names
+
+
+def _verify_tar_member_order(
+    test_bck: Bucket,
+    tar_filename: str,
+    etl_name: str,
+    member_names: List[str],
+) -> None:
+    """
+    Verify that the transformed tar preserves member order and passes
+    non-image members through unchanged.
+    """
+    reader = test_bck.object(tar_filename).get_reader(etl=ETLConfig(etl_name))
+    with tarfile.open(fileobj=io.BytesIO(reader.read_all()), mode="r:*") as tar:
+        assert [m.name for m in tar.getmembers()] == member_names
+        assert tar.extractfile("face1.cls").read() == b"1"
+
+
 @pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
 @pytest.mark.parametrize("output_format", ["jpg", "png"])
 def test_face_detection(
@@ -198,20 +242,11 @@ def test_face_detection_tar_runtime(
     Validate the Face Detection ETL transformer in tar/webdataset mode.
     Creates the input tar file at runtime using a test image.
     """
-    image_path = Path(__file__).parent / "resources" / "test-face-detection.png"
-    with open(image_path, "rb") as f:
-        image_bytes = f.read()
-
-    tar_stream = io.BytesIO()
-    with tarfile.open(fileobj=tar_stream, mode="w") as tar:
-        tarinfo = tarfile.TarInfo(name="face.png")
-        tarinfo.size = len(image_bytes)
-        tar.addfile(tarinfo, io.BytesIO(image_bytes))
-    tar_stream.seek(0)
-
+    # Three samples with BATCH_SIZE=2 exercise both a full and a partial batch
+    tar_bytes, member_names = _build_test_tar(num_samples=3)
     tar_object_name = "test-face-detection.tar"
 
-    test_bck.object(tar_object_name).get_writer().put_content(tar_stream.getvalue())
+    test_bck.object(tar_object_name).get_writer().put_content(tar_bytes)
 
     etl_name = etl_factory(
         tag="face-detection",
@@ -220,6 +255,7 @@ def test_face_detection_tar_runtime(
         arg_type="fqn" if use_fqn else "",
         direct_put=True,
         format=output_format,
+        BATCH_SIZE="2",
     )
 
     _verify_tar_face_detection(
@@ -228,3 +264,170 @@ def test_face_detection_tar_runtime(
         etl_name,
         output_format,
     )
+
+    _verify_tar_member_order(test_bck, tar_object_name, etl_name, member_names)
+
+
+@pytest.mark.parametrize(
+    "comm_type, use_fqn", list(product([ETL_COMM_HPULL, ETL_COMM_HPUSH], [True, False]))
+)
+def test_face_detection_tar_streaming(
+    test_bck: Bucket,
+    etl_factory,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate the Face Detection ETL transformer in streaming mode (`STREAMING=true`).
+    WebSocket communication does not support `transform_stream`, so it is not covered.
+    """
+    tar_bytes, member_names = _build_test_tar(num_samples=3)
+    tar_object_name = "test-face-detection-stream.tar"
+    test_bck.object(tar_object_name).get_writer().put_content(tar_bytes)
+
+    etl_name = etl_factory(
+        tag="face-detection",
+        server_type="fastapi",
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        BATCH_SIZE="2",
+        STREAMING="true",
+    )
+
+    _verify_tar_face_detection(test_bck, tar_object_name, etl_name, "png")
+    _verify_tar_member_order(test_bck, tar_object_name, etl_name, member_names)
+
+
+@pytest.mark.parametrize(
+    "comm_type, use_fqn",
+    list(product([ETL_COMM_HPULL, ETL_COMM_HPUSH], [True, False])),
+)
+def test_face_detection_micro_batching(
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate cross-request micro-batching (`BATCH_WAIT_MS`), which applies to
+    streaming requests (`STREAMING=true`, not supported with WebSocket).
+    """
+    _upload_test_files(test_bck, local_files)
+
+    etl_name = etl_factory(
+        tag="face-detection",
+        server_type="fastapi",
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        BATCH_SIZE="8",
+        BATCH_WAIT_MS="5",
+        STREAMING="true",
+    )
+
+    _verify_face_detection(test_bck, local_files, etl_name)
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_face_detection_json_output(
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate the detection-only output (`FORMAT=json`).
+    Boxes must be reported in pixel coordinates of the original image.
+    """
+    # test-image.jpg (6000x4000, no faces above the threshold) exercises the
+    # reduced-scale decode, test-face-detection.png the reported boxes
+    image_files = {
+        **local_files,
+        "test-face-detection.png": Path(__file__).parent
+        / "resources"
+        / "test-face-detection.png",
+    }
+    _upload_test_files(test_bck, image_files)
+
+    etl_name = etl_factory(
+        tag="face-detection",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="json",
+    )
+
+    for file_name in ("test-image.jpg", "test-face-detection.png"):
+        image_path = image_files[file_name]
+        height, width = cv2.imread(str(image_path), cv2.IMREAD_UNCHANGED).shape[:2]
+
+        reader = test_bck.object(file_name).get_reader(etl=ETLConfig(etl_name))
+        result = json.loads(reader.read_all())
+
+        assert (result["width"], result["height"]) == (width, height)
+        for face in result["faces"]:
+            x_1, y_1, x_2, y_2 = face["box"]
+            assert 0 <= x_1 < x_2 <= width and 0 <= y_1 < y_2 <= height
+            assert face["confidence"] > 0.6
+
+    assert result["faces"], "No faces detected in test-face-detection.png"
+
+
+@pytest.mark.parametrize(
+    "server_type, comm_type, use_fqn",
+    list(product(["fastapi"], [ETL_COMM_HPULL], [True, False])),
+)
+def test_face_detection_tar_metadata_output(
+    test_bck: Bucket,
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Select the output format per request via etl_args: NDJSON boxes (`json`)
+    and face crops (`crops`) for every image member of a tar archive.
+    """
+    tar_data, member_names = _build_test_tar(num_samples=3)
+    test_bck.object("faces.tar").get_writer().put_content(tar_data)
+    image_names = [name for name in member_names if name.endswith(".png")]
+
+    etl_name = etl_factory(
+        tag="face-detection",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="png",
+    )
+
+    reader = test_bck.object("faces.tar").get_reader(
+        etl=ETLConfig(etl_name, args=json.dumps({"format": "json"}))
+    )
+    lines = reader.read_all().decode().splitlines()
+    results = [json.loads(line) for line in lines]
+    assert [result["name"] for result in results] == image_names
+    assert all(result["faces"] for result in results)
+
+    reader = test_bck.object("faces.tar").get_reader(
+        etl=ETLConfig(etl_name, args=json.dumps({"format": "crops"}))
+    )
+    with tarfile.open(fileobj=io.BytesIO(reader.read_all()), mode="r") as tar:
+        names = tar.getnames()
+        for name in names:
+            if name.endswith(".png"):
+                crop = cv2.imdecode(
+                    np.frombuffer(tar.extractfile(name).read(), np.uint8),
+                    cv2.IMREAD_UNCHANGED,
+                )
+                assert crop is not None and crop.size > 0
+    for name in image_names:
+        assert f"{name[:-len('.png')]}_0.png" in names
+    assert [name for name in names if not name.endswith(".png")] == [
+        name for name in member_names if not name.endswith(".png")
+    ]
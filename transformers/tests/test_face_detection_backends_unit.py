@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""
+Accuracy-equivalence tests for the Face Detection inference backends.
+
+Runs the bundled sample images through every `INFERENCE_BACKEND` (ONNX
+Runtime and OpenVINO, FP32 and INT8) and compares the detected faces with the
+reference OpenCV DNN backend running the original Caffe model.
+
+Requires the model files (`architecture.txt`, `weights.caffemodel`) in
+`FACE_DETECTION_MODEL_DIR` (default: face_detection/model); tests for backends
+whose runtime is not installed are skipped.
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+from typing import Dict, List
+
+FACE_DETECTION_DIR = Path(__file__).parent.parent / "face_detection"
+MODEL_DIR = os.getenv("FACE_DETECTION_MODEL_DIR", str(FACE_DETECTION_DIR / "model"))
+SAMPLE_IMAGES = sorted((FACE_DETECTION_DIR / "sample").glob("*.png")) + [
+    Path(__file__).parent / "resources" / "test-face-detection.png"
+]
+
+if not os.path.exists(os.path.join(MODEL_DIR, "weights.caffemodel")):
+    raise unittest.SkipTest(f"Face detection model not found in {MODEL_DIR}")
+
+# Set environment variables before importing the server
+os.environ["AIS_TARGET_URL"] = "http://localhost:8080"
+os.environ["MODEL_DIR"] = MODEL_DIR
+# Unannotated test images (the sample image has boxes drawn on it)
+os.environ["CALIBRATION_DIR"] = str(Path(__file__).parent / "resources")
+
+# pylint: disable=wrong-import-position
+from face_detection.fastapi_server import FaceDetection
+
+
+def _iou(box_a: List[int], box_b: List[int]) -> float:
+    """Intersection over union of two `[x_1, y_1, x_2, y_2]` boxes."""
+    width = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    height = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    intersection = max(0, width) * max(0, height)
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    return intersection / float(area_a + area_b - intersection)
+
+
+class TestFaceDetectionBackends(unittest.TestCase):
+    """Compare every inference backend against the OpenCV reference."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.reference = cls._detect_faces("opencv", "fp32")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    @classmethod
+    def _detect_faces(cls, backend: str, precision: str) -> Dict[str, List[Dict]]:
+        """Detect faces in the sample images with the given backend."""
+        os.environ["INFERENCE_BACKEND"] = backend
+        os.environ["MODEL_PRECISION"] = precision
+        os.environ["MODEL_CACHE_DIR"] = cls.cache_dir
+        server = FaceDetection()
+        return {
+            path.name: json.loads(
+                server.transform(path.read_bytes(), path.name, '{"format": "json"}')
+            )["faces"]
+            for path in SAMPLE_IMAGES
+        }
+
+    def _assert_equivalent(
+        self,
+        backend: str,
+        precision: str,
+        min_iou: float,
+        max_confidence_delta: float,
+    ):
+        """
+        Every reference face must be matched by a face of the backend.
+
+        Faces whose reference confidence is within `max_confidence_delta` of
+        the detection threshold may legitimately cross it, so they are allowed
+        to be missing (and extra faces are allowed in that margin).
+        """
+        results = self._detect_faces(backend, precision)
+        margin = 0.6 + max_confidence_delta
+        for name, reference_faces in self.reference.items():
+            faces = results[name]
+            for ref in reference_faces:
+                matches = [
+                    face
+                    for face in faces
+                    if _iou(face["box"], ref["box"]) >= min_iou
+                    and abs(face["confidence"] - ref["confidence"])
+                    <= max_confidence_delta
+                ]
+                if ref["confidence"] >= margin:
+                    self.assertTrue(matches, f"{backend}/{precision}: {name} {ref}")
+            strong_faces = [face for face in faces if face["confidence"] >= margin]
+            self.assertLessEqual(len(strong_faces), len(reference_faces), name)
+
+    def _skip_if_missing(self, *modules: str):
+        for module in modules:
+            if importlib.util.find_spec(module) is None:
+                self.skipTest(f"{module} is not installed")
+
+    def test_onnxruntime_fp32(self):
+        """The converted FP32 model matches the Caffe model."""
+        self._skip_if_missing("onnx", "onnxruntime")
+        self._assert_equivalent("onnxruntime", "fp32", 0.98, 0.01)
+
+    def test_openvino_fp32(self):
+        """OpenVINO running the converted FP32 model matches the Caffe model."""
+        self._skip_if_missing("onnx", "openvino")
+        self._assert_equivalent("openvino", "fp32", 0.98, 0.01)
+
+    def test_onnxruntime_int8(self):
+        """The INT8 model finds the same faces, with small box/confidence drift."""
+        self._skip_if_missing("onnx", "onnxruntime")
+        self._assert_equivalent("onnxruntime", "int8", 0.85, 0.15)
+
+    def test_openvino_int8(self):
+        """OpenVINO running the INT8 model finds the same faces."""
+        self._skip_if_missing("onnx", "onnxruntime", "openvino")
+        self._assert_equivalent("openvino", "int8", 0.85, 0.15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the Face Detection ETL Transformer (FastAPI).
+
+Runs the FaceDetection server in-process with a stub inference backend (no
+model files needed) and checks that concurrent single-image requests are
+batched across requests (`BATCH_WAIT_MS`) in streaming mode, and that every
+response reports the MIME type of its own output format.
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Set environment variables before importing the server
+os.environ["AIS_TARGET_URL"] = "http://localhost:8080"
+
+# The module instantiates `FaceDetection` on import, which loads the model
+with mock.patch("cv2.dnn.readNetFromCaffe"):
+    # pylint: disable-next=wrong-import-position
+    import face_detection.fastapi_server as server_module
+
+IMAGE_PATH = Path(__file__).parent / "resources" / "test-face-detection.png"
+NUM_REQUESTS = 8
+
+
+class _StubBackend:  # pylint: disable=too-few-public-methods
+    """Reports one face per image, slowly enough for requests to queue up."""
+
+    def __init__(self):
+        self.batch_sizes = []
+        self._lock = threading.Lock()
+
+    def forward(self, blob: np.ndarray) -> np.ndarray:
+        """Return one `DetectionOutput` row per image of the batch."""
+        with self._lock:
+            self.batch_sizes.append(len(blob))
+        threading.Event().wait(0.05)
+        return np.array(
+            [[idx, 1, 0.9, 0.25, 0.25, 0.75, 0.75] for idx in range(len(blob))],
+            dtype=np.float32,
+        )
+
+
+def _server(**env):
+    """Return a server configured by `env` and its stub backend."""
+    backend = _StubBackend()
+    with mock.patch.dict(os.environ, env), mock.patch.object(
+        server_module, "_load_backend", return_value=backend
+    ):
+        return server_module.FaceDetection(), backend
+
+
+def _shard(data: bytes) -> bytes:
+    """Return a tar shard with the image as its only member."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        member = tarfile.TarInfo("sample.png")
+        member.size = len(data)
+        tar.addfile(member, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class TestMicroBatching(unittest.TestCase):
+    """Test cases for cross-request micro-batching."""
+
+    def _put_concurrently(self, client: TestClient):
+        """Send `NUM_REQUESTS` single-image requests at once."""
+        data = IMAGE_PATH.read_bytes()
+
+        def put(i):
+            response = client.put(f"/bck/img{i}.png", content=data)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(len(response.content), 0)
+
+        with ThreadPoolExecutor(max_workers=NUM_REQUESTS) as pool:
+            list(pool.map(put, range(NUM_REQUESTS)))
+
+    def test_streaming_requests_are_batched(self):
+        """Concurrent streaming requests share forward passes, as `/metrics` reports."""
+        server, backend = _server(
+            STREAMING="true", BATCH_WAIT_MS="200", BATCH_SIZE=str(NUM_REQUESTS)
+        )
+        with TestClient(server.app) as client:
+            self._put_concurrently(client)
+            metrics = client.get("/metrics").text
+
+        self.assertGreater(max(backend.batch_sizes), 1)
+        count = re.search(r"^face_detection_batch_size_count (\d+)", metrics, re.M)
+        total = re.search(r"^face_detection_batch_size_sum (\S+)", metrics, re.M)
+        self.assertEqual(float(total.group(1)), NUM_REQUESTS)
+        # Fewer forward passes than requests: some batch held more than one image
+        self.assertLess(int(count.group(1)), NUM_REQUESTS)
+
+    def test_buffered_requests_are_not_batched(self):
+        """Requests served by `transform` run one forward pass each, without waiting."""
+        server, backend = _server(
+            STREAMING="false", BATCH_WAIT_MS="200", BATCH_SIZE=str(NUM_REQUESTS)
+        )
+        with TestClient(server.app) as client:
+            self._put_concurrently(client)
+        self.assertEqual(backend.batch_sizes, [1] * NUM_REQUESTS)
+
+    def test_buffered_requests_warn(self):
+        """Without `STREAMING=true`, a warning says requests are not batched."""
+        with self.assertLogs(level="WARNING") as logs:
+            _server(STREAMING="false", BATCH_WAIT_MS="5")
+        self.assertIn("STREAMING=true", "\n".join(logs.output))
+
+
+class TestMimeType(unittest.TestCase):
+    """Test cases for per-request response MIME types."""
+
+    def test_request_mime_type(self):
+        """Each response reports the MIME type of its own output."""
+        data = IMAGE_PATH.read_bytes()
+        shard = _shard(data)
+        cases = (
+            ("/bck/img.png", data, None, "image/jpeg"),
+            ("/bck/img.png", data, "png", "image/png"),
+            ("/bck/img.png", data, "json", "application/json"),
+            ("/bck/img.png", data, "crops", "application/x-tar"),
+            ("/bck/shard.tar", shard, None, "application/x-tar"),
+            ("/bck/shard.tar", shard, "json", "application/x-ndjson"),
+            ("/bck/shard.tar", shard, "crops", "application/x-tar"),
+        )
+        for streaming in ("false", "true"):
+            server, _ = _server(STREAMING=streaming)
+            with TestClient(server.app) as client:
+                # Interleave requests so that no request sees another one's type
+                for path, body, fmt, expected in cases + cases[::-1]:
+                    with self.subTest(streaming=streaming, path=path, fmt=fmt):
+                        params = (
+                            {"etl_args": json.dumps({"format": fmt})} if fmt else None
+                        )
+                        response = client.put(path, content=body, params=params)
+                        self.assertEqual(response.status_code, 200, response.text)
+                        self.assertEqual(response.headers["content-type"], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,6 +17,7 @@ import pytest
 from aistore.sdk.etl import ETLConfig
 from aistore.sdk import Bucket, Client
 from aistore.sdk.errors import ErrBckNotFound
+from aistore.sdk.etl.etl_const import ETL_COMM_HPULL, ETL_COMM_HPUSH
 
 from tests.const import (
     INLINE_PARAM_COMBINATIONS,
@@ -195,6 +196,77 @@ def test_ffmpeg_go_transformer(
     )
 
 
+@pytest.mark.parametrize(
+    "comm_type, use_fqn", list(product([ETL_COMM_HPULL, ETL_COMM_HPUSH], [True, False]))
+)
+def test_ffmpeg_streaming_transformer(
+    test_bck: Bucket,
+    local_audio_files: Dict[str, Path],
+    etl_factory,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate the FFmpeg ETL transformer in streaming mode (`STREAMING=true`).
+    WebSocket communication does not support `transform_stream`, so it is not covered.
+    """
+    for filename, path in local_audio_files.items():
+        test_bck.object(filename).get_writer().put_file(str(path))
+
+    etl_name = etl_factory(
+        tag="ffmpeg",
+        server_type="fastapi",
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        AR="16000",
+        AC="1",
+        STREAMING="true",
+    )
+
+    _verify_test_files(
+        test_bck,
+        local_audio_files,
+        etl_name,
+    )
+
+
+@pytest.mark.parametrize("streaming", ["false", "true"])
+def test_ffmpeg_etl_args(
+    test_bck: Bucket,
+    local_audio_files: Dict[str, Path],
+    etl_factory,
+    streaming: str,
+) -> None:
+    """
+    Validate per-request output settings (etl_args) of the FastAPI server: one
+    ETL serves both the configured 16 kHz WAV and a 44.1 kHz FLAC variant.
+    """
+    for filename, path in local_audio_files.items():
+        test_bck.object(filename).get_writer().put_file(str(path))
+
+    etl_name = etl_factory(
+        tag="ffmpeg",
+        server_type="fastapi",
+        comm_type=ETL_COMM_HPULL,
+        AR="16000",
+        AC="1",
+        STREAMING=streaming,
+    )
+
+    args = '{"ar": 44100, "ac": 1, "codec": "flac", "format": "flac"}'
+    for filename, orig_path in local_audio_files.items():
+        obj = test_bck.object(filename)
+        out_bytes = obj.get_reader(etl=ETLConfig(etl_name, args=args)).read_all()
+        with sf.SoundFile(io.BytesIO(out_bytes)) as f:
+            assert (f.format, f.channels, f.samplerate) == ("FLAC", 1, 44100)
+
+        out_bytes = obj.get_reader(etl=ETLConfig(etl_name)).read_all()
+        _assert_transformed_file(
+            out_bytes, Path(orig_path).read_bytes(), filename, etl_name
+        )
+
+
 # pylint: disable=too-many-arguments, too-many-locals
 @pytest.mark.stress
 @pytest.mark.parametrize(
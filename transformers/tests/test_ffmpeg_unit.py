@@ -0,0 +1,534 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the FFmpeg ETL Transformer (FastAPI).
+
+Runs the FFmpegServer in-process (requires `ffmpeg` on PATH) and checks the
+streaming mode, the pod-wide limit on concurrent FFmpeg processes, the
+passthrough of conformant objects, segmented transcoding of long objects,
+per-request settings (etl_args), tar shards and the in-process soundfile
+backend against FFmpeg.
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+if shutil.which("ffmpeg") is None:
+    raise unittest.SkipTest("ffmpeg is not installed")
+
+# Set environment variables before importing the server
+os.environ["AIS_TARGET_URL"] = "http://localhost:8080"
+os.environ["AR"] = "16000"
+os.environ["AC"] = "1"
+os.environ["FFMPEG_LOCK_DIR"] = tempfile.mkdtemp(prefix="ffmpeg-slots-")
+
+# pylint: disable=wrong-import-position
+from FFmpeg.fastapi_server import FFmpegServer, _ProcessSlots, probe_audio
+
+RESOURCES = Path(__file__).parent / "resources"
+AUDIO_FILES = ("test-audio-flac.flac", "test-audio-mp3.mp3", "test-audio-wav.wav")
+
+
+@contextmanager
+def _env(**env):
+    """Temporarily set environment variables (None removes one)."""
+    saved = {key: os.environ.get(key) for key in env}
+    for key, value in env.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = value
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _read(data: bytes):
+    """Decode audio bytes to int16 samples and return them with the sample rate."""
+    return sf.read(io.BytesIO(data), dtype="int16", always_2d=True)
+
+
+class TestFFmpegServer(unittest.TestCase):
+    """Test cases for FFmpegServer functionality."""
+
+    def setUp(self):
+        """Set up a buffered and a streaming FFmpegServer instance."""
+        os.environ["STREAMING"] = "false"
+        self.etl_server = FFmpegServer()
+        os.environ["STREAMING"] = "true"
+        self.streaming_server = FFmpegServer()
+
+    def test_streaming_matches_buffered(self):
+        """Streaming output is identical to the buffered output."""
+        for filename in AUDIO_FILES:
+            data = (RESOURCES / filename).read_bytes()
+            with self.subTest(filename=filename):
+                expected = self.etl_server.transform(data, filename, "")
+                output = b"".join(
+                    self.streaming_server.transform_stream(io.BytesIO(data), filename)
+                )
+                self.assertEqual(output, expected)
+                with sf.SoundFile(io.BytesIO(output)) as f:
+                    self.assertEqual((f.channels, f.samplerate), (1, 16000))
+
+    def test_streaming_passthrough(self):
+        """Non-audio objects are streamed back unchanged."""
+        data = os.urandom(200_000)
+        output = b"".join(
+            self.streaming_server.transform_stream(io.BytesIO(data), "file.txt")
+        )
+        self.assertEqual(output, data)
+
+    def test_streaming_error(self):
+        """FFmpeg errors are reported in streaming mode."""
+        with self.assertRaisesRegex(RuntimeError, "FFmpeg process failed"):
+            b"".join(
+                self.streaming_server.transform_stream(
+                    io.BytesIO(b"not audio" * 1000), "file.wav"
+                )
+            )
+
+    def test_threads(self):
+        """FFmpeg gets the cores divided by the slots as its thread count."""
+        os.environ["FFMPEG_SLOTS"] = "1"
+        try:
+            server = FFmpegServer()
+        finally:
+            del os.environ["FFMPEG_SLOTS"]
+        self.assertEqual(server.threads, os.cpu_count())
+        command = " ".join(server._cmd_prefix)  # pylint: disable=protected-access
+        self.assertIn(f"-threads {os.cpu_count()} -i", command)
+
+    def test_metrics(self):
+        """Process and slot metrics are exposed in Prometheus text format."""
+        data = (RESOURCES / "test-audio-wav.wav").read_bytes()
+        self.etl_server.transform(data, "test.wav", "")
+        metrics = self.etl_server.render_metrics()
+        self.assertIn(f"ffmpeg_slots {2 * os.cpu_count()}\n", metrics)
+        self.assertIn("ffmpeg_processes 0\n", metrics)
+        self.assertIn("ffmpeg_processes_total 1\n", metrics)
+        self.assertIn("ffmpeg_queue_seconds_count 1\n", metrics)
+
+
+class TestSegments(unittest.TestCase):
+    """Test cases for the segmented transcoding of long objects."""
+
+    @staticmethod
+    def _synth(fmt: str, seconds: float = 11.5) -> bytes:
+        """Return a 44.1 kHz stereo sweep with noise in `fmt` (WAV or FLAC)."""
+        rng = np.random.default_rng(0)
+        t = np.arange(int(seconds * 44100)) / 44100
+        audio = 0.3 * np.sin(2 * np.pi * 300 * t * (1 + t / seconds))
+        audio = np.stack([audio, audio + 0.05 * rng.standard_normal(len(t))], axis=1)
+        buf = io.BytesIO()
+        sf.write(buf, audio, 44100, format=fmt, subtype="PCM_16")
+        return buf.getvalue()
+
+    def test_matches_single_process(self):
+        """Segmented output has the same samples as one FFmpeg process's."""
+        for env in ({}, {"AR": "22050", "AC": "2", "CODEC": "pcm_s24le"}):
+            with _env(**env):
+                server = FFmpegServer()
+            with _env(
+                SEGMENT_THRESHOLD="1", SEGMENT_SECONDS="2", SEGMENT_WORKERS="4", **env
+            ):
+                segmented = FFmpegServer()
+            for fmt in ("WAV", "FLAC"):
+                data = self._synth(fmt)
+                expected = sf.read(io.BytesIO(server.transform(data, "a.wav", "")))
+                with tempfile.NamedTemporaryFile() as f:
+                    f.write(data)
+                    f.flush()
+                    for obj in (data, f.name):
+                        output = segmented.transform(obj, "a.wav", "")
+                        audio, rate = sf.read(io.BytesIO(output))
+                        with self.subTest(env=env, format=fmt, fqn=obj is not data):
+                            self.assertEqual(rate, expected[1])
+                            np.testing.assert_array_equal(audio, expected[0])
+            self.assertEqual(segmented.segmented_objects, 4)
+            self.assertEqual(segmented.slots.started_total, 16)
+        self.assertIn("ffmpeg_segmented_total 4\n", segmented.render_metrics())
+
+    def test_not_segmented(self):
+        """Small, short or unsupported objects and settings use one process."""
+        data = self._synth("WAV")
+        with _env(SEGMENT_THRESHOLD=str(len(data) + 1), SEGMENT_SECONDS="2"):
+            server = FFmpegServer()
+        server.transform(data, "a.wav", "")
+        with _env(SEGMENT_THRESHOLD="1", SEGMENT_SECONDS="6"):
+            short = FFmpegServer()
+        short.transform(data, "a.wav", "")
+        short.transform((RESOURCES / "test-audio-mp3.mp3").read_bytes(), "a.mp3", "")
+        self.assertEqual((server.segmented_objects, short.segmented_objects), (0, 0))
+        self.assertEqual(short.slots.started_total, 2)
+
+        with _env(SEGMENT_THRESHOLD="1", CODEC="flac", FORMAT="flac"):
+            server = FFmpegServer()
+        self.assertIsNone(server.settings.segment_suffix)
+
+
+class TestSoundfileBackend(unittest.TestCase):
+    """Compare the in-process soundfile backend with FFmpeg."""
+
+    def _servers(self, **env):
+        """Return an FFmpeg and a soundfile backend server with the same settings."""
+        with _env(AUDIO_BACKEND="ffmpeg", **env):
+            ffmpeg_server = FFmpegServer()
+        with _env(AUDIO_BACKEND="soundfile", **env):
+            soundfile_server = FFmpegServer()
+        return ffmpeg_server, soundfile_server
+
+    def test_mix_matches_ffmpeg(self):
+        """Without resampling, the output matches FFmpeg's within one LSB."""
+        # FFmpeg keeps the padding of the last FLAC block (libsndfile trims it to
+        # the length in STREAMINFO), so only the common frames are compared
+        for channels in ("1", "2"):
+            ffmpeg_server, soundfile_server = self._servers(AR=None, AC=channels)
+            for filename in ("test-audio-flac.flac", "test-audio-wav.wav"):
+                data = (RESOURCES / filename).read_bytes()
+                expected, expected_rate = _read(
+                    ffmpeg_server.transform(data, filename, "")
+                )
+                output, rate = _read(soundfile_server.transform(data, filename, ""))
+                with self.subTest(filename=filename, channels=channels):
+                    self.assertEqual(
+                        (rate, output.shape[1]), (expected_rate, int(channels))
+                    )
+                    frames = min(len(output), len(expected))
+                    self.assertGreater(frames, 0.97 * len(expected))
+                    np.testing.assert_allclose(
+                        output[:frames], expected[:frames], atol=1, rtol=0
+                    )
+        self.assertEqual(soundfile_server.soundfile_objects, 2)
+
+    def test_resample_matches_ffmpeg(self):
+        """Resampled output has FFmpeg's length and is close to its output."""
+        ffmpeg_server, soundfile_server = self._servers()
+        data = (RESOURCES / "test-audio-wav.wav").read_bytes()
+        expected, expected_rate = _read(ffmpeg_server.transform(data, "a.wav", ""))
+        output, rate = _read(soundfile_server.transform(data, "a.wav", ""))
+        self.assertEqual((rate, output.shape), (expected_rate, expected.shape))
+        # The resampling filters differ in their transition band
+        error = expected.astype(float) - output
+        snr = 10 * np.log10((expected.astype(float) ** 2).sum() / (error**2).sum())
+        self.assertGreater(snr, 40)
+
+    def test_output_formats(self):
+        """PCM codecs and FLAC are encoded in-process."""
+        data = (RESOURCES / "test-audio-flac.flac").read_bytes()
+        for codec, fmt, subtype in (
+            ("pcm_s24le", "wav", "PCM_24"),
+            ("pcm_f32le", "wav", "FLOAT"),
+            ("flac", "flac", "PCM_16"),
+        ):
+            _, server = self._servers(CODEC=codec, FORMAT=fmt)
+            info = sf.info(io.BytesIO(server.transform(data, "a.flac", "")))
+            with self.subTest(codec=codec):
+                self.assertEqual(
+                    (info.format, info.subtype, info.channels, info.samplerate),
+                    (fmt.upper(), subtype, 1, 16000),
+                )
+                self.assertEqual(server.soundfile_objects, 1)
+
+    def test_fallback(self):
+        """Unsupported settings and inputs go through FFmpeg."""
+        _, server = self._servers(AUDIO_FILTERS="volume=0.5")
+        self.assertIsNone(server.settings.soundfile)
+
+        ffmpeg_server, server = self._servers()
+        with self.assertRaisesRegex(RuntimeError, "FFmpeg process failed"):
+            server.transform(b"not audio" * 1000, "a.wav", "")
+        self.assertEqual((server.soundfile_objects, server.soundfile_fallbacks), (0, 1))
+        self.assertIn("ffmpeg_soundfile_fallbacks_total 1\n", server.render_metrics())
+
+        # FLAC written to a pipe has no length in its header
+        ffmpeg_flac, _ = self._servers(AR=None, CODEC="flac", FORMAT="flac")
+        data = ffmpeg_flac.transform(
+            (RESOURCES / "test-audio-wav.wav").read_bytes(), "a.wav", ""
+        )
+        expected, _ = _read(ffmpeg_server.transform(data, "a.flac", ""))
+        output, _ = _read(server.transform(data, "a.flac", ""))
+        np.testing.assert_array_equal(output, expected)
+        self.assertEqual((server.soundfile_objects, server.soundfile_fallbacks), (0, 2))
+
+
+class TestEtlArgs(unittest.TestCase):
+    """Test cases for output settings given per request."""
+
+    def setUp(self):
+        """Set up a server with the default settings (16 kHz mono WAV)."""
+        self.server = FFmpegServer()
+        self.data = (RESOURCES / "test-audio-flac.flac").read_bytes()
+
+    def test_overrides(self):
+        """etl_args override the output settings and the MIME type."""
+        etl_args = json.dumps(
+            {"ar": 8000, "ac": "2", "codec": "flac", "format": "flac"}
+        )
+        for mode in ("buffered", "streaming"):
+            if mode == "buffered":
+                output = self.server.transform(self.data, "a.flac", etl_args)
+            else:
+                stream = self.server.transform_stream(
+                    io.BytesIO(self.data), "a.flac", etl_args
+                )
+                # The SDK asks for the MIME type before the first chunk
+                self.assertEqual(self.server.get_mime_type(), "audio/flac")
+                output = b"".join(stream)
+            info = sf.info(io.BytesIO(output))
+            with self.subTest(mode=mode):
+                self.assertEqual(self.server.get_mime_type(), "audio/flac")
+                self.assertEqual(
+                    (info.format, info.samplerate, info.channels), ("FLAC", 8000, 2)
+                )
+
+        filtered = self.server.transform(
+            self.data,
+            "a.flac",
+            json.dumps({"audio_filters": "volume=0.5,highpass=f=100"}),
+        )
+        expected = self.server.transform(self.data, "a.flac", "")
+        self.assertEqual(self.server.get_mime_type(), "audio/wav")
+        self.assertLess(
+            np.abs(_read(filtered)[0]).max(), np.abs(_read(expected)[0]).max()
+        )
+
+    def test_settings_cache(self):
+        """Per-request settings are built once, defaults are not cached."""
+        for etl_args in ("", '{"ar": 22050}', '{"ar": "22050"}', "not json", "[1]"):
+            self.server.transform(self.data, "a.flac", etl_args)
+        # pylint: disable-next=protected-access
+        info = self.server._get_settings.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+        self.assertIn(
+            "ffmpeg_command_cache_hits_total 1\n", self.server.render_metrics()
+        )
+
+    def test_validation(self):
+        """Invalid settings fail the request before FFmpeg starts."""
+        for args in (
+            {"ar": "16k"},
+            {"ar": 0},
+            {"ac": True},
+            {"br": "64k; rm"},
+            {"codec": "pcm_s16le -f null"},
+            {"format": "hls"},
+            {"audio_filters": "amovie=/etc/passwd"},
+            {"audio_filters": "volume=2,ametadata=mode=print:file=/tmp/x"},
+            {"audio_filters": "[in]volume=2[out]"},
+        ):
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                self.server.transform(self.data, "a.flac", json.dumps(args))
+            with self.subTest(args=args, mode="streaming"), self.assertRaises(
+                ValueError
+            ):
+                self.server.transform_stream(
+                    io.BytesIO(self.data), "a.flac", json.dumps(args)
+                )
+        self.assertEqual(self.server.slots.started_total, 0)
+
+
+class TestSkipConformant(unittest.TestCase):
+    """Test cases for the passthrough of objects that match the output settings."""
+
+    def test_probe(self):
+        """WAV and FLAC headers are parsed without decoding the audio."""
+        for filename, expected in (
+            ("test-audio-wav.wav", ("wav", "pcm_s16le", 44100, 2, 132338)),
+            ("test-audio-flac.flac", ("flac", "flac", 44100, 2, 44172)),
+            ("test-audio-mp3.mp3", None),
+        ):
+            data = (RESOURCES / filename).read_bytes()
+            with self.subTest(filename=filename):
+                self.assertEqual(probe_audio(data[:65536]), expected)
+
+        audio = np.zeros((100, 3), dtype=np.float32)
+        for fmt, subtype, codec in (
+            ("WAV", "PCM_24", "pcm_s24le"),
+            ("WAV", "FLOAT", "pcm_f32le"),
+            ("WAVEX", "PCM_16", "pcm_s16le"),
+            ("WAVEX", "DOUBLE", "pcm_f64le"),
+        ):
+            buf = io.BytesIO()
+            sf.write(buf, audio, 8000, format=fmt, subtype=subtype)
+            with self.subTest(format=fmt, subtype=subtype):
+                self.assertEqual(
+                    probe_audio(buf.getvalue()), ("wav", codec, 8000, 3, 100)
+                )
+        # WAV written to a pipe, without its length
+        unsized = bytearray((RESOURCES / "test-audio-wav.wav").read_bytes()[:4096])
+        data_pos = unsized.index(b"data")
+        unsized[data_pos + 4 : data_pos + 8] = b"\xff" * 4
+        self.assertIsNone(probe_audio(bytes(unsized)).frames)
+        self.assertIsNone(probe_audio(b"RIFF"))
+        self.assertIsNone(probe_audio(b"fLaC"))
+
+    def test_conformant_passthrough(self):
+        """Conformant objects are returned unchanged, others are transcoded."""
+        data = (RESOURCES / "test-audio-wav.wav").read_bytes()
+        with _env(SKIP_CONFORMANT="true", AR="44100", AC="2"):
+            server = FFmpegServer()
+        self.assertEqual(server.transform(data, "a.wav", ""), data)
+        with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+            f.write(data)
+            f.flush()
+            self.assertEqual(server.transform(f.name, "a.wav", ""), data)
+        self.assertEqual(
+            b"".join(server.transform_stream(io.BytesIO(data), "a.wav")), data
+        )
+        self.assertEqual(server.skipped_objects, 3)
+        self.assertIn("ffmpeg_skipped_total 3\n", server.render_metrics())
+
+        # Other sample rate, codec or format, or filters
+        flac = (RESOURCES / "test-audio-flac.flac").read_bytes()
+        for env, filename, obj in (
+            ({"AR": "16000"}, "a.wav", data),
+            ({"CODEC": "pcm_s24le"}, "a.wav", data),
+            ({}, "a.flac", flac),
+            ({"AUDIO_FILTERS": "volume=0.5"}, "a.wav", data),
+        ):
+            with _env(**{"SKIP_CONFORMANT": "true", "AR": "44100", "AC": "2", **env}):
+                server = FFmpegServer()
+            with self.subTest(env=env, filename=filename):
+                self.assertNotEqual(server.transform(obj, filename, ""), obj)
+                self.assertEqual(server.skipped_objects, 0)
+
+    def test_disabled_by_default(self):
+        """Without SKIP_CONFORMANT, conformant objects still go through FFmpeg."""
+        with _env(AR="44100", AC="2"):
+            server = FFmpegServer()
+        data = (RESOURCES / "test-audio-wav.wav").read_bytes()
+        server.transform(data, "a.wav", "")
+        self.assertEqual((server.skipped_objects, server.slots.started_total), (0, 1))
+
+
+class TestShards(unittest.TestCase):
+    """Test cases for tar (WebDataset) shards of audio members."""
+
+    def setUp(self):
+        """Build a shard of audio, transcript and metadata members."""
+        self.members = []
+        for i, filename in enumerate(AUDIO_FILES):
+            ext = os.path.splitext(filename)[1]
+            self.members += [
+                (f"sample{i}{ext}", (RESOURCES / filename).read_bytes()),
+                (f"sample{i}.txt", f"transcript {i}".encode()),
+                (f"sample{i}.json", json.dumps({"id": i}).encode()),
+            ]
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            for name, data in self.members:
+                info = tarfile.TarInfo(name=name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        self.shard = buf.getvalue()
+        with _env(WORKERS="2"):
+            self.server = FFmpegServer()
+
+    def test_shard(self):
+        """Audio members are transcoded and renamed in order, others pass through."""
+        output = self.server.transform(self.shard, "shard.tar", "")
+        self.assertEqual(self.server.get_mime_type(), "application/x-tar")
+        with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+            members = [(m.name, tar.extractfile(m).read()) for m in tar]
+        self.assertEqual(len(members), len(self.members))
+        for (name, data), (out_name, out_data) in zip(self.members, members):
+            with self.subTest(member=name):
+                if name.endswith((".txt", ".json")):
+                    self.assertEqual((out_name, out_data), (name, data))
+                    continue
+                self.assertEqual(out_name, os.path.splitext(name)[0] + ".wav")
+                self.assertEqual(
+                    out_data, self.server.transform(data, f"shard.tar/{name}", "")
+                )
+                with sf.SoundFile(io.BytesIO(out_data)) as f:
+                    self.assertEqual((f.channels, f.samplerate), (1, 16000))
+
+    def test_streaming_and_fqn(self):
+        """Streamed shards and shards read from a path match the buffered output."""
+        expected = self.server.transform(self.shard, "shard.tar", "")
+        streamed = b"".join(
+            self.server.transform_stream(io.BytesIO(self.shard), "shard.tar")
+        )
+        self.assertEqual(streamed, expected)
+        with tempfile.NamedTemporaryFile(suffix=".tar") as f:
+            f.write(self.shard)
+            f.flush()
+            self.assertEqual(self.server.transform(f.name, f.name, ""), expected)
+
+    def test_etl_args(self):
+        """Members are renamed for the output format given per request."""
+        output = self.server.transform(
+            self.shard, "shard.tar", json.dumps({"format": "flac", "codec": "flac"})
+        )
+        with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+            names = tar.getnames()
+        self.assertEqual(names[::3], ["sample0.flac", "sample1.flac", "sample2.flac"])
+
+    def test_member_error(self):
+        """A member FFmpeg cannot decode fails the shard with the member name."""
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            info = tarfile.TarInfo(name="broken.flac")
+            info.size = 9000
+            tar.addfile(info, io.BytesIO(b"not audio" * 1000))
+        with self.assertRaisesRegex(RuntimeError, "Error transforming broken.flac"):
+            self.server.transform(buf.getvalue(), "shard.tar", "")
+
+
+class TestProcessSlots(unittest.TestCase):
+    """Test cases for the pod-wide FFmpeg process limit."""
+
+    def test_limit_shared_by_workers(self):
+        """Slot holders of several workers never exceed the limit."""
+        lock_dir = tempfile.mkdtemp(prefix="ffmpeg-slots-")
+        # One instance per simulated worker process, sharing the lock files
+        workers = [_ProcessSlots(lock_dir, 2) for _ in range(3)]
+        lock = threading.Lock()
+        holders = [0]
+        peak = [0]
+
+        def hold(slots: _ProcessSlots):
+            with slots.acquire():
+                with lock:
+                    holders[0] += 1
+                    peak[0] = max(peak[0], holders[0])
+                time.sleep(0.02)
+                with lock:
+                    holders[0] -= 1
+
+        threads = [
+            threading.Thread(target=hold, args=(workers[i % 3],)) for i in range(12)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(sum(w.started_total for w in workers), 12)
+        self.assertGreater(sum(w.queue_seconds_sum for w in workers), 0)
+        self.assertEqual([w.running + w.waiting for w in workers], [0, 0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+Numerical parity tests for the Keras Preprocessing augmentation backends.
+
+Compares the NumPy/SciPy/Pillow `NumpyImageDataGenerator` (default
+`AUGMENT_BACKEND=numpy`) with the Keras `ImageDataGenerator`
+(`AUGMENT_BACKEND=tensorflow`): drawn transform parameters, augmented images
+and server output for single objects and tar shards. Requires TensorFlow.
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import os
+import sys
+import json
+import tarfile
+import subprocess
+import unittest
+import importlib.util
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+if importlib.util.find_spec("tensorflow") is None:
+    raise unittest.SkipTest("TensorFlow is not installed")
+
+# Set environment variables before importing the server
+os.environ["AIS_TARGET_URL"] = "http://localhost:8080"
+os.environ["TRANSFORM"] = json.dumps({"rotation_range": 40})
+os.environ["DETERMINISTIC"] = "true"
+
+# pylint: disable=wrong-import-position
+from keras.utils import array_to_img, img_to_array, load_img
+import keras_preprocess.fastapi_server as server_module
+from keras_preprocess.fastapi_server import (
+    KerasPreprocessServer,
+    NumpyImageDataGenerator,
+    _decode_image,
+    _encode_output,
+    _import_image_data_generator,
+)
+
+IMAGE_PATH = Path(__file__).parent / "resources" / "test-face-detection.png"
+
+FILL_MODES = ("nearest", "constant", "reflect", "wrap")
+
+TRANSFORM_PARAMS = {
+    "rotation_range": 40,
+    "width_shift_range": 0.2,
+    "height_shift_range": [-8, 4, 16],
+    "shear_range": 30,
+    "zoom_range": [0.7, 1.2],
+    "channel_shift_range": 25.0,
+    "brightness_range": [0.6, 1.4],
+    "horizontal_flip": True,
+    "vertical_flip": True,
+    "cval": 64.0,
+}
+
+
+class TestKerasBackends(unittest.TestCase):
+    """Compare the NumPy augmentation backend with the Keras ImageDataGenerator."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = IMAGE_PATH.read_bytes()
+        cls.image = img_to_array(load_img(IMAGE_PATH))
+        cls.servers = {}
+        for backend in ("numpy", "tensorflow"):
+            os.environ["AUGMENT_BACKEND"] = backend
+            cls.servers[backend] = KerasPreprocessServer()
+
+    def _generators(self, **params):
+        """Return the NumPy and Keras generators for the same parameters."""
+        image_data_generator = _import_image_data_generator()
+        return NumpyImageDataGenerator(**params), image_data_generator(**params)
+
+    def test_decode_encode(self):
+        """Decoding and encoding match `load_img`/`img_to_array`/`array_to_img`."""
+        image = _decode_image(self.data)
+        np.testing.assert_array_equal(image, self.image)
+
+        shifted = image * 1.3 - 20
+        buf = io.BytesIO()
+        array_to_img(shifted).save(buf, format="PNG")
+        self.assertEqual(_encode_output(shifted, "PNG"), buf.getvalue())
+
+    def test_random_transform(self):
+        """Seeded parameters are drawn identically."""
+        numpy_gen, keras_gen = self._generators(**TRANSFORM_PARAMS)
+        for seed in range(20):
+            self.assertEqual(
+                numpy_gen.get_random_transform(self.image.shape, seed=seed),
+                keras_gen.get_random_transform(self.image.shape, seed=seed),
+            )
+
+    def test_apply_transform(self):
+        """Augmented images are identical for every fill mode and interpolation order."""
+        for fill_mode in FILL_MODES:
+            for order in (0, 1, 3):
+                numpy_gen, keras_gen = self._generators(
+                    **TRANSFORM_PARAMS, fill_mode=fill_mode, interpolation_order=order
+                )
+                for seed in range(3):
+                    params = keras_gen.get_random_transform(self.image.shape, seed=seed)
+                    with self.subTest(fill_mode=fill_mode, order=order, seed=seed):
+                        np.testing.assert_array_equal(
+                            numpy_gen.apply_transform(self.image, params),
+                            keras_gen.apply_transform(self.image, params),
+                        )
+
+    def test_apply_affine(self):
+        """The vectorized affine resampling matches SciPy within float rounding."""
+        for fill_mode in FILL_MODES:
+            numpy_gen, keras_gen = self._generators(
+                **TRANSFORM_PARAMS, fill_mode=fill_mode
+            )
+            for seed in range(3):
+                params = keras_gen.get_random_transform(self.image.shape, seed=seed)
+                affine = {
+                    key: params[key]
+                    for key in ("theta", "tx", "ty", "shear", "zx", "zy")
+                }
+                with self.subTest(fill_mode=fill_mode, seed=seed):
+                    np.testing.assert_allclose(
+                        numpy_gen.apply_affine(self.image, params),
+                        keras_gen.apply_transform(self.image, affine),
+                        atol=1e-3,
+                    )
+
+    def test_tensorflow_wrap_is_not_batched(self):
+        """Keras generators with `fill_mode="wrap"` are augmented image by image."""
+        server = self.servers["tensorflow"]
+        params = {**TRANSFORM_PARAMS, "fill_mode": "wrap"}
+        datagen, *_ = server._parse_etl_args(  # pylint: disable=protected-access
+            json.dumps(params)
+        )
+        seeds = list(range(3))
+        with mock.patch.object(server_module, "_affine_batch_tf") as affine_batch_tf:
+            # pylint: disable-next=protected-access
+            batch = server._augment_batch([self.image] * len(seeds), datagen, seeds)
+        affine_batch_tf.assert_not_called()
+        for image, seed in zip(batch, seeds):
+            expected = datagen.apply_transform(
+                self.image, datagen.get_random_transform(self.image.shape, seed=seed)
+            )
+            np.testing.assert_array_equal(image, expected)
+
+    def test_server_output(self):
+        """Server outputs of both backends are identical for single images."""
+        for fmt in ("JPEG", "png", "npy"):
+            etl_args = json.dumps({**TRANSFORM_PARAMS, "format": fmt})
+            with self.subTest(format=fmt):
+                self.assertEqual(
+                    self.servers["numpy"].transform(self.data, "img.png", etl_args),
+                    self.servers["tensorflow"].transform(
+                        self.data, "img.png", etl_args
+                    ),
+                )
+
+    def test_server_shard_output(self):
+        """Batched shard outputs match the per-image outputs of the same members."""
+        shard = io.BytesIO()
+        with tarfile.open(fileobj=shard, mode="w") as tar:
+            for i in range(4):
+                info = tarfile.TarInfo(name=f"sample{i}.png")
+                info.size = len(self.data)
+                tar.addfile(info, io.BytesIO(self.data))
+        # Without `brightness_range`: its uint8 rounding amplifies float rounding
+        params = {
+            key: value
+            for key, value in TRANSFORM_PARAMS.items()
+            if key != "brightness_range"
+        }
+        etl_args = json.dumps({**params, "format": "npy"})
+
+        # TensorFlow's projective transform computes coordinates in float32
+        for backend, atol in (("numpy", 1e-3), ("tensorflow", 0.05)):
+            server = self.servers[backend]
+            output = server.transform(shard.getvalue(), "shard.tar", etl_args)
+            with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+                for i, member in enumerate(tar.getmembers()):
+                    self.assertEqual(member.name, f"sample{i}.npy")
+                    expected = server.transform(
+                        self.data, f"shard.tar/sample{i}.png", etl_args
+                    )
+                    with self.subTest(backend=backend, member=member.name):
+                        np.testing.assert_allclose(
+                            np.load(io.BytesIO(tar.extractfile(member).read())),
+                            np.load(io.BytesIO(expected)),
+                            atol=atol,
+                        )
+
+    def test_unsupported_params_use_keras(self):
+        """The NumPy backend uses Keras only for parameters it does not implement."""
+        server = self.servers["numpy"]
+        self.assertIsInstance(server.datagen, NumpyImageDataGenerator)
+        datagen, *_ = server._parse_etl_args(  # pylint: disable=protected-access
+            json.dumps({"samplewise_center": True})
+        )
+        self.assertNotIsInstance(datagen, NumpyImageDataGenerator)
+
+    def test_tensorflow_not_imported(self):
+        """A server with the NumPy backend does not import TensorFlow."""
+        script = (
+            "import sys, keras_preprocess.fastapi_server; "
+            "print('tensorflow' in sys.modules)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=Path(__file__).parent.parent,
+            env={**os.environ, "AUGMENT_BACKEND": "numpy"},
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        self.assertEqual(output.strip().splitlines()[-1], "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
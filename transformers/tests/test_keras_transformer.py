@@ -9,9 +9,11 @@ Copyright (c) 2023-2025, NVIDIA CORPORATION. All rights reserved.
 import io
 import json
 import logging
+import tarfile
 from pathlib import Path
 from typing import Dict
 
+import numpy as np
 import pytest
 from tensorflow.keras.preprocessing.image import (  # pylint: disable=import-error,no-name-in-module
     ImageDataGenerator,
@@ -131,6 +133,24 @@ def _verify_transformation(
         )
 
 
+def _verify_epochs(
+    test_bck: Bucket, local_files: Dict[str, Path], etl_name: str
+) -> None:
+    """Request each image for epochs 0, 0 and 1 and compare the outputs."""
+    for filename in local_files:
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        obj = test_bck.object(filename)
+        outputs = [
+            obj.get_reader(
+                etl=ETLConfig(etl_name, args=json.dumps({"epoch": epoch}))
+            ).read_all()
+            for epoch in (0, 0, 1)
+        ]
+        assert outputs[0] == outputs[1]
+        assert outputs[0] != outputs[2]
+
+
 @pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
 def test_keras_fastapi_transformer(
     test_bck: Bucket,
@@ -175,3 +195,148 @@ def test_keras_fastapi_transformer(
         "zoom_range": 0.5,
     }
     _verify_transformation(test_bck, local_files, etl_name, custom_transform)
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_keras_array_output(
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate the `.npy` array output (`FORMAT=npy`).
+    """
+    _upload_test_images(test_bck, local_files)
+    etl_name = etl_factory(
+        tag="keras-preprocess",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="npy",
+        TRANSFORM=json.dumps({"horizontal_flip": False}),
+    )
+
+    for filename, path in local_files.items():
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        reader = test_bck.object(filename).get_reader(etl=ETLConfig(etl_name))
+        array = np.load(io.BytesIO(reader.read_all()))
+        expected = img_to_array(load_img(path))
+        assert array.dtype == np.float32
+        np.testing.assert_array_equal(array, expected)
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_keras_deterministic(
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate deterministic augmentation: repeated requests for the same object
+    and epoch return identical outputs, and another epoch changes the output.
+    """
+    _upload_test_images(test_bck, local_files)
+    etl_name = etl_factory(
+        tag="keras-preprocess",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="npy",
+        DETERMINISTIC="true",
+        TRANSFORM=json.dumps({"rotation_range": 40, "zoom_range": 0.3}),
+    )
+    _verify_epochs(test_bck, local_files, etl_name)
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_keras_result_cache(
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate the result cache (`CACHE_DIR`): a repeated request is served from
+    the cache unchanged, and another epoch is not served the cached output.
+    """
+    _upload_test_images(test_bck, local_files)
+    etl_name = etl_factory(
+        tag="keras-preprocess",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="npy",
+        DETERMINISTIC="true",
+        CACHE_DIR="/tmp/keras-cache",
+        TRANSFORM=json.dumps({"rotation_range": 40, "zoom_range": 0.3}),
+    )
+    _verify_epochs(test_bck, local_files, etl_name)
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_keras_tar_shard(
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate batched shard augmentation: member order is kept, images are
+    renamed to `.npy` and keep their shape, and labels pass through unchanged.
+    """
+    image_path = next(p for p in local_files.values() if p.suffix == ".jpg")
+    members = []
+    for i in range(6):
+        members += [
+            (f"sample{i:04d}.jpg", image_path.read_bytes()),
+            (f"sample{i:04d}.cls", str(i).encode()),
+        ]
+    shard = io.BytesIO()
+    with tarfile.open(fileobj=shard, mode="w") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name=name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    test_bck.object("shard-000000.tar").get_writer().put_content(shard.getvalue())
+
+    etl_name = etl_factory(
+        tag="keras-preprocess",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="npy",
+        BATCH_SIZE="4",
+        TRANSFORM=json.dumps({"rotation_range": 40, "zoom_range": 0.2}),
+    )
+
+    output = (
+        test_bck.object("shard-000000.tar")
+        .get_reader(etl=ETLConfig(etl_name))
+        .read_all()
+    )
+    expected_shape = img_to_array(load_img(image_path)).shape
+    with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+        outputs = [(m.name, tar.extractfile(m).read()) for m in tar.getmembers()]
+    assert [name for name, _ in outputs] == [
+        name.replace(".jpg", ".npy") for name, _ in members
+    ]
+    for (name, data), (_, original) in zip(outputs, members):
+        if name.endswith(".npy"):
+            assert np.load(io.BytesIO(data)).shape == expected_shape
+        else:
+            assert data == original
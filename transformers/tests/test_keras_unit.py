@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the Keras Preprocessing ETL Transformer (FastAPI).
+
+Runs the KerasPreprocessServer in-process with the default NumPy backend (no
+TensorFlow needed) and checks the Content-Type of the responses: a per-request
+`format` or a tar shard changes the output, so every request reports its own
+MIME type. Also checks etl_args validation and the bounded result cache.
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+# Set environment variables before importing the server
+os.environ["AIS_TARGET_URL"] = "http://localhost:8080"
+os.environ["TRANSFORM"] = json.dumps({"rotation_range": 40, "horizontal_flip": True})
+
+# pylint: disable-next=wrong-import-position
+import keras_preprocess.fastapi_server as server_module
+
+
+def _image(seed: int = 0) -> bytes:
+    """Return a small JPEG image."""
+    pixels = np.random.default_rng(seed).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _shard(data: bytes) -> bytes:
+    """Return a tar shard with the image as its only member."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        member = tarfile.TarInfo("sample.jpg")
+        member.size = len(data)
+        tar.addfile(member, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _server(**env) -> "server_module.KerasPreprocessServer":
+    """Return a server configured by `env`."""
+    with mock.patch.dict(os.environ, env):
+        return server_module.KerasPreprocessServer()
+
+
+class TestMimeType(unittest.TestCase):
+    """Test cases for per-request response MIME types."""
+
+    @staticmethod
+    def _client(**env) -> TestClient:
+        """Return a client of a server configured by `env`."""
+        return TestClient(_server(**env).app)
+
+    def _check(self, client: TestClient, path: str, data: bytes, etl_args, expected):
+        params = {"etl_args": json.dumps(etl_args)} if etl_args else None
+        response = client.put(path, content=data, params=params)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.headers["content-type"], expected)
+
+    def test_request_mime_type(self):
+        """Each response reports the MIME type of its own output."""
+        data = _image()
+        shard = _shard(data)
+        client = self._client()
+        cases = (
+            ("/bck/img.jpg", data, None, "image/jpeg"),
+            ("/bck/img.jpg", data, {"format": "PNG"}, "image/png"),
+            ("/bck/img.jpg", data, {"format": "npy"}, "application/octet-stream"),
+            ("/bck/shard.tar", shard, None, "application/x-tar"),
+            ("/bck/shard.tar", shard, {"format": "npy"}, "application/x-tar"),
+        )
+        # Interleave requests so that no request sees another one's type
+        for path, body, etl_args, expected in cases + cases[::-1]:
+            with self.subTest(path=path, etl_args=etl_args):
+                self._check(client, path, body, etl_args, expected)
+
+    def test_env_mime_type(self):
+        """Without etl_args, the MIME type follows `FORMAT`."""
+        self._check(
+            self._client(FORMAT="safetensors"),
+            "/bck/img.jpg",
+            _image(),
+            None,
+            "application/octet-stream",
+        )
+
+
+class TestEtlArgs(unittest.TestCase):
+    """Test cases for etl_args validation."""
+
+    def setUp(self):
+        self.server = _server()
+
+    def test_invalid_params_are_rejected(self):
+        """Invalid formats, epochs and generator parameters fail the request."""
+        for etl_args in (
+            {"format": "nope"},
+            {"format": 3},
+            {"epoch": "first"},
+            {"rotation_rnage": 40},
+            {"zoom_range": "wide"},
+        ):
+            with self.subTest(etl_args=etl_args):
+                with self.assertRaises(ValueError):
+                    self.server.transform(_image(), "img.jpg", json.dumps(etl_args))
+
+    def test_non_object_etl_args_are_ignored(self):
+        """etl_args that are not a JSON object fall back to the defaults, with a warning."""
+        for etl_args in ("not json", "[1, 2]"):
+            with self.subTest(etl_args=etl_args):
+                with self.assertLogs(self.server.logger, level="WARNING"):
+                    # pylint: disable-next=protected-access
+                    request = self.server._parse_etl_args(etl_args)
+                self.assertIs(request[0], self.server.datagen)
+
+
+class TestResultCache(unittest.TestCase):
+    """Test cases for the on-disk result cache (`CACHE_DIR`)."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = Path(tmp.name)
+
+    def _entries(self):
+        return [p for p in self.cache_dir.glob("*/*") if p.is_file()]
+
+    def test_cache_is_bounded(self):
+        """Least recently used results are evicted above `CACHE_MAX_BYTES`."""
+        images = [_image(seed) for seed in range(20)]
+        entry_size = len(_server().transform(images[0], "img.npy", '{"format": "npy"}'))
+        server = _server(
+            DETERMINISTIC="true",
+            CACHE_DIR=str(self.cache_dir),
+            CACHE_MAX_BYTES=str(5 * entry_size),
+        )
+        for idx, image in enumerate(images):
+            server.transform(image, f"img{idx}.npy", '{"format": "npy"}')
+            # Keep the first result recently used
+            server.transform(images[0], "img0.npy", '{"format": "npy"}')
+
+        total = sum(p.stat().st_size for p in self._entries())
+        self.assertLessEqual(total, 5 * entry_size)
+        self.assertGreater(server.result_cache_evictions, 0)
+        self.assertIn("keras_result_cache_evictions_total", server.render_metrics())
+        hits = server.result_cache_hits
+        server.transform(images[0], "img0.npy", '{"format": "npy"}')
+        self.assertEqual(server.result_cache_hits, hits + 1)
+
+    def test_cache_key_includes_backend(self):
+        """Servers with different Keras backends do not share results."""
+        env = {"DETERMINISTIC": "true", "CACHE_DIR": str(self.cache_dir)}
+        paths = {
+            # pylint: disable-next=protected-access
+            _server(KERAS_BACKEND=backend, **env)._cache_path(b"data", 1, "{}", "npy")
+            for backend in ("tensorflow", "jax")
+        }
+        self.assertEqual(len(paths), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
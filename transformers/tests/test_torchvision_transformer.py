@@ -7,10 +7,13 @@ Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
 import io
 import json
 import logging
+import struct
+import tarfile
 from pathlib import Path
 from typing import Dict
+import numpy as np
 import pytest
-from PIL import Image
+from PIL import Image, ImageChops, ImageStat
 from aistore.sdk.etl import ETLConfig
 from aistore.sdk import Bucket
 from tests.const import (
@@ -70,6 +73,28 @@ def _verify_transformed_image(
     assert etl_transformed == local_transformed, "ETL and local transformations differ"
 
 
+def _verify_transformed_image_close(
+    test_bck: Bucket,
+    image_filename: str,
+    etl_name: str,
+    local_transformed: bytes,
+    max_mean_diff: float,
+) -> None:
+    """
+    Verify that the ETL-transformed image is close to the locally transformed
+    image (same size and mode, mean absolute pixel difference below a bound).
+    """
+    etl_transformed = (
+        test_bck.object(image_filename).get_reader(etl=ETLConfig(etl_name)).read_all()
+    )
+    etl_image = Image.open(io.BytesIO(etl_transformed))
+    local_image = Image.open(io.BytesIO(local_transformed))
+    assert etl_image.format == "JPEG"
+    assert (etl_image.size, etl_image.mode) == (local_image.size, local_image.mode)
+    diff = ImageStat.Stat(ImageChops.difference(etl_image, local_image)).mean[0]
+    assert diff < max_mean_diff, f"ETL and local transformations differ ({diff})"
+
+
 def test_torchvision_transformer_local(
     test_bck: Bucket,
     local_files: Dict[str, Path],
@@ -159,3 +184,272 @@ def test_torchvision_transformer(  # pylint: disable=too-many-arguments,too-many
         etl_name,
         local_transformed,
     )
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_torchvision_transformer_tensor_backend(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate the tensor backend (`IMAGE_BACKEND=tensor`): the output must be
+    close to the PIL-based transformation (different resize implementation).
+    """
+    image_path = next(path for path in local_files.values() if path.suffix == ".jpg")
+    image_filename = _upload_test_image(test_bck, image_path)
+    local_transformed = _get_transformed_image_local(image_path)
+
+    etl_name = etl_factory(
+        tag="torchvision",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="JPEG",
+        IMAGE_BACKEND="tensor",
+        TRANSFORM=json.dumps(
+            {"Resize": {"size": [100, 100]}, "Grayscale": {"num_output_channels": 1}}
+        ),
+    )
+
+    _verify_transformed_image_close(
+        test_bck, image_filename, etl_name, local_transformed, max_mean_diff=5
+    )
+
+
+@pytest.mark.parametrize("image_backend", ["pil", "tensor"])
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_torchvision_transformer_draft_decode(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+    image_backend: str,
+) -> None:
+    """
+    Validate downscaled JPEG decoding (`DRAFT_DECODE=true`) for a Resize-first
+    pipeline: the output must match the full-resolution decode within tolerance.
+    """
+    image_path = next(path for path in local_files.values() if path.suffix == ".jpg")
+    image_filename = _upload_test_image(test_bck, image_path)
+    local_transformed = _get_transformed_image_local(image_path)
+
+    etl_name = etl_factory(
+        tag="torchvision",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="JPEG",
+        IMAGE_BACKEND=image_backend,
+        DRAFT_DECODE="true",
+        TRANSFORM=json.dumps(
+            {"Resize": {"size": [100, 100]}, "Grayscale": {"num_output_channels": 1}}
+        ),
+    )
+
+    _verify_transformed_image_close(
+        test_bck, image_filename, etl_name, local_transformed, max_mean_diff=5
+    )
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_torchvision_transformer_array_output(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate array output formats (`FORMAT=npy`, and `raw` selected per request
+    via etl_args): both must hold the same pixels as the locally transformed image.
+    """
+    image_path = next(path for path in local_files.values() if path.suffix == ".jpg")
+    image_filename = _upload_test_image(test_bck, image_path)
+    expected = np.asarray(
+        Image.open(image_path)
+        .resize((100, 100), Image.Resampling.BILINEAR)
+        .convert("L")
+    )
+
+    etl_name = etl_factory(
+        tag="torchvision",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="npy",
+        TRANSFORM=json.dumps(
+            {"Resize": {"size": [100, 100]}, "Grayscale": {"num_output_channels": 1}}
+        ),
+    )
+    obj = test_bck.object(image_filename)
+
+    npy = obj.get_reader(etl=ETLConfig(etl_name)).read_all()
+    np.testing.assert_array_equal(np.load(io.BytesIO(npy)), expected)
+
+    raw = obj.get_reader(etl=ETLConfig(etl_name, args='{"format": "raw"}')).read_all()
+    assert raw[:4] == b"AIU8"
+    ndim = struct.unpack_from("<I", raw, 4)[0]
+    shape = struct.unpack_from(f"<{ndim}I", raw, 8)
+    image = np.frombuffer(raw, np.uint8, offset=8 + 4 * ndim).reshape(shape)
+    np.testing.assert_array_equal(image, expected)
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_torchvision_transformer_pipeline_override(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate per-request pipelines (`transform` etl_arg): each request gets its
+    own resize target, and repeated or reordered specs give the same output.
+    """
+    image_path = next(path for path in local_files.values() if path.suffix == ".jpg")
+    image_filename = _upload_test_image(test_bck, image_path)
+
+    etl_name = etl_factory(
+        tag="torchvision",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="PNG",
+        TRANSFORM=json.dumps({"Resize": {"size": [100, 100]}}),
+    )
+    obj = test_bck.object(image_filename)
+
+    outputs = {}
+    for size in (64, 128, 64):
+        args = json.dumps(
+            {"transform": {"Resize": {"size": [size, size], "antialias": True}}}
+        )
+        output = obj.get_reader(etl=ETLConfig(etl_name, args=args)).read_all()
+        assert Image.open(io.BytesIO(output)).size == (size, size)
+        outputs.setdefault(size, output)
+        assert outputs[size] == output
+
+    reordered = json.dumps(
+        {"transform": {"Resize": {"antialias": True, "size": [64, 64]}}}
+    )
+    output = obj.get_reader(etl=ETLConfig(etl_name, args=reordered)).read_all()
+    assert output == outputs[64]
+
+    default = obj.get_reader(etl=ETLConfig(etl_name)).read_all()
+    assert Image.open(io.BytesIO(default)).size == (100, 100)
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_torchvision_transformer_webdataset_shard(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate shard mode: image members are transformed (and renamed to `.npy`),
+    other members pass through unchanged, and member order is preserved.
+    """
+    image_path = next(path for path in local_files.values() if path.suffix == ".jpg")
+    image_bytes = image_path.read_bytes()
+    expected_image = np.asarray(
+        Image.open(image_path)
+        .resize((100, 100), Image.Resampling.BILINEAR)
+        .convert("L")
+    )
+
+    members = []
+    for i in range(8):
+        members += [
+            (f"sample{i:04d}.jpg", image_bytes),
+            (f"sample{i:04d}.cls", str(i).encode()),
+            (f"sample{i:04d}.json", json.dumps({"index": i}).encode()),
+        ]
+    shard = io.BytesIO()
+    with tarfile.open(fileobj=shard, mode="w") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name=name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    shard_name = "shard-000000.tar"
+    test_bck.object(shard_name).get_writer().put_content(shard.getvalue())
+
+    etl_name = etl_factory(
+        tag="torchvision",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="npy",
+        WORKERS="4",
+        TRANSFORM=json.dumps(
+            {"Resize": {"size": [100, 100]}, "Grayscale": {"num_output_channels": 1}}
+        ),
+    )
+
+    output = test_bck.object(shard_name).get_reader(etl=ETLConfig(etl_name)).read_all()
+    with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+        outputs = [(m.name, tar.extractfile(m).read()) for m in tar.getmembers()]
+
+    assert [name for name, _ in outputs] == [
+        name.replace(".jpg", ".npy") for name, _ in members
+    ]
+    for (name, data), (_, original) in zip(outputs, members):
+        if name.endswith(".npy"):
+            np.testing.assert_array_equal(np.load(io.BytesIO(data)), expected_image)
+        else:
+            assert data == original
+
+
+@pytest.mark.parametrize("server_type, comm_type, use_fqn", FASTAPI_PARAM_COMBINATIONS)
+def test_torchvision_transformer_variants(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    test_bck: Bucket,
+    local_files: Dict[str, Path],
+    etl_factory,
+    server_type: str,
+    comm_type: str,
+    use_fqn: bool,
+) -> None:
+    """
+    Validate multi-resolution variants: one request returns a tar with one
+    member per variant, each matching the corresponding single-pipeline output.
+    """
+    image_path = next(path for path in local_files.values() if path.suffix == ".jpg")
+    image_filename = _upload_test_image(test_bck, image_path)
+    sizes = (64, 128, 224)
+    variants = {str(size): {"Resize": {"size": [size, size]}} for size in sizes}
+
+    etl_name = etl_factory(
+        tag="torchvision",
+        server_type=server_type,
+        comm_type=comm_type,
+        arg_type="fqn" if use_fqn else "",
+        direct_put=True,
+        FORMAT="PNG",
+        VARIANTS=json.dumps(variants),
+    )
+    obj = test_bck.object(image_filename)
+
+    output = obj.get_reader(etl=ETLConfig(etl_name)).read_all()
+    with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+        outputs = {m.name: tar.extractfile(m).read() for m in tar.getmembers()}
+    assert list(outputs) == [f"test-image.{size}.png" for size in sizes]
+
+    for size in sizes:
+        args = json.dumps({"transform": variants[str(size)]})
+        single = obj.get_reader(etl=ETLConfig(etl_name, args=args)).read_all()
+        assert outputs[f"test-image.{size}.png"] == single
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the Torchvision ETL Transformer (FastAPI).
+
+Runs the TorchvisionServer in-process and checks the Content-Type of the
+responses: per-request `format` and `variants` etl_args change the output, so
+every request reports its own MIME type (a tar for shards), in buffered and
+streaming modes.
+
+Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+"""
+
+import io
+import json
+import os
+import tarfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+# Set environment variables before importing the server
+os.environ["AIS_TARGET_URL"] = "http://localhost:8080"
+os.environ["TRANSFORM"] = json.dumps({"Resize": {"size": [32, 32]}})
+
+# pylint: disable-next=wrong-import-position
+import torchvision_preprocess.fastapi_server as server_module
+
+VARIANTS = {"16": {"Resize": {"size": [16, 16]}}, "8": {"Resize": {"size": [8, 8]}}}
+
+# etl_args -> expected Content-Type (server defaults: `FORMAT=JPEG`, no variants)
+CASES = (
+    (None, "image/jpeg"),
+    ({"format": "PNG"}, "image/png"),
+    ({"format": "npy"}, "application/octet-stream"),
+    ({"format": "safetensors"}, "application/octet-stream"),
+    ({"variants": VARIANTS}, "application/x-tar"),
+)
+
+
+def _image() -> bytes:
+    """Return a small JPEG image."""
+    pixels = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _shard(data: bytes) -> bytes:
+    """Return a tar shard with the image as its only member."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        member = tarfile.TarInfo("sample.jpg")
+        member.size = len(data)
+        tar.addfile(member, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class TestMimeType(unittest.TestCase):
+    """Test cases for per-request response MIME types."""
+
+    @staticmethod
+    def _client(**env) -> TestClient:
+        """Return a client of a server configured by `env`."""
+        with mock.patch.dict(os.environ, env):
+            return TestClient(server_module.TorchvisionServer().app)
+
+    def _check(self, client: TestClient, path: str, data: bytes, etl_args, expected):
+        params = {"etl_args": json.dumps(etl_args)} if etl_args else None
+        response = client.put(path, content=data, params=params)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.headers["content-type"], expected)
+
+    def test_request_mime_type(self):
+        """Each response reports the MIME type of its own output."""
+        data = _image()
+        for streaming in ("false", "true"):
+            client = self._client(STREAMING=streaming)
+            # Interleave requests so that no request sees another one's type
+            for etl_args, expected in CASES + CASES[::-1]:
+                with self.subTest(streaming=streaming, etl_args=etl_args):
+                    self._check(client, "/bck/img.jpg", data, etl_args, expected)
+
+    def test_shard_mime_type(self):
+        """Tar shards are returned as tars, whatever the output format."""
+        shard = _shard(_image())
+        for streaming in ("false", "true"):
+            client = self._client(STREAMING=streaming)
+            for etl_args, _ in CASES:
+                with self.subTest(streaming=streaming, etl_args=etl_args):
+                    self._check(
+                        client, "/bck/shard.tar", shard, etl_args, "application/x-tar"
+                    )
+
+    def test_env_mime_type(self):
+        """Without etl_args, the MIME type follows `FORMAT` and `VARIANTS`."""
+        data = _image()
+        self._check(
+            self._client(FORMAT="npy"),
+            "/bck/img.jpg",
+            data,
+            None,
+            "application/octet-stream",
+        )
+        self._check(
+            self._client(VARIANTS=json.dumps(VARIANTS)),
+            "/bck/img.jpg",
+            data,
+            None,
+            "application/x-tar",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
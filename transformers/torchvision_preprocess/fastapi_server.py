@@ -11,25 +11,87 @@ FastAPI-based ETL server that transforms images using torchvision library.
 Supports configurable image transformations and compression.
 
 Environment Variables:
-    TRANSFORM          - JSON string with torchvision transformations (required)
+    TRANSFORM          - JSON string with torchvision transformations
+                        (required unless VARIANTS is set)
                         Ex: {"Resize": {"size": [224, 224]}, "Grayscale": {"num_output_channels": 1}}  # pylint: disable=line-too-long
-    FORMAT             - Output image format (JPEG, PNG, etc.)
+    VARIANTS           - JSON object mapping variant names to pipelines (same
+                        syntax as TRANSFORM); each image is decoded once and
+                        every variant is written as `<key>.<variant>.<ext>`
+                        Ex: {"64": {"Resize": {"size": [64, 64]}}, "224": {"Resize": {"size": [224, 224]}}}  # pylint: disable=line-too-long
+    FORMAT             - Output image format (JPEG, PNG, etc.), or an array format
+                        written without encoding: "npy", "safetensors" or "raw"
                         Default: "JPEG"
+    IMAGE_BACKEND      - "pil" (decode/encode with PIL, `transforms` on PIL images)
+                        or "tensor" (decode/encode with `torchvision.io`,
+                        `transforms.v2` on uint8 tensors)
+                        Default: "pil"
+    WORKERS            - Threads processing the image members of a tar shard
+                        Default: CPU count
+    STREAMING          - "true" to stream tar shards through `transform_stream`
+                        Default: "false"
+    DRAFT_DECODE       - "true" to decode JPEGs at a reduced DCT scale when the
+                        pipeline starts with a downscale (Resize/RandomResizedCrop)
+                        Default: "false"
+    PIPELINE_CACHE_SIZE - Number of per-request pipelines (`transform` etl_arg)
+                        kept compiled in an LRU cache
+                        Default: 32
 
 Copyright (c) 2023, NVIDIA CORPORATION. All rights reserved.
 """
 
+import copy
 import json
 import io
+import math
 import os
+import re
 import sys
+import tarfile
+from collections import deque
 from collections.abc import Iterable
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import numpy as np
+import torch  # pylint: disable=import-error
 from PIL import Image  # pylint: disable=import-error
-from torchvision import transforms  # pylint: disable=import-error
+from torchvision import io as tvio, transforms  # pylint: disable=import-error
+from torchvision.transforms import v2  # pylint: disable=import-error
+from torchvision.transforms.v2 import functional as F  # pylint: disable=import-error
+from fastapi import Response
 from aistore.sdk.etl.webserver.fastapi_server import FastAPIServer
 
+from common.array_formats import (
+    ARRAY_FORMATS,
+    FORMAT_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    encode_array,
+    output_mime_type,
+)
+from common.server_utils import (
+    TAR_EXTENSIONS,
+    TAR_MIME,
+    StreamingTarBuffer,
+    completed,
+    env_flag,
+    render_cache_metrics,
+    request_mime_type,
+    set_request_mime_type,
+    streaming_enabled,
+)
+
 # Patch collections.Iterable for Python 3.13 compatibility
 if sys.version_info >= (3, 13):
     import collections
@@ -37,85 +99,570 @@ if sys.version_info >= (3, 13):
     collections.Iterable = Iterable
 
 
-class TorchvisionServer(FastAPIServer):
+IMAGE_BACKENDS = ("pil", "tensor")
+
+# Variant names become part of the member extension (`<key>.<variant>.<ext>`)
+VARIANT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Formats encoded natively by `torchvision.io`; others go through PIL
+TENSOR_ENCODERS = {
+    "JPEG": tvio.encode_jpeg,
+    "JPG": tvio.encode_jpeg,
+    "PNG": tvio.encode_png,
+}
+
+# First pipeline ops that only shrink the image, allowing a downscaled decode
+RESIZE_TRANSFORMS = (transforms.Resize, v2.Resize)
+RESIZED_CROP_TRANSFORMS = (transforms.RandomResizedCrop, v2.RandomResizedCrop)
+
+
+def _to_array(
+    output: Union[Image.Image, torch.Tensor], output_format: str
+) -> np.ndarray:
+    """
+    Convert the pipeline output to a NumPy array, in the layout it was produced in.
+
+    PIL images become HWC arrays (HW for single-channel images), tensors keep
+    their CHW layout and dtype. The `raw` format is always uint8: floating-point
+    tensors are scaled from [0, 1] to [0, 255].
+    """
+    if isinstance(output, torch.Tensor):
+        if output_format.lower() == "raw" and output.dtype != torch.uint8:
+            output = F.to_dtype(output, torch.uint8, scale=True)
+        return output.numpy()
+    return np.asarray(output)
+
+
+def _draft_size(
+    pipeline: transforms.Compose, width: int, height: int
+) -> Optional[Tuple[int, int]]:
+    """
+    Return the smallest decode size that keeps the pipeline output unchanged.
+
+    Only applies when the first op of the pipeline downscales the image:
+    - Resize: the decoded image must stay at least as large as the target
+    - RandomResizedCrop: even the smallest possible crop (`scale[0]` of the
+      area at the extreme aspect ratios) must stay at least as large as the target
+
+    Args:
+        pipeline: Compiled transform pipeline.
+        width: Original image width.
+        height: Original image height.
+
+    Returns:
+        Minimum `(width, height)` to decode at, or None if no reduction applies.
+    """
+    if not pipeline.transforms:
+        return None
+    first = pipeline.transforms[0]
+    if isinstance(first, RESIZE_TRANSFORMS) and first.size:
+        size = [first.size] if isinstance(first.size, int) else list(first.size)
+        if len(size) == 1:
+            # Shorter side is resized to `size`, aspect ratio preserved
+            factor = min(width, height) / size[0]
+        else:
+            factor = min(width / size[1], height / size[0])
+    elif isinstance(first, RESIZED_CROP_TRANSFORMS):
+        target_height, target_width = first.size
+        min_area = first.scale[0] * width * height
+        min_crop_width = math.sqrt(min_area * first.ratio[0])
+        min_crop_height = math.sqrt(min_area / first.ratio[1])
+        factor = min(min_crop_width / target_width, min_crop_height / target_height)
+    else:
+        return None
+    if factor < 2:
+        return None  # JPEG DCT scaling starts at 1/2
+    return math.ceil(width / factor), math.ceil(height / factor)
+
+
+def _output_name(name: str, output_format: str, variant: Optional[str] = None) -> str:
+    """
+    Rename a tar member so that its extension matches the output format.
+
+    With a variant, the variant name is inserted before the extension, so that
+    every variant is a separate member of the same WebDataset sample.
+    """
+    stem, ext = os.path.splitext(name)
+    extensions = FORMAT_EXTENSIONS.get(output_format.lower())
+    if extensions is not None and ext.lower() not in extensions:
+        ext = extensions[0]
+    return f"{stem}.{variant}{ext}" if variant else stem + ext
+
+
+def _tar_members(members: List[Tuple[tarfile.TarInfo, bytes]]) -> bytes:
+    """Write members into an in-memory tar archive."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for member, data in members:
+            tar.addfile(member, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _draft_size_all(
+    pipelines: List[transforms.Compose], width: int, height: int
+) -> Optional[Tuple[int, int]]:
+    """Return the smallest decode size that keeps the output of every pipeline unchanged."""
+    sizes = [_draft_size(pipeline, width, height) for pipeline in pipelines]
+    if not sizes or any(size is None for size in sizes):
+        return None
+    return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+
+class _RequestOptions(NamedTuple):
+    """Transform options of a request (environment defaults overridden by etl_args)."""
+
+    pipeline: Callable
+    # Variant name -> pipeline, if the request asks for several variants
+    variants: Optional[Dict[str, Callable]]
+    output_format: str
+
+
+def _normalize_pipeline_spec(spec: Union[str, Dict[str, Any]]) -> str:
+    """
+    Return the canonical JSON of a transform pipeline spec, used as its cache key.
+
+    Transform order is significant and kept; the parameters of each transform
+    are sorted, so equivalent specs map to the same key regardless of key order
+    or whitespace.
+    """
+    if isinstance(spec, str):
+        spec = json.loads(spec)
+    if not isinstance(spec, dict) or not all(
+        isinstance(params, dict) for params in spec.values()
+    ):
+        raise ValueError(
+            "Transform spec must map transform names to parameter dictionaries"
+        )
+    return (
+        "{"
+        + ",".join(
+            json.dumps(name)
+            + ":"
+            + json.dumps(params, sort_keys=True, separators=(",", ":"))
+            for name, params in spec.items()
+        )
+        + "}"
+    )
+
+
+class TorchvisionServer(FastAPIServer):  # pylint: disable=too-many-instance-attributes
     """Server for applying torchvision transforms to images."""
 
     def __init__(self):
         """Initialize the server with transform configuration."""
         super().__init__()
         self.transform_format = os.environ.get("FORMAT", "JPEG")
+        self.image_backend = os.environ.get("IMAGE_BACKEND", "pil").lower()
+        if self.image_backend not in IMAGE_BACKENDS:
+            raise ValueError(
+                f"Invalid IMAGE_BACKEND: {self.image_backend} "
+                f"(expected one of {', '.join(IMAGE_BACKENDS)})"
+            )
+        self.draft_decode = env_flag("DRAFT_DECODE")
+        # Pipelines given per request (`transform`/`variants` etl_args) are
+        # compiled once per normalized spec and kept in a bounded LRU cache
+        self._compile_pipeline = lru_cache(
+            maxsize=int(os.environ.get("PIPELINE_CACHE_SIZE", "32"))
+        )(self._create_transform_pipeline)
+
         transform_config = os.environ.get("TRANSFORM")
-        if not transform_config:
+        variants_config = os.environ.get("VARIANTS")
+        if not transform_config and not variants_config:
             raise ValueError("TRANSFORM environment variable is required")
-        self.transform_pipeline = self._create_transform_pipeline(transform_config)
+        self.transform_pipeline = self._create_transform_pipeline(
+            transform_config or "{}"
+        )
+        self.variants = (
+            self._create_variants(variants_config) if variants_config else None
+        )
+
+        self.use_streaming = streaming_enabled()
+
+        # Pool processing the image members of tar shards (PIL and torch
+        # release the GIL while decoding, resizing and encoding)
+        self.workers = max(1, int(os.environ.get("WORKERS", str(os.cpu_count()))))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _setup_app(self):
+        """Register the `/metrics` route ahead of the catch-all object routes."""
+
+        @self.app.get("/metrics")
+        async def metrics():
+            return Response(
+                content=self.render_metrics(), media_type="text/plain; version=0.0.4"
+            )
+
+        super()._setup_app()
+
+    def render_metrics(self) -> str:
+        """Return pipeline cache metrics in Prometheus text format."""
+        return render_cache_metrics(
+            "torchvision_pipeline_cache", self._compile_pipeline.cache_info()
+        )
 
     def _create_transform_pipeline(self, transform_config: str) -> transforms.Compose:
-        """Create a torchvision transform pipeline from configuration."""
+        """
+        Create a torchvision transform pipeline from configuration.
+
+        The tensor backend builds the pipeline from `transforms.v2`, whose
+        transforms operate directly on uint8 tensors.
+        """
         try:
             config_dict = json.loads(transform_config)
         except json.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON in transform configuration: {e}") from e
 
+        module = v2 if self.image_backend == "tensor" else transforms
         transform_list = []
         for transform_name, params in config_dict.items():
             try:
-                transform_class = getattr(transforms, transform_name)
+                transform_class = getattr(module, transform_name)
             except AttributeError as exc:
                 raise ValueError(f"Unknown transform: {transform_name}") from exc
+            # JSON cannot express dtypes: resolve names like "float32" (ToDtype)
+            if isinstance(params.get("dtype"), str):
+                params = {**params, "dtype": getattr(torch, params["dtype"], None)}
             try:
                 transform_list.append(transform_class(**params))
             except Exception as e:
                 raise ValueError(f"Invalid parameters for {transform_name}: {e}") from e
-        return transforms.Compose(transform_list)
+        return module.Compose(transform_list)
+
+    def _create_variants(
+        self, variants_config: Union[str, Dict[str, Any]]
+    ) -> Dict[str, Callable]:
+        """
+        Compile the pipeline of every variant (through the pipeline cache).
+
+        Raises:
+            ValueError: If the variants spec or a variant name is invalid
+        """
+        if isinstance(variants_config, str):
+            try:
+                variants_config = json.loads(variants_config)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON in variants configuration: {e}") from e
+        if not isinstance(variants_config, dict) or not variants_config:
+            raise ValueError("Variants must map variant names to transform pipelines")
+        variants = {}
+        for name, spec in variants_config.items():
+            if not VARIANT_NAME_PATTERN.match(name):
+                raise ValueError(
+                    f"Invalid variant name: {name!r} (letters, digits, '_' and '-')"
+                )
+            variants[name] = self._compile_pipeline(_normalize_pipeline_spec(spec))
+        return variants
+
+    def _open_draft(self, data: bytes, *pipelines: Callable) -> Optional[Image.Image]:
+        """
+        Open a JPEG for a downscaled decode (PIL `draft`), if the pipelines allow it.
+
+        Returns:
+            The lazily decoded image configured for the largest DCT scale factor
+            (1/2, 1/4 or 1/8) that keeps it above the size every pipeline needs,
+            or None if draft decoding does not apply.
+        """
+        if not self.draft_decode or not data.startswith(b"\xff\xd8"):
+            return None
+        image = Image.open(io.BytesIO(data))
+        size = _draft_size_all(list(pipelines), *image.size)
+        if size is None or image.format != "JPEG":
+            return None
+        image.draft(image.mode, size)
+        return image
+
+    def _decode(
+        self, data: bytes, *pipelines: Callable
+    ) -> Union[Image.Image, torch.Tensor]:
+        """
+        Decode image bytes for the configured backend (and `pipelines`, for draft decoding).
+
+        Returns:
+            A PIL image (pil backend) or a uint8 CHW tensor (tensor backend).
+        """
+        draft = self._open_draft(data, *pipelines)
+        if self.image_backend == "pil":
+            return draft or Image.open(io.BytesIO(data))
+        if draft is not None:
+            return F.pil_to_tensor(draft)
+        return tvio.decode_image(
+            torch.frombuffer(bytearray(data), dtype=torch.uint8),
+            mode=tvio.ImageReadMode.UNCHANGED,
+        )
+
+    @staticmethod
+    def _encode(output: Union[Image.Image, torch.Tensor], output_format: str) -> bytes:
+        """
+        Encode the pipeline output as an image or an array (`npy`, `safetensors`, `raw`).
+
+        Tensors are encoded to JPEG and PNG with `torchvision.io`, so the image
+        never goes through PIL; other image formats fall back to PIL.
+        """
+        if output_format.lower() in ARRAY_FORMATS:
+            return encode_array(_to_array(output, output_format), output_format)
+
+        if isinstance(output, torch.Tensor):
+            if output.is_floating_point():
+                output = F.to_dtype(output, torch.uint8, scale=True)
+            encoder = TENSOR_ENCODERS.get(output_format.upper())
+            if encoder is not None:
+                return encoder(output).numpy().tobytes()
+            output = F.to_pil_image(output)
+
+        img_byte_arr = io.BytesIO()
+        output.save(img_byte_arr, format=output_format)
+        return img_byte_arr.getvalue()
+
+    def _transform_image(
+        self, data: bytes, pipeline: Callable, output_format: str
+    ) -> bytes:
+        """Decode, apply the transform pipeline and encode a single image."""
+        return self._encode(pipeline(self._decode(data, pipeline)), output_format)
+
+    def _transform_variants(
+        self, data: bytes, variants: Dict[str, Callable], output_format: str
+    ) -> List[Tuple[str, bytes]]:
+        """
+        Decode an image once and encode the output of every variant pipeline.
+
+        Returns:
+            `(variant name, encoded output)` pairs, in the configured order.
+        """
+        image = self._decode(data, *variants.values())
+        if isinstance(image, Image.Image):
+            image.load()  # Decode once, not lazily in the first variant
+        return [
+            (name, self._encode(pipeline(image), output_format))
+            for name, pipeline in variants.items()
+        ]
+
+    def _transform_member(
+        self, member: tarfile.TarInfo, data: bytes, options: _RequestOptions
+    ) -> List[Tuple[tarfile.TarInfo, bytes]]:
+        """
+        Transform an image member of a tar shard into one output member per
+        variant (or a single one), renamed for the output format.
+        """
+        try:
+            if options.variants:
+                outputs = self._transform_variants(
+                    data, options.variants, options.output_format
+                )
+            else:
+                outputs = [
+                    (
+                        None,
+                        self._transform_image(
+                            data, options.pipeline, options.output_format
+                        ),
+                    )
+                ]
+        except Exception as e:
+            raise RuntimeError(f"Error transforming {member.name}: {str(e)}") from e
+
+        members = []
+        for variant, output in outputs:
+            out_member = copy.copy(member)
+            out_member.name = _output_name(member.name, options.output_format, variant)
+            out_member.size = len(output)
+            members.append((out_member, output))
+        return members
+
+    def _transform_tar_stream(
+        self, reader: BinaryIO, options: _RequestOptions
+    ) -> Iterator[bytes]:
+        """
+        Transform the image members of a tar (WebDataset) shard in parallel.
+
+        The input is read in streaming mode (`r|*`) and image members are
+        processed by `WORKERS` threads, with at most `2 * WORKERS` members in
+        flight. Results are written to the output shard (`w|`) in input order;
+        non-image members (e.g., `.cls`, `.json`) are passed through unchanged.
+        With variants, every image member yields one member per variant.
+
+        Args:
+            reader: File-like object containing the tar shard.
+            options: Pipeline, variants and output format of the request.
+
+        Yields:
+            Chunks of the transformed tar shard.
+        """
+        in_flight: deque = deque()
+        buf = StreamingTarBuffer()
+        with tarfile.open(fileobj=reader, mode="r|*") as input_tar, tarfile.open(
+            fileobj=buf, mode="w|"
+        ) as output_tar:
+            for member in input_tar:
+                if not member.isfile():
+                    continue
+                data = input_tar.extractfile(member).read()
+                if member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    in_flight.append(
+                        self._pool.submit(self._transform_member, member, data, options)
+                    )
+                else:
+                    in_flight.append(completed([(member, data)]))
+
+                # Write completed members in order, bounding the work in flight
+                while in_flight and (
+                    in_flight[0].done() or len(in_flight) >= 2 * self.workers
+                ):
+                    for out_member, out_data in in_flight.popleft().result():
+                        output_tar.addfile(out_member, io.BytesIO(out_data))
+                chunk = buf.drain()
+                if chunk:
+                    yield chunk
+
+            while in_flight:
+                for out_member, out_data in in_flight.popleft().result():
+                    output_tar.addfile(out_member, io.BytesIO(out_data))
+
+        # Yield the remaining members and the end-of-archive markers
+        chunk = buf.drain()
+        if chunk:
+            yield chunk
+
+    def _transform_object(
+        self, data: bytes, path: str, options: _RequestOptions
+    ) -> bytes:
+        """
+        Transform a single image: encoded output, or a tar with one member per
+        variant (`<name>.<variant>.<ext>`) when variants are requested.
+        """
+        try:
+            if not options.variants:
+                return self._transform_image(
+                    data, options.pipeline, options.output_format
+                )
+            name = os.path.basename(path) or "image"
+            return _tar_members(
+                self._transform_member(tarfile.TarInfo(name), data, options)
+            )
+        except Exception as e:
+            raise RuntimeError(f"Error transforming image: {str(e)}") from e
+
+    @staticmethod
+    def _is_tar_file(path: str) -> bool:
+        """Return True if the object path has a tar archive extension."""
+        return path.lower().endswith(TAR_EXTENSIONS)
+
+    def _parse_etl_args(self, etl_args: Optional[str]) -> _RequestOptions:
+        """
+        Return the transform options of a request.
+
+        The `transform` etl_arg (same syntax as `TRANSFORM`) replaces the
+        configured pipeline and `variants` (same syntax as `VARIANTS`) the
+        configured variants; compiled pipelines are looked up in the LRU cache
+        by their normalized spec. The `format` etl_arg overrides `FORMAT`.
+
+        Raises:
+            ValueError: If the `transform` or `variants` spec is invalid
+        """
+        options = _RequestOptions(
+            self.transform_pipeline, self.variants, self.transform_format
+        )
+        if not etl_args:
+            return options
+        try:
+            args_dict = json.loads(etl_args)
+        except json.JSONDecodeError:
+            return options  # Ignore invalid JSON and use defaults
+        if not isinstance(args_dict, dict):
+            return options
+        if args_dict.get("transform"):
+            options = options._replace(
+                pipeline=self._compile_pipeline(
+                    _normalize_pipeline_spec(args_dict["transform"])
+                ),
+                variants=None,
+            )
+        if args_dict.get("variants"):
+            options = options._replace(
+                variants=self._create_variants(args_dict["variants"])
+            )
+        if args_dict.get("format"):
+            options = options._replace(output_format=args_dict["format"])
+        return options
 
     def transform(
-        self, data: bytes, _path: str, etl_args: Optional[str] = None
-    ) -> bytes:  # pylint: disable=unused-argument
+        self, data: bytes, path: str, etl_args: Optional[str] = None
+    ) -> bytes:
         """
         Transform the input image data using the configured transform pipeline.
 
+        Tar archives (e.g., WebDataset shards) are transformed member by member.
+        With variants, a single image is returned as a tar of its variants.
+
         Args:
-            data: Input image data as bytes
-             _path: Path to the object (unused)
+            data: Input image data (or tar shard) as bytes
+            path: Path to the object
             etl_args: Optional JSON string with additional arguments
-                     Ex: {"format": "PNG"}
+                     Ex: {"format": "PNG", "transform": {"Resize": {"size": 64}}}
+                     or {"variants": {"64": {"Resize": {"size": 64}}, ...}}
 
         Returns:
-            Transformed image data as bytes
+            Transformed image data (or tar shard) as bytes
 
         Raises:
             RuntimeError: If image transformation fails
         """
-        try:
-            # Parse etl_args if provided
-            format_override = None
-            if etl_args:
-                try:
-                    args_dict = json.loads(etl_args)
-                    format_override = args_dict.get("format")
-                except json.JSONDecodeError:
-                    pass  # Ignore invalid JSON and use default format
-
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(data))
-
-            # Apply transform pipeline
-            transformed_image = self.transform_pipeline(image)
-
-            # Convert back to bytes
-            output_format = format_override or self.transform_format
-            img_byte_arr = io.BytesIO()
-            transformed_image.save(img_byte_arr, format=output_format)
-            return img_byte_arr.getvalue()
+        options = self._parse_etl_args(etl_args)
+        self._set_mime_type(path, options)
+        if self._is_tar_file(path):
+            return b"".join(self._transform_tar_stream(io.BytesIO(data), options))
+        return self._transform_object(data, path, options)
 
-        except Exception as e:
-            raise RuntimeError(f"Error transforming image: {str(e)}") from e
+    def transform_stream(
+        self, reader: BinaryIO, path: str, etl_args: Optional[str] = None
+    ) -> Iterator[bytes]:
+        """
+        Transform the input stream (used when `STREAMING=true`).
+
+        Tar shards are read, transformed and emitted member by member, so the
+        output starts flowing before the whole shard has arrived. Single
+        images are read fully and transformed as in `transform`.
+
+        Args:
+            reader: File-like object with the request payload
+            path: Path to the object
+            etl_args: Optional JSON string with additional arguments
+
+        Returns:
+            Iterator over chunks of the transformed image or tar shard.
+
+        etl_args are parsed before the output generator is returned, so that
+        invalid options fail the request before it starts and `get_mime_type`
+        sees the request's output.
+        """
+        options = self._parse_etl_args(etl_args)
+        self._set_mime_type(path, options)
+        return self._stream(reader, path, options)
+
+    def _stream(
+        self, reader: BinaryIO, path: str, options: _RequestOptions
+    ) -> Iterator[bytes]:
+        """Yield the transformed stream (see `transform_stream`)."""
+        if self._is_tar_file(path):
+            yield from self._transform_tar_stream(reader, options)
+            return
+        yield self._transform_object(reader.read(), path, options)
+
+    def _set_mime_type(self, path: str, options: _RequestOptions):
+        """Record the response's MIME type for `get_mime_type`."""
+        set_request_mime_type(
+            TAR_MIME
+            if options.variants or self._is_tar_file(path)
+            else output_mime_type(options.output_format)
+        )
 
     def get_mime_type(self) -> str:
         """
-        Return the MIME type for the transformed image data.
+        Return the MIME type of the current request's output (a tar for shards
+        and variants).
         """
-        return "image/jpeg"
+        return request_mime_type(
+            TAR_MIME if self.variants else output_mime_type(self.transform_format)
+        )
 
 
 # Create the server instance and expose the FastAPI app
@@ -2,9 +2,34 @@
 
 """
 HTTP server for torchvision preprocessing transformations.
+
+Requests are handled by a fixed pool of worker threads fed from a bounded
+queue: when all workers are busy and the queue is full, the accept loop
+blocks (back-pressure through the listen backlog) instead of spawning more
+threads. The server speaks HTTP/1.1 so that AIS can reuse its connections;
+a worker handles one request at a time, and idle keep-alive connections are
+watched by a selector thread, so they do not hold on to workers (requests a
+client pipelined are served before the connection is handed to the
+selector). Objects are fetched from AIS (hpull) through a shared
+`requests.Session` whose connection pool keeps HTTP/1.1 connections alive.
+
+Environment Variables:
+    AIS_TARGET_URL    - AIStore target URL (required)
+    FORMAT            - Output image format (PNG, JPEG, etc.) (required)
+    TRANSFORM         - JSON string with torchvision transformations (required);
+                        applied to the PIL image, or to a tensor (ToTensor ->
+                        transforms -> ToPILImage) if the pipeline contains a
+                        tensor-only transform (e.g., Normalize, RandomErasing)
+    WORKERS           - Number of worker threads (default: 2 * CPU count)
+    QUEUE_SIZE        - Accepted connections waiting for a worker
+                        (default: 2 * WORKERS)
+    KEEPALIVE_TIMEOUT - Seconds an idle keep-alive connection is kept open
+                        (default: 5)
+    REQUEST_TIMEOUT   - Timeout in seconds for fetching objects from AIS
+                        (default: 10)
 """
 
-# pylint: disable=missing-class-docstring,missing-function-docstring,invalid-name,broad-exception-caught,missing-timeout,import-error
+# pylint: disable=missing-class-docstring,missing-function-docstring,invalid-name,broad-exception-caught,import-error
 
 #
 # Copyright (c) 2023, NVIDIA CORPORATION. All rights reserved.
@@ -15,11 +40,16 @@ import io
 import json
 import logging
 import os
+import queue
+import selectors
+import socket
+import threading
+import time
 
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from socketserver import ThreadingMixIn
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from PIL import Image
 from torchvision import transforms
@@ -29,6 +59,11 @@ transform_format = os.environ["FORMAT"]
 transform_json = os.environ["TRANSFORM"]
 transform_dict = json.loads(transform_json)
 
+workers = int(os.getenv("WORKERS", str(2 * (os.cpu_count() or 1))))
+queue_size = int(os.getenv("QUEUE_SIZE", str(2 * workers)))
+keepalive_timeout = float(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+request_timeout = float(os.getenv("REQUEST_TIMEOUT", "10"))
+
 # Create a list to hold the transformations
 transform_list = []
 
@@ -43,75 +78,188 @@ for transform_name, params in transform_dict.items():
     # Add the transform instance to the list
     transform_list.append(transform_instance)
 
+# Transforms that only accept tensors. Pipelines with one of them run on a
+# tensor (ToTensor -> transforms -> ToPILImage); others run on the PIL image,
+# which torchvision transforms accept directly.
+TENSOR_ONLY_TRANSFORMS = (
+    transforms.Normalize,
+    transforms.RandomErasing,
+    transforms.LinearTransformation,
+    transforms.ConvertImageDtype,
+)
+if any(isinstance(t, TENSOR_ONLY_TRANSFORMS) for t in transform_list):
+    transform_list = [transforms.ToTensor(), *transform_list, transforms.ToPILImage()]
+
 # Combine the transformations into a single transform
 transform = transforms.Compose(transform_list)
 
+# Shared session: at most one pooled keep-alive connection per worker toward AIS
+adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, pool_block=True)
+session = requests.Session()
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
+
+def transform_image(image_bytes):
+    image = Image.open(io.BytesIO(image_bytes))
+    transformed_image = transform(image)
+    byte_arr = io.BytesIO()
+    transformed_image.save(byte_arr, format=transform_format)
+    return byte_arr.getvalue()
+
 
 class Handler(BaseHTTPRequestHandler):
+    # Keep connections from AIS alive between requests; every response must
+    # therefore carry a Content-Length
+    protocol_version = "HTTP/1.1"
+    # Socket timeout while reading a request
+    timeout = keepalive_timeout
+
+    def handle(self):
+        # One request per dispatch: the server hands the connection back to a
+        # worker when the next request arrives
+        self.close_connection = True
+        self.handle_one_request()
+
+    def finish(self):
+        # Keep the connection's streams open between requests
+        if self.close_connection:
+            super().finish()
+
     def log_request(self, code="-", size="-"):
         # Don't log successful requests info. Unsuccessful logged by log_error().
         pass
 
-    def _set_headers(self):
-        self.send_response(200)
-        self.send_header("Content-Type", "application/octet-stream")
+    def _send(self, code, body, content_type="application/octet-stream"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
+        self.wfile.write(body)
 
-    def transform_image(self, image_bytes):
-        # Convert bytes to PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        # Convert the PIL image to a PyTorch tensor
-        tensor_transform = transforms.ToTensor()
-        tensor = tensor_transform(image)
-        # Apply the transformation
-        transformed_tensor = transform(tensor)
-        # Convert the transformed tensor back to a PIL image
-        pil_transform = transforms.ToPILImage()
-        transformed_image = pil_transform(transformed_tensor)
-        # Convert the PIL image back to bytes
-        byte_arr = io.BytesIO()
-        transformed_image.save(byte_arr, format=transform_format)
-        # Get the byte array
-        transformed_image_bytes = byte_arr.getvalue()
-
-        return transformed_image_bytes
+    def has_buffered_request(self):
+        """
+        Return whether the next request has already been read off the socket.
+
+        A client pipelining requests may send the next one along with the
+        previous; it then sits in `rfile`'s buffer, where the selector watching
+        idle connections would never see it. Peeks without blocking.
+        """
+        timeout = self.connection.gettimeout()
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(timeout)
+
+    def _send_error(self, method, err):
+        logging.error("Error processing %s request: %s", method, str(err))
+        self._send(500, b"Data processing failed", "text/plain")
 
     def do_PUT(self):
         try:
             content_length = int(self.headers["Content-Length"])
             put_data = self.rfile.read(content_length)
-            self._set_headers()
-            self.wfile.write(self.transform_image(put_data))
+            self._send(200, transform_image(put_data))
         except Exception as e:
-            logging.error("Error processing PUT request: %s", str(e))
-            self.send_response(500)
-            self.end_headers()
-            self.wfile.write(b"Data processing failed")
+            self._send_error("PUT", e)
 
     def do_GET(self):
+        if self.path == "/health":
+            self._send(200, b"Running", "text/plain")
+            return
         try:
-            if self.path == "/health":
-                self._set_headers()
-                self.wfile.write(b"Running")
-                return
-
-            response = requests.get(host_target + self.path, timeout=10)
-            self._set_headers()
-            self.wfile.write(self.transform_image(response.content))
+            response = session.get(host_target + self.path, timeout=request_timeout)
+            response.raise_for_status()
+            self._send(200, transform_image(response.content))
         except Exception as e:
-            logging.error("Error processing GET request: %s", str(e))
-            self.send_response(500)
-            self.end_headers()
-            self.wfile.write(b"Data processing failed")
+            self._send_error("GET", e)
+
+
+class PooledHTTPServer(HTTPServer):
+    """Handle requests with a fixed pool of worker threads and a bounded queue."""
 
+    # Let pending connections wait in the kernel while the queue is full
+    request_queue_size = 128
 
-class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
-    """Handle requests in a separate thread."""
+    def __init__(self, server_address, handler_class, num_workers, max_queued):
+        super().__init__(server_address, handler_class)
+        # (socket, client address, handler or None for a new connection)
+        self._requests = queue.Queue(maxsize=max_queued)
+        # Handlers of idle keep-alive connections, registered by the watcher
+        self._idle = queue.SimpleQueue()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        for i in range(num_workers):
+            threading.Thread(
+                target=self._worker, name=f"worker-{i}", daemon=True
+            ).start()
+        threading.Thread(target=self._watch_idle, name="idle", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        # Blocks the accept loop while the queue is full
+        self._requests.put((request, client_address, None))
+
+    def _worker(self):
+        while True:
+            request, client_address, handler = self._requests.get()
+            try:
+                if handler is None:
+                    # Sets up the connection's streams and handles the first request
+                    handler = self.RequestHandlerClass(request, client_address, self)
+                else:
+                    handler.handle()
+                    handler.finish()
+                # Serve pipelined requests before parking the connection
+                while not handler.close_connection and handler.has_buffered_request():
+                    handler.handle()
+                    handler.finish()
+            except Exception:
+                self.handle_error(request, client_address)
+                self.shutdown_request(request)
+                continue
+            if handler.close_connection:
+                self.shutdown_request(request)
+            else:
+                self._idle.put(handler)
+                self._wakeup_w.send(b"\0")
+
+    def _watch_idle(self):
+        """Re-queue keep-alive connections when their next request arrives."""
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        parked = {}
+        while True:
+            for key, _ in selector.select(timeout=1):
+                if key.fileobj is self._wakeup_r:
+                    self._wakeup_r.recv(4096)
+                    while not self._idle.empty():
+                        handler = self._idle.get()
+                        parked[handler.request] = (handler, time.monotonic())
+                        selector.register(handler.request, selectors.EVENT_READ)
+                    continue
+                handler, _ = parked.pop(key.fileobj)
+                selector.unregister(key.fileobj)
+                self._requests.put((handler.request, handler.client_address, handler))
+
+            # Close connections that stayed idle for too long
+            deadline = time.monotonic() - keepalive_timeout
+            for sock, (handler, parked_at) in list(parked.items()):
+                if parked_at < deadline:
+                    del parked[sock]
+                    selector.unregister(sock)
+                    handler.close_connection = True
+                    handler.finish()
+                    self.shutdown_request(sock)
 
 
 def run(addr="localhost", port=8000):
-    server = ThreadedHTTPServer((addr, port), Handler)
-    print(f"Starting HTTP server on {addr}:{port}")
+    server = PooledHTTPServer((addr, port), Handler, workers, queue_size)
+    print(
+        f"Starting HTTP server on {addr}:{port} "
+        f"({workers} workers, queue size {queue_size})"
+    )
     server.serve_forever()
 
 